@@ -1,163 +1,754 @@
+import asyncio
 import os
-import openai
-import chromadb
-from chromadb.utils import embedding_functions
 from dotenv import load_dotenv
-import json
-from datetime import datetime
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from context_builder import count_tokens, create_context_builder, make_message
+from event_log import create_event_log
+from faq_index import embedding_function, query_index
+from intent_engine import intent_engine
+from lexical_index import fuse, is_confident, question_similarity, relative_scores
+from lead_qualifier import create_qualifier
+from llm_client import create_llm_client
+from metrics import AGENT_PATH, TURN_SECONDS
+from response_cache import create_response_cache, lead_score_bucket
+from session_store import create_session_store, new_session
+from tenants import create_tenant_registry
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# Set up Chroma and embed the FAQ file
-chroma_client = chromadb.Client()
-chroma_collection = chroma_client.create_collection(name="faq")
-
-# Conversation memory
-conversation_history = {}
-
-def load_faq():
-    with open("faq.txt", "r") as f:
-        docs = f.read().split("\n\n")
-    for i, doc in enumerate(docs):
-        chroma_collection.add(
-            documents=[doc],
-            metadatas=[{"source": f"faq_{i}"}],
-            ids=[f"id_{i}"]
-        )
-
-# Load once on startup
-load_faq()
-
-def search_docs(query):
-    results = chroma_collection.query(query_texts=[query], n_results=1)
-    if results["documents"]:
-        # Extract just the answer part (after the question)
-        full_doc = results["documents"][0][0]
-        if "?" in full_doc:
-            # Split on the first question mark and return the answer part
-            parts = full_doc.split("?", 1)
-            if len(parts) > 1:
-                return parts[1].strip()
-        return full_doc
-    return "Sorry, I couldn't find an answer for that."
+
+# Pooled, rate-limited OpenAI client with retries and in-flight request coalescing
+llm = create_llm_client()
+
+# Client sites by site id: knowledge base, offers, guide and lead store, loaded on first use
+tenants = create_tenant_registry()
+
+def get_collection():
+    """Return the default knowledge index, loading it (re-embedded only if the files changed) on first call"""
+    return tenants.default.collection()
+
+def get_lexical_index():
+    """Return the default tenant's in-memory BM25 index"""
+    return tenants.default.lexical_index()
+
+# Retrieval settings: chunks returned per query, minimum cosine similarity, and how
+# far below the best match a secondary chunk may score and still be included
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.3"))
+RETRIEVAL_MARGIN = float(os.getenv("RETRIEVAL_MARGIN", "0.1"))
+# Hybrid retrieval: a confident BM25 match (strong score, clear lead over the runner-up)
+# is used as is; otherwise the vector hits are fused with the lexical ones
+LEXICAL_MIN_SCORE = float(os.getenv("LEXICAL_MIN_SCORE", "2.5"))
+LEXICAL_DOMINANCE = float(os.getenv("LEXICAL_DOMINANCE", "1.3"))
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "0.7"))
+NO_ANSWER = "Sorry, I couldn't find an answer for that."
+
+# FAQ fast path: a question that matches one FAQ entry (almost) verbatim is answered from
+# that entry with no LLM call. FAQ_FAST_PATH is "direct" (the answer as written),
+# "template" (FAQ_FAST_PATH_TEMPLATE filled with {answer} and {question}) or "off"
+FAQ_FAST_PATH = os.getenv("FAQ_FAST_PATH", "direct").lower()
+FAQ_FAST_PATH_MIN_SIMILARITY = float(os.getenv("FAQ_FAST_PATH_MIN_SIMILARITY", "0.9"))
+FAQ_FAST_PATH_TEMPLATE = os.getenv("FAQ_FAST_PATH_TEMPLATE", "{answer}\n\nIs there anything else you'd like to know?")
+
+# Prompt context is packed into a token budget: rolling summary + recent turns + FAQ snippets
+context_builder = create_context_builder()
+
+# Hard cap on verbatim messages per stored session; the token budget usually trims sooner
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "20"))
+
+# Conversation memory; messages that fall out of the window are folded into the summary
+session_store = create_session_store(max_messages=CONTEXT_MAX_MESSAGES, max_unsummarized=context_builder.max_unsummarized)
+
+# Sessions with a summary update in flight
+_summarizing = set()
+_summarizing_lock = threading.Lock()
+
+# Cache of answers to repeated questions, keyed by question and lead-score bucket
+response_cache = create_response_cache(embed=embedding_function)
+
+# Append-only log of every turn (FAQ match, qualification, lead score, offers, timings)
+event_log = create_event_log()
+
+# Worker pool for running independent LLM/FAQ calls concurrently
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("AGENT_MAX_WORKERS", "8")))
+
+def _best_match(query, hit, vector_hits):
+    """Describe the top hit and how closely the query matches it.
+
+    The similarity is the higher of the hit's cosine score and the term overlap
+    between the query and the FAQ question, so a verbatim question scores 1.0
+    even when BM25 alone answered it.
+    """
+    metadata = hit.get("metadata", {})
+    cosine = next((vector_hit["score"] for vector_hit in vector_hits if vector_hit["id"] == hit["id"]), 0.0)
+    return {
+        "id": hit["id"],
+        "kind": metadata.get("kind"),
+        "question": metadata.get("question", ""),
+        "answer": hit["answer"],
+        "similarity": max(cosine, question_similarity(query, metadata.get("question", "")))
+    }
+
+def _assemble(hits, query="", vector_hits=()):
+    """Combine the hits that clear the score threshold into one structured answer"""
+    hits = [hit for hit in hits if hit["score"] >= RETRIEVAL_MIN_SCORE]
+    if hits:
+        # Keep secondary chunks only when they score close to the best match
+        best = hits[0]["score"]
+        hits = [hit for hit in hits if best - hit["score"] <= RETRIEVAL_MARGIN]
+    return {
+        "answer": "\n\n".join(hit["answer"] for hit in hits) or NO_ANSWER,
+        "source_ids": [hit["id"] for hit in hits],
+        "scores": [hit["score"] for hit in hits],
+        "match": _best_match(query, hits[0], vector_hits) if hits else None
+    }
+
+def search_docs(query, k=None, where=None, query_embedding=None, tenant=None):
+    """Return {"answer", "source_ids", "scores", "match"} for the best matching knowledge chunks.
+
+    The query goes to the tenant's BM25 index first. When it answers
+    confidently the vector index is skipped; otherwise the vector hits are
+    fused with the lexical ones.
+    """
+    k = k or RETRIEVAL_TOP_K
+    tenant = tenant or tenants.default
+    lexical = tenant.lexical_index().search(query, k, where)
+    if is_confident(lexical, LEXICAL_MIN_SCORE, LEXICAL_DOMINANCE):
+        return _assemble(relative_scores(lexical), query)
+    query_embeddings = [query_embedding] if query_embedding is not None else None
+    vector = query_index(tenant.collection(), [query], k, where, query_embeddings)[0]
+    return _assemble(fuse(lexical, vector, HYBRID_VECTOR_WEIGHT, k), query, vector)
 
 def respond_to_objection(text):
-    lower = text.lower()
-    if "too expensive" in lower:
-        return "I understand the concern! We also offer a free plan and competitive pricing for startups."
-    elif "not sure" in lower or "don't know" in lower:
-        return "No worries — I can help explain more or share a quick demo link."
-    return None
-
-def qualify_lead(user_input, session_id):
-    """Analyze if this is a qualified lead"""
+    return intent_engine.objection_response(text)
+
+def _qualify_request(user_input):
+    return {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": "You are a lead qualification expert. Analyze if the user shows buying intent. Return only 'qualified' or 'not_qualified'."},
+            {"role": "user", "content": f"User message: {user_input}"}
+        ],
+        "max_tokens": 10,
+        "temperature": 0.1
+    }
+
+def llm_qualify_lead(user_input, session_id):
+    """Ask the LLM whether this is a qualified lead"""
+    try:
+        response = llm.create(**_qualify_request(user_input))
+        return response.choices[0].message.content.strip().lower()
+    except Exception as e:
+        print(f"Error qualifying lead: {e}")
+        return "not_qualified"
+
+async def allm_qualify_lead(user_input, session_id):
+    """Async variant of llm_qualify_lead"""
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a lead qualification expert. Analyze if the user shows buying intent. Return only 'qualified' or 'not_qualified'."},
-                {"role": "user", "content": f"User message: {user_input}"}
-            ],
-            max_tokens=10,
-            temperature=0.1
-        )
+        response = await llm.acreate(**_qualify_request(user_input))
         return response.choices[0].message.content.strip().lower()
-    except:
+    except Exception as e:
+        print(f"Error qualifying lead: {e}")
         return "not_qualified"
 
+# Rules and an embedding classifier answer clear-cut messages; only ambiguous ones reach the LLM
+qualifier = create_qualifier(llm_qualify_lead, embed=embedding_function, llm_qualify_async=allm_qualify_lead)
+
+def _follow_up_request(user_input):
+    return {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": "You are a sales assistant. Generate 1-2 relevant follow-up questions to continue the conversation naturally. Keep them short and specific."},
+            {"role": "user", "content": f"User said: {user_input}\n\nGenerate follow-up questions:"}
+        ],
+        "max_tokens": 100,
+        "temperature": 0.7
+    }
+
 def generate_follow_up(user_input, session_id):
     """Generate contextual follow-up questions"""
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a sales assistant. Generate 1-2 relevant follow-up questions to continue the conversation naturally. Keep them short and specific."},
-                {"role": "user", "content": f"User said: {user_input}\n\nGenerate follow-up questions:"}
-            ],
-            max_tokens=100,
-            temperature=0.7
-        )
+        response = llm.create(**_follow_up_request(user_input))
         return response.choices[0].message.content.strip()
-    except:
+    except Exception as e:
+        print(f"Error generating follow-up: {e}")
         return ""
 
-def run_agent(user_input, session_id="default"):
-    # Initialize session if new
-    if session_id not in conversation_history:
-        conversation_history[session_id] = {
-            "messages": [],
-            "lead_score": 0,
-            "last_contact": datetime.now().isoformat(),
-            "guide_offered": False,
-            "call_offered": False
-        }
+async def agenerate_follow_up(user_input, session_id):
+    """Async variant of generate_follow_up"""
+    try:
+        response = await llm.acreate(**_follow_up_request(user_input))
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"Error generating follow-up: {e}")
+        return ""
+
+def _reply_request(user_input, context, faq_context, lead_score, stream=False):
+    return {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": f"""You are a dynamic sales assistant. 
+            - Be conversational and engaging
+            - Use the FAQ information provided
+            - If lead_score is high, be more direct about next steps
+            - Keep responses under 100 words
+            - Be enthusiastic but professional"""},
+            {"role": "user", "content": f"""Context: {context}
+            FAQ Info: {faq_context}
+            Lead Score: {lead_score}
+            User: {user_input}"""}
+        ],
+        "max_tokens": 150,
+        "temperature": 0.8,
+        "stream": stream
+    }
+
+def generate_reply(user_input, context, faq_context, lead_score):
+    """Generate the main assistant reply from the conversation context"""
+    response = llm.create(**_reply_request(user_input, context, faq_context, lead_score))
+    return response.choices[0].message.content.strip()
+
+async def agenerate_reply(user_input, context, faq_context, lead_score):
+    """Async variant of generate_reply"""
+    response = await llm.acreate(**_reply_request(user_input, context, faq_context, lead_score))
+    return response.choices[0].message.content.strip()
+
+def stream_reply(user_input, context, faq_context, lead_score):
+    """Yield the main assistant reply token by token as the model produces it"""
+    response = llm.create(**_reply_request(user_input, context, faq_context, lead_score, stream=True))
+    for chunk in response:
+        token = chunk["choices"][0]["delta"].get("content")
+        if token:
+            yield token
+
+async def astream_reply(user_input, context, faq_context, lead_score):
+    """Async variant of stream_reply"""
+    response = await llm.acreate(**_reply_request(user_input, context, faq_context, lead_score, stream=True))
+    async for chunk in response:
+        token = chunk["choices"][0]["delta"].get("content")
+        if token:
+            yield token
+
+def _timed(func, *args):
+    """Call func and return its result together with the elapsed time in ms"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, round((time.perf_counter() - start) * 1000, 2)
+
+async def _atimed(awaitable):
+    """Await and return the result together with the elapsed time in ms"""
+    start = time.perf_counter()
+    result = await awaitable
+    return result, round((time.perf_counter() - start) * 1000, 2)
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+def lead_score_distribution(site_id=None):
+    """Number of live sessions of one site at each lead score, for the dashboard.
+
+    Read from the session store, so expired sessions drop out and, with
+    SESSION_STORE=sqlite, every worker's sessions are counted.
+    Raises tenants.UnknownTenant for a site id without a tenant.
+    """
+    prefix = tenants.get(site_id).session_key("")
+    return {str(score): count for score, count in sorted(session_store.lead_scores(prefix).items())}
+
+def _start_turn(user_input, session_id):
+    """Load (or create) the session and record the user message"""
+    session = session_store.get(session_id)
+    if session is None:
+        session = new_session()
     
     # Add user message to history
-    conversation_history[session_id]["messages"].append({"role": "user", "content": user_input})
+    session["messages"].append(make_message("user", user_input))
+    return session
+
+def _end_turn(session_id, session, response):
+    """Record the assistant response and persist the session"""
+    session["messages"].append(make_message("assistant", response))
+    context_builder.trim(session)
+    session_store.save(session_id, session)
+    if context_builder.needs_summary(session):
+        _schedule_summary(session_id, session)
+
+def _schedule_summary(session_id, session):
+    """Fold the session's evicted messages into its summary off the request path"""
+    with _summarizing_lock:
+        if session_id in _summarizing:
+            return
+        _summarizing.add(session_id)
+    # One fixed-size batch per call keeps the summary prompt bounded; the rest waits for the next turn
+    executor.submit(_fold_summary, session_id, session.get("summary", ""), context_builder.summary_batch_of(session))
+
+def _fold_summary(session_id, summary, pending):
+    try:
+        response = llm.create(**context_builder.summary_request(summary, pending))
+        summary = response.choices[0].message.content.strip()
+        session = session_store.get(session_id)
+        # Only drop the messages that were folded; anything evicted since stays queued
+        if session and session.get("unsummarized", [])[:len(pending)] == pending:
+            session["unsummarized"] = session["unsummarized"][len(pending):]
+            session["summary"] = summary
+            session["summary_tokens"] = count_tokens(summary)
+            session_store.save(session_id, session)
+    except Exception as e:
+        print(f"Error updating conversation summary: {e}")
+    finally:
+        with _summarizing_lock:
+            _summarizing.discard(session_id)
+
+def _gather_context(user_input, session_id, timings, tenant, query_embedding=None):
+    """Run the FAQ lookup and the local lead qualification tiers concurrently.
+
+    A message the local tiers can't decide goes to the LLM afterwards, unless
+    the FAQ fast path will answer the turn; then it counts as not qualified.
+    """
+    # FAQ lookup and lead qualification don't depend on each other, so fan them out
+    faq_future = executor.submit(_timed, search_docs, user_input, None, None, query_embedding, tenant)
+    local_future = executor.submit(_timed, qualifier.local_decision, user_input, query_embedding)
+    faq, timings["search_docs"] = faq_future.result()
+    is_qualified, timings["qualify_lead"] = local_future.result()
+    if is_qualified is None and not _fast_path_match(faq):
+        is_qualified, escalated = _timed(qualifier.escalate, user_input, session_id)
+        timings["qualify_lead"] += escalated
+    return faq, is_qualified == "qualified"
+
+async def _agather_context(user_input, session_id, timings, tenant, query_embedding=None):
+    """Async variant of _gather_context; the index query and local tiers run in worker threads"""
+    (faq, timings["search_docs"]), (is_qualified, timings["qualify_lead"]) = await asyncio.gather(
+        _atimed(asyncio.to_thread(search_docs, user_input, None, None, query_embedding, tenant)),
+        _atimed(asyncio.to_thread(qualifier.local_decision, user_input, query_embedding))
+    )
+    if is_qualified is None and not _fast_path_match(faq):
+        is_qualified, escalated = await _atimed(qualifier.aescalate(user_input, session_id))
+        timings["qualify_lead"] += escalated
+    return faq, is_qualified == "qualified"
+
+def _build_context(session, faq, timings):
+    """Return (conversation_context, faq_context) packed into the token budget"""
+    context, faq_context, timings["context_tokens"] = context_builder.build(session, faq["answer"])
+    return context, faq_context
+
+def _cache_lookup(user_input, session, timings, tenant):
+    """Look the question up in the response cache; returns (cached, cache_key)"""
+    started = time.perf_counter()
+    # Answers come from the tenant's knowledge base, so each tenant has its own buckets
+    bucket = (tenant.site_id, lead_score_bucket(session["lead_score"]))
+    cached, embedding = response_cache.lookup(user_input, bucket)
+    timings["cache_lookup"] = _elapsed_ms(started)
+    return cached, (bucket, embedding)
+
+def _lookup_turn(user_input, session_id, session, timings, tenant):
+    """Serve the turn from the response cache, or gather FAQ context and qualification.
+
+    Returns (cached, cache_key, faq, qualified) and updates the lead score. The
+    question embedding computed for the cache lookup is reused for retrieval.
+    """
+    cached, cache_key = _cache_lookup(user_input, session, timings, tenant)
+    if cached:
+        faq, qualified = cached["faq"], cached["qualified"]
+    else:
+        faq, qualified = _gather_context(user_input, session_id, timings, tenant, cache_key[1])
+    if qualified:
+        session["lead_score"] += 1
+    return cached, cache_key, faq, qualified
+
+async def _alookup_turn(user_input, session_id, session, timings, tenant):
+    """Async variant of _lookup_turn"""
+    cached, cache_key = await asyncio.to_thread(_cache_lookup, user_input, session, timings, tenant)
+    if cached:
+        faq, qualified = cached["faq"], cached["qualified"]
+    else:
+        faq, qualified = await _agather_context(user_input, session_id, timings, tenant, cache_key[1])
+    if qualified:
+        session["lead_score"] += 1
+    return cached, cache_key, faq, qualified
+
+def _context_free(session):
+    """True on a session's first turn, when the reply prompt holds no earlier conversation"""
+    return len(session["messages"]) <= 1 and not session.get("summary") and not session.get("unsummarized")
+
+def _cache_reply(user_input, cache_key, reply, faq, qualified, session):
+    """Cache a reply for other visitors, but only one built from FAQ context alone.
+
+    Later replies were prompted with this visitor's history and summary, so
+    sharing them could leak one conversation into another.
+    """
+    if not _context_free(session):
+        return
+    bucket, embedding = cache_key
+    response_cache.put(user_input, bucket, {"reply": reply, "faq": faq, "qualified": qualified}, embedding)
+
+def _plan_offers(session):
+    """Decide which offer to append and whether a follow-up is needed"""
+    # Offer guide if qualified and not already offered
+    offer_guide = session["lead_score"] >= 2 and not session["guide_offered"]
+    # Offer call booking if guide was offered and call not yet offered
+    offer_call = not offer_guide and session["guide_offered"] and not session["call_offered"]
+    # Once both offers are out, a qualified lead's replies end with a follow-up question instead
+    wants_follow_up = session["lead_score"] >= 2 and session["guide_offered"] and not offer_call
+    return offer_guide, offer_call, wants_follow_up
+
+def _finish_offers(session, tenant, offer_guide, offer_call, follow_up):
+    """Return the text to append after the main reply and update the offer flags"""
+    extra = ""
+    if offer_guide:
+        extra += tenant.guide_offer
+        session["guide_offered"] = True
+    elif offer_call:
+        extra += tenant.call_offer
+        session["call_offered"] = True
+    
+    if follow_up:
+        extra += f"\n\n{follow_up}"
+    return extra
+
+def _fast_path_match(faq):
+    """Return the FAQ entry to answer from directly, or None when the turn needs the LLM"""
+    match = faq.get("match")
+    if FAQ_FAST_PATH not in ("direct", "template") or not match:
+        return None
+    if match["kind"] != "faq" or match["similarity"] < FAQ_FAST_PATH_MIN_SIMILARITY:
+        return None
+    return match
+
+def _fast_path_turn(session, tenant, match):
+    """Reply with the FAQ entry plus any offer that is due; the LLM follow-up question is skipped"""
+    if FAQ_FAST_PATH == "template":
+        reply = FAQ_FAST_PATH_TEMPLATE.format(answer=match["answer"], question=match["question"])
+    else:
+        reply = match["answer"]
+    offer_guide, offer_call, _ = _plan_offers(session)
+    return reply + _finish_offers(session, tenant, offer_guide, offer_call, "")
+
+def _open_event(tenant, session_id, user_input, session):
+    """Start a turn's event-log entry; offers are found by comparing the session flags at the end"""
+    offered = (session["guide_offered"], session["call_offered"]) if session else (False, False)
+    return {"ts": time.time(), "site_id": tenant.site_id, "session_id": session_id, "message": user_input, "session": session, "offered": offered}
+
+def _turn_event(event, path, timings, response, faq, qualified):
+    session = event["session"]
+    offers = []
+    if session:
+        guide_before, call_before = event["offered"]
+        if session["guide_offered"] and not guide_before:
+            offers.append("guide")
+        if session["call_offered"] and not call_before:
+            offers.append("call")
+    match = faq.get("match") if faq else None
+    return {
+        "ts": round(event["ts"], 3),
+        "site_id": event["site_id"],
+        "session_id": event["session_id"],
+        "path": path,
+        "message": event["message"],
+        "response": response,
+        "faq_id": match["id"] if match else None,
+        "faq_similarity": match["similarity"] if match else None,
+        "source_ids": faq["source_ids"] if faq else [],
+        "qualified": qualified,
+        "lead_score": session["lead_score"] if session else None,
+        "offers": offers,
+        "timings": timings
+    }
+
+def _record_turn(path, timings, started, event=None, response=None, faq=None, qualified=None):
+    """Close the turn's timings, count it under the path that produced the reply and log it"""
+    timings["total"] = _elapsed_ms(started)
+    AGENT_PATH.inc(path=path)
+    TURN_SECONDS.observe(timings["total"] / 1000, path=path)
+    if event_log and event:
+        event_log.append(_turn_event(event, path, timings, response, faq, qualified))
+
+def agent_path_stats():
+    """Turns, share of turns and latency per reply path, and the FAQ fast path hit rate.
+
+    The hit rate is over the turns that needed an answer (not cached and not an
+    objection): those answered by the fast path, the LLM or the fallback.
+    """
+    summary = TURN_SECONDS.summary("path")
+    turns = sum(entry["count"] for entry in summary.values())
+    paths = {
+        path: {
+            "turns": entry["count"],
+            "share": round(entry["count"] / turns, 4),
+            "mean_ms": round(entry["sum"] / entry["count"] * 1000, 2),
+            "p50_ms": round(entry["p50"] * 1000, 2),
+            "p95_ms": round(entry["p95"] * 1000, 2)
+        }
+        for path, entry in summary.items()
+    }
+    answered = sum(paths.get(path, {}).get("turns", 0) for path in ("faq_fast", "llm", "fallback"))
+    fast = paths.get("faq_fast", {}).get("turns", 0)
+    return {
+        "turns": turns,
+        "paths": paths,
+        "fast_path": {
+            "mode": FAQ_FAST_PATH,
+            "min_similarity": FAQ_FAST_PATH_MIN_SIMILARITY,
+            "hit_rate": round(fast / answered, 4) if answered else 0.0
+        }
+    }
+
+def _fallback_response(faq):
+    # Fallback to direct FAQ response
+    return faq["answer"] if faq["source_ids"] else "I'd be happy to help! Could you tell me more about what you're looking for?"
+
+def answer_from_faq(user_input, site_id=None, timings=None, session_id=None):
+    """Degraded turn used while shedding load: the FAQ answer alone, with no LLM call or session update.
+    
+    Returns (response, timings) like run_agent_with_timings.
+    """
+    started = time.perf_counter()
+    timings = timings if timings is not None else {}
+    tenant = tenants.get(site_id)
+    faq, timings["search_docs"] = _timed(search_docs, user_input, None, None, None, tenant)
+    response = _fallback_response(faq)
+    event = _open_event(tenant, tenant.session_key(session_id or "default"), user_input, None)
+    _record_turn("shed", timings, started, event, response, faq)
+    return response, timings
+
+def run_agent(user_input, session_id="default", site_id=None):
+    response, _ = run_agent_with_timings(user_input, session_id, site_id)
+    return response
+
+def run_agent_with_timings(user_input, session_id="default", site_id=None):
+    """Run the agent for a site and return (response, timings) with per-stage timings in ms.
+
+    Raises tenants.UnknownTenant for a site id without a tenant.
+    """
+    started = time.perf_counter()
+    timings = {}
+    tenant = tenants.get(site_id)
+    session_id = tenant.session_key(session_id)
+    session = _start_turn(user_input, session_id)
+    event = _open_event(tenant, session_id, user_input, session)
     
     # Check for objections first
     objection_response = respond_to_objection(user_input)
     if objection_response:
-        conversation_history[session_id]["messages"].append({"role": "assistant", "content": objection_response})
-        return objection_response
+        _end_turn(session_id, session, objection_response)
+        _record_turn("objection", timings, started, event, objection_response)
+        return objection_response, timings
 
-    # Get relevant FAQ context
-    faq_context = search_docs(user_input)
-    
-    # Qualify the lead
-    is_qualified = qualify_lead(user_input, session_id)
-    if is_qualified == "qualified":
-        conversation_history[session_id]["lead_score"] += 1
+    cached, cache_key, faq, qualified = _lookup_turn(user_input, session_id, session, timings, tenant)
+    match = None if cached else _fast_path_match(faq)
+    if match:
+        response = _fast_path_turn(session, tenant, match)
+        _end_turn(session_id, session, response)
+        _record_turn("faq_fast", timings, started, event, response, faq, qualified)
+        return response, timings
     
     # Generate response with context
     try:
-        # Build conversation context
-        recent_messages = conversation_history[session_id]["messages"][-3:]  # Last 3 messages
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in recent_messages])
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": f"""You are a dynamic sales assistant. 
-                - Be conversational and engaging
-                - Use the FAQ information provided
-                - If lead_score is high, be more direct about next steps
-                - Keep responses under 100 words
-                - Be enthusiastic but professional"""},
-                {"role": "user", "content": f"""Context: {context}
-                FAQ Info: {faq_context}
-                Lead Score: {conversation_history[session_id]['lead_score']}
-                User: {user_input}"""}
-            ],
-            max_tokens=150,
-            temperature=0.8
-        )
+        if not cached:
+            reply_future = executor.submit(_timed, generate_reply, user_input, *_build_context(session, faq, timings), session["lead_score"])
+        # Offers only depend on the session flags, so decide them while the reply is generated
+        offer_guide, offer_call, wants_follow_up = _plan_offers(session)
+        # The follow-up starts as soon as its inputs are known
+        follow_up_future = executor.submit(_timed, generate_follow_up, user_input, session_id) if wants_follow_up else None
         
-        main_response = response.choices[0].message.content.strip()
+        if cached:
+            main_response = cached["reply"]
+        else:
+            main_response, timings["reply"] = reply_future.result()
+            _cache_reply(user_input, cache_key, main_response, faq, qualified, session)
+        follow_up = ""
+        if follow_up_future:
+            follow_up, timings["follow_up"] = follow_up_future.result()
+        main_response += _finish_offers(session, tenant, offer_guide, offer_call, follow_up)
         
-        # Offer guide if qualified and not already offered
-        if conversation_history[session_id]["lead_score"] >= 2 and not conversation_history[session_id]["guide_offered"]:
-            main_response += "\n\n📚 **Free Guide**: I'd love to send you our comprehensive guide on lead generation strategies. It's packed with actionable tips that have helped our clients double their leads in 30 days. Would you like me to send it to your email?"
-            conversation_history[session_id]["guide_offered"] = True
+        _end_turn(session_id, session, main_response)
+        _record_turn("cached" if cached else "llm", timings, started, event, main_response, faq, qualified)
+        return main_response, timings
         
-        # Offer call booking if guide was offered and call not yet offered
-        elif conversation_history[session_id]["guide_offered"] and not conversation_history[session_id]["call_offered"]:
-            main_response += "\n\n📞 **Free Strategy Call**: I'd love to hop on a quick 15-minute call to discuss your specific lead generation challenges and share some personalized strategies. No sales pitch - just pure value! Here's my booking link: https://calendly.com/your-calendar/15min-strategy-call"
-            conversation_history[session_id]["call_offered"] = True
+    except Exception as e:
+        print(f"Error generating reply: {e}")
+        fallback_response = _fallback_response(faq)
+        _end_turn(session_id, session, fallback_response)
+        _record_turn("fallback", timings, started, event, fallback_response, faq, qualified)
+        return fallback_response, timings
+
+async def arun_agent_with_timings(user_input, session_id="default", site_id=None):
+    """Async variant of run_agent_with_timings using the async OpenAI client"""
+    started = time.perf_counter()
+    timings = {}
+    tenant = tenants.get(site_id)
+    session_id = tenant.session_key(session_id)
+    session = await asyncio.to_thread(_start_turn, user_input, session_id)
+    event = _open_event(tenant, session_id, user_input, session)
+    
+    # Check for objections first
+    objection_response = respond_to_objection(user_input)
+    if objection_response:
+        await asyncio.to_thread(_end_turn, session_id, session, objection_response)
+        _record_turn("objection", timings, started, event, objection_response)
+        return objection_response, timings
+
+    cached, cache_key, faq, qualified = await _alookup_turn(user_input, session_id, session, timings, tenant)
+    match = None if cached else _fast_path_match(faq)
+    if match:
+        response = _fast_path_turn(session, tenant, match)
+        await asyncio.to_thread(_end_turn, session_id, session, response)
+        _record_turn("faq_fast", timings, started, event, response, faq, qualified)
+        return response, timings
+    
+    # Generate response with context
+    try:
+        offer_guide, offer_call, wants_follow_up = _plan_offers(session)
+        follow_up_task = asyncio.create_task(_atimed(agenerate_follow_up(user_input, session_id))) if wants_follow_up else None
         
-        # Generate follow-up if lead is qualified
+        if cached:
+            main_response = cached["reply"]
+        else:
+            main_response, timings["reply"] = await _atimed(agenerate_reply(user_input, *_build_context(session, faq, timings), session["lead_score"]))
+            await asyncio.to_thread(_cache_reply, user_input, cache_key, main_response, faq, qualified, session)
         follow_up = ""
-        if conversation_history[session_id]["lead_score"] >= 2 and not conversation_history[session_id]["guide_offered"]:
-            follow_up = generate_follow_up(user_input, session_id)
-            if follow_up:
-                main_response += f"\n\n{follow_up}"
+        if follow_up_task:
+            follow_up, timings["follow_up"] = await follow_up_task
+        main_response += _finish_offers(session, tenant, offer_guide, offer_call, follow_up)
         
-        conversation_history[session_id]["messages"].append({"role": "assistant", "content": main_response})
-        return main_response
+        await asyncio.to_thread(_end_turn, session_id, session, main_response)
+        _record_turn("cached" if cached else "llm", timings, started, event, main_response, faq, qualified)
+        return main_response, timings
         
     except Exception as e:
-        # Fallback to direct FAQ response
-        fallback_response = faq_context if faq_context != "Sorry, I couldn't find an answer for that." else "I'd be happy to help! Could you tell me more about what you're looking for?"
-        conversation_history[session_id]["messages"].append({"role": "assistant", "content": fallback_response})
-        return fallback_response
+        print(f"Error generating reply: {e}")
+        fallback_response = _fallback_response(faq)
+        await asyncio.to_thread(_end_turn, session_id, session, fallback_response)
+        _record_turn("fallback", timings, started, event, fallback_response, faq, qualified)
+        return fallback_response, timings
+
+def stream_agent(user_input, session_id="default", timings=None, site_id=None):
+    """Run the agent and yield the response in chunks as soon as they are available.
+
+    The optional timings dict is filled in as stages complete, including
+    first_token (time until the first model token was yielded).
+    """
+    started = time.perf_counter()
+    timings = timings if timings is not None else {}
+    tenant = tenants.get(site_id)
+    session_id = tenant.session_key(session_id)
+    session = _start_turn(user_input, session_id)
+    event = _open_event(tenant, session_id, user_input, session)
+    
+    # Check for objections first
+    objection_response = respond_to_objection(user_input)
+    if objection_response:
+        _end_turn(session_id, session, objection_response)
+        _record_turn("objection", timings, started, event, objection_response)
+        yield objection_response
+        return
+
+    cached, cache_key, faq, qualified = _lookup_turn(user_input, session_id, session, timings, tenant)
+    match = None if cached else _fast_path_match(faq)
+    if match:
+        response = _fast_path_turn(session, tenant, match)
+        timings["first_token"] = _elapsed_ms(started)
+        _end_turn(session_id, session, response)
+        _record_turn("faq_fast", timings, started, event, response, faq, qualified)
+        yield response
+        return
+    offer_guide, offer_call, wants_follow_up = _plan_offers(session)
+    follow_up_future = executor.submit(_timed, generate_follow_up, user_input, session_id) if wants_follow_up else None
+    
+    parts = []
+    reply_started = time.perf_counter()
+    if cached:
+        timings["first_token"] = _elapsed_ms(started)
+        parts.append(cached["reply"])
+        yield cached["reply"]
+    else:
+        try:
+            for token in stream_reply(user_input, *_build_context(session, faq, timings), session["lead_score"]):
+                if not parts:
+                    timings["first_token"] = _elapsed_ms(started)
+                parts.append(token)
+                yield token
+            _cache_reply(user_input, cache_key, "".join(parts).strip(), faq, qualified, session)
+        except Exception as e:
+            print(f"Error streaming reply: {e}")
+            if not parts:
+                fallback_response = _fallback_response(faq)
+                _end_turn(session_id, session, fallback_response)
+                _record_turn("fallback", timings, started, event, fallback_response, faq, qualified)
+                yield fallback_response
+                return
+        timings["reply"] = _elapsed_ms(reply_started)
+    
+    follow_up = ""
+    if follow_up_future:
+        follow_up, timings["follow_up"] = follow_up_future.result()
+    extra = _finish_offers(session, tenant, offer_guide, offer_call, follow_up)
+    if extra:
+        yield extra
+    
+    response = "".join(parts).strip() + extra
+    _end_turn(session_id, session, response)
+    _record_turn("cached" if cached else "llm", timings, started, event, response, faq, qualified)
+
+async def astream_agent(user_input, session_id="default", timings=None, site_id=None):
+    """Async variant of stream_agent"""
+    started = time.perf_counter()
+    timings = timings if timings is not None else {}
+    tenant = tenants.get(site_id)
+    session_id = tenant.session_key(session_id)
+    session = await asyncio.to_thread(_start_turn, user_input, session_id)
+    event = _open_event(tenant, session_id, user_input, session)
+    
+    # Check for objections first
+    objection_response = respond_to_objection(user_input)
+    if objection_response:
+        await asyncio.to_thread(_end_turn, session_id, session, objection_response)
+        _record_turn("objection", timings, started, event, objection_response)
+        yield objection_response
+        return
+
+    cached, cache_key, faq, qualified = await _alookup_turn(user_input, session_id, session, timings, tenant)
+    match = None if cached else _fast_path_match(faq)
+    if match:
+        response = _fast_path_turn(session, tenant, match)
+        timings["first_token"] = _elapsed_ms(started)
+        await asyncio.to_thread(_end_turn, session_id, session, response)
+        _record_turn("faq_fast", timings, started, event, response, faq, qualified)
+        yield response
+        return
+    offer_guide, offer_call, wants_follow_up = _plan_offers(session)
+    follow_up_task = asyncio.create_task(_atimed(agenerate_follow_up(user_input, session_id))) if wants_follow_up else None
+    
+    parts = []
+    reply_started = time.perf_counter()
+    if cached:
+        timings["first_token"] = _elapsed_ms(started)
+        parts.append(cached["reply"])
+        yield cached["reply"]
+    else:
+        try:
+            async for token in astream_reply(user_input, *_build_context(session, faq, timings), session["lead_score"]):
+                if not parts:
+                    timings["first_token"] = _elapsed_ms(started)
+                parts.append(token)
+                yield token
+            await asyncio.to_thread(_cache_reply, user_input, cache_key, "".join(parts).strip(), faq, qualified, session)
+        except Exception as e:
+            print(f"Error streaming reply: {e}")
+            if not parts:
+                fallback_response = _fallback_response(faq)
+                await asyncio.to_thread(_end_turn, session_id, session, fallback_response)
+                _record_turn("fallback", timings, started, event, fallback_response, faq, qualified)
+                yield fallback_response
+                return
+        timings["reply"] = _elapsed_ms(reply_started)
+    
+    follow_up = ""
+    if follow_up_task:
+        follow_up, timings["follow_up"] = await follow_up_task
+    extra = _finish_offers(session, tenant, offer_guide, offer_call, follow_up)
+    if extra:
+        yield extra
+    
+    response = "".join(parts).strip() + extra
+    await asyncio.to_thread(_end_turn, session_id, session, response)
+    _record_turn("cached" if cached else "llm", timings, started, event, response, faq, qualified)
@@ -1,190 +1,168 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from agent import run_agent
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context, g
+from agent import run_agent_with_timings, stream_agent, answer_from_faq, response_cache, qualifier, llm, get_collection, get_lexical_index, lead_score_distribution, agent_path_stats, tenants
 import json
+import math
 from datetime import datetime
 import os
-import csv
+import io
+import threading
+import time
+import uuid
+from werkzeug.middleware.proxy_fix import ProxyFix
+from email_capture import CapturePipeline
+from guide_pdf import guide_cache
+from intent_engine import intent_engine
+from lead_store import FILTER_FIELDS, export_csv, export_ndjson, read_leads, utc_timestamp
+import metrics
+from job_queue import create_job_queue
+from lead_jobs import register_lead_jobs
+from context_builder import count_tokens
+from startup import warmup
+from tenants import UnknownTenant
+from rate_limiter import LoadShedder, create_rate_limiter
 
 app = Flask(__name__)
 
-# Store captured emails (in production, use a database)
-captured_emails = []
+# Behind TRUSTED_PROXIES reverse proxies, the client address is read from X-Forwarded-For.
+# Left at 0 (no proxy) the header is ignored, since any visitor can set it to dodge the per-IP limit
+TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', '0'))
+if TRUSTED_PROXIES > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
 
-def save_lead_to_csv(lead_data):
-    """Save lead data to CSV file for Excel compatibility"""
-    csv_file = 'leads.csv'
-    file_exists = os.path.isfile(csv_file)
-    
-    # Define CSV headers
-    fieldnames = ['timestamp', 'name', 'email', 'product', 'pain_point', 'session_id']
-    
-    try:
-        with open(csv_file, 'a', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            # Write headers if file doesn't exist
-            if not file_exists:
-                writer.writeheader()
-            
-            # Write lead data
-            writer.writerow({
-                'timestamp': lead_data.get('timestamp', datetime.now().isoformat()),
-                'name': lead_data.get('name', ''),
-                'email': lead_data.get('email', ''),
-                'product': lead_data.get('product', ''),
-                'pain_point': lead_data.get('pain_point', ''),
-                'session_id': lead_data.get('session_id', '')
-            })
-        
-        print(f"Lead saved to CSV: {lead_data.get('name', 'Unknown')} ({lead_data.get('email', 'No email')})")
-        return True
-    except Exception as e:
-        print(f"Error saving lead to CSV: {e}")
-        return False
+def client_ip(forwarded_for, remote_addr):
+    """Client address as ProxyFix resolves it: the TRUSTED_PROXIES-th X-Forwarded-For entry from the right"""
+    if TRUSTED_PROXIES > 0 and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        if len(hops) >= TRUSTED_PROXIES:
+            return hops[-TRUSTED_PROXIES]
+    return remote_addr
+
+# Heavy components load on a background thread; /ready turns 200 once they have
+warmup.register('llm_client', llm.api)
+warmup.register('tokenizer', lambda: count_tokens('warm up'))
+warmup.register('lexical_index', get_lexical_index)
+warmup.register('knowledge_index', get_collection)
+warmup.register('qualifier', qualifier.centroids)
+warmup.register('guide_pdf', guide_cache.get)
+if os.getenv('WARMUP', '1') == '1':
+    warmup.start()
+
+# Captured emails are buffered and flushed to the database in batches
+capture_pipeline = CapturePipeline(os.getenv('LEADS_DB_PATH', 'leads.db'))
+
+# /ask admission: per-session and per-IP token buckets against abuse, and FAQ-only answers
+# (no OpenAI calls) while SHED_MAX_INFLIGHT_LLM or more OpenAI calls are already in flight
+rate_limiter = create_rate_limiter()
+load_shedder = LoadShedder(llm.active, int(os.getenv('SHED_MAX_INFLIGHT_LLM', '40')))
+
+RATE_LIMITED_MESSAGE = "You're sending messages a little too quickly. Please wait a moment and try again."
+
+def admit_ask(data, ip):
+    """Return ('admitted' | 'rate_limited' | 'shed', retry_after_seconds) for an /ask request"""
+    # Sessions are per site, like the agent's session keys
+    session_key = f"{data.get('site_id') or ''}:{data.get('session_id', 'default')}"
+    allowed, retry_after = rate_limiter.hit(session=session_key, ip=ip)
+    admission = 'admitted' if allowed else 'rate_limited'
+    if allowed and load_shedder.should_shed():
+        admission = 'shed'
+    metrics.ASK_ADMISSION.inc(result=admission)
+    return admission, retry_after
+
+def rate_limited_body():
+    return {'response': RATE_LIMITED_MESSAGE, 'show_email_capture': False, 'suggested_questions': [], 'rate_limited': True}
+
+def retry_after_header(retry_after):
+    return {'Retry-After': str(max(1, math.ceil(retry_after)))}
+
+# Per-request sampling profiles (?profile=1) are only honoured when enabled
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', '0') == '1'
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if PROFILE_REQUESTS and request.args.get('profile') == '1':
+        g.profiler = metrics.SamplingProfiler(threading.get_ident()).start()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, route=route, method=request.method, status=str(response.status_code))
+    profiler = g.pop('profiler', None)
+    if profiler:
+        path = profiler.stop().save(PROFILE_DIR, request.endpoint or 'unmatched')
+        response.headers['X-Profile-File'] = path
+    return response
+
+@metrics.registry.collector
+def component_metrics():
+    """Counters kept by the cache, qualifier and LLM client, read at scrape time"""
+    cache = response_cache.stats()
+    yield ('leadcraft_response_cache_lookups_total', 'counter', 'Response cache lookups by result',
+           [({'result': 'exact_hit'}, cache['exact_hits']), ({'result': 'semantic_hit'}, cache['semantic_hits']), ({'result': 'miss'}, cache['misses'])])
+    yield ('leadcraft_response_cache_entries', 'gauge', 'Entries in the response cache', [({}, cache['size'])])
+    tiers = qualifier.stats()
+    yield ('leadcraft_qualifier_decisions_total', 'counter', 'Lead qualifications by deciding tier',
+           [({'tier': tier}, tiers[tier]) for tier in ('rules', 'classifier', 'llm')])
+    client = llm.stats()
+    yield ('leadcraft_llm_coalesced_total', 'counter', 'OpenAI requests served by an identical in-flight call', [({}, client['coalesced'])])
+    yield ('leadcraft_llm_throttled_seconds_total', 'counter', 'Time spent waiting on the OpenAI rate limiter', [({}, client['throttled_ms'] / 1000)])
+    sites = tenants.stats()
+    yield ('leadcraft_tenants_resident', 'gauge', 'Client sites loaded in this worker', [({}, sites['resident'])])
+    yield ('leadcraft_tenant_evictions_total', 'counter', 'Client sites dropped from the tenant cache', [({}, sites['evictions'])])
+
+# Post-capture side effects (storing leads, emailing the guide, CRM push) run in the background
+job_queue = create_job_queue()
+register_lead_jobs(job_queue, tenants)
+
+def tenant_source(source, tenant):
+    """Capture source qualified by site, so the same email on two sites gets two capture ids"""
+    return source if tenant is tenants.default else f"{source}:{tenant.site_id}"
+
+def site_lead_store():
+    """Lead store of the site_id in the query string (the default site when absent)"""
+    return tenants.get(request.args.get('site_id')).lead_store()
+
+@app.errorhandler(UnknownTenant)
+def unknown_tenant(e):
+    return jsonify({'success': False, 'error': f'Unknown site_id: {e.args[0]}'}), 404
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/healthz')
+def healthz():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 503 until the background warm-up has finished"""
+    report = warmup.report()
+    return jsonify(report), 200 if report['ready'] else 503
+
 @app.route('/download-guide')
 def download_guide():
     """Serve the PDF guide for download"""
     try:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.lib.colors import HexColor
-        import io
-        
-        # Create PDF in memory
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        story = []
-        
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            textColor=HexColor('#2c3e50'),
-            alignment=1  # Center alignment
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=16,
-            spaceAfter=12,
-            spaceBefore=20,
-            textColor=HexColor('#34495e')
-        )
-        
-        body_style = ParagraphStyle(
-            'CustomBody',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=8,
-            textColor=HexColor('#2c3e50')
-        )
-        
-        # Add title
-        story.append(Paragraph("10 LEAD GENERATION STRATEGIES THAT ACTUALLY WORK", title_style))
-        story.append(Spacer(1, 20))
-        
-        # Add introduction
-        intro_text = """
-        This comprehensive guide will help you implement proven lead generation strategies 
-        that will attract qualified prospects and grow your business. Each strategy includes 
-        practical tips and actionable steps you can implement immediately.
-        """
-        story.append(Paragraph(intro_text, body_style))
-        story.append(Spacer(1, 20))
-        
-        # Add strategies
-        strategies = [
-            {
-                "title": "1. CONTENT MARKETING",
-                "content": "• Create valuable blog posts, videos, and infographics<br/>• Focus on solving your audience's problems<br/>• Use SEO to attract organic traffic"
-            },
-            {
-                "title": "2. SOCIAL MEDIA ENGAGEMENT",
-                "content": "• Build relationships on LinkedIn, Twitter, and Facebook<br/>• Share industry insights and thought leadership<br/>• Engage with potential prospects' content"
-            },
-            {
-                "title": "3. EMAIL MARKETING",
-                "content": "• Build targeted email lists<br/>• Create compelling lead magnets<br/>• Use automation for follow-up sequences"
-            },
-            {
-                "title": "4. REFERRAL PROGRAMS",
-                "content": "• Incentivize existing customers to refer others<br/>• Create a structured referral process<br/>• Track and reward successful referrals"
-            },
-            {
-                "title": "5. PARTNERSHIPS",
-                "content": "• Collaborate with complementary businesses<br/>• Cross-promote each other's services<br/>• Share leads and revenue"
-            },
-            {
-                "title": "6. WEBINARS AND EVENTS",
-                "content": "• Host educational webinars<br/>• Attend industry conferences<br/>• Network with potential prospects"
-            },
-            {
-                "title": "7. COLD OUTREACH",
-                "content": "• Research and personalize your approach<br/>• Use multiple channels (email, LinkedIn, phone)<br/>• Follow up consistently"
-            },
-            {
-                "title": "8. ACCOUNT-BASED MARKETING",
-                "content": "• Target specific high-value accounts<br/>• Create personalized campaigns<br/>• Use multiple touchpoints"
-            },
-            {
-                "title": "9. INFLUENCER MARKETING",
-                "content": "• Partner with industry influencers<br/>• Leverage their audience and credibility<br/>• Create mutually beneficial relationships"
-            },
-            {
-                "title": "10. OPTIMIZATION AND TESTING",
-                "content": "• A/B test your landing pages<br/>• Optimize your conversion funnel<br/>• Continuously improve based on data"
-            }
-        ]
-        
-        for strategy in strategies:
-            story.append(Paragraph(strategy["title"], heading_style))
-            story.append(Paragraph(strategy["content"], body_style))
-            story.append(Spacer(1, 15))
-        
-        # Add bonus section
-        story.append(Spacer(1, 20))
-        bonus_heading = Paragraph("BONUS: AI-POWERED LEAD GENERATION", heading_style)
-        story.append(bonus_heading)
-        
-        bonus_content = """
-        • Use chatbots for 24/7 lead qualification<br/>
-        • Automate follow-up sequences<br/>
-        • Personalize content based on behavior<br/>
-        • Score leads automatically
-        """
-        story.append(Paragraph(bonus_content, body_style))
-        
-        # Add conclusion
-        story.append(Spacer(1, 20))
-        conclusion_text = """
-        <b>Remember:</b> Quality over quantity. Focus on attracting and converting the right prospects for your business.
-        
-        For more strategies and implementation tips, visit LeadCraft AI at leadcraftai.com
-        """
-        story.append(Paragraph(conclusion_text, body_style))
-        
-        # Build PDF
-        doc.build(story)
-        buffer.seek(0)
+        tenant = tenants.get(request.args.get('site_id'))
+        pdf, etag, last_modified = tenant.guide()
         
+        # conditional=True answers If-None-Match/If-Modified-Since with 304 and honours Range
         return send_file(
-            buffer,
+            io.BytesIO(pdf),
             as_attachment=True,
-            download_name='10_lead_generation_strategies.pdf',
-            mimetype='application/pdf'
+            download_name=tenant.guide_download_name,
+            mimetype='application/pdf',
+            etag=etag,
+            last_modified=last_modified,
+            conditional=True,
+            max_age=3600
         )
         
+    except UnknownTenant:
+        raise
     except Exception as e:
         print(f"Error creating PDF: {e}")
         return jsonify({'error': 'Error creating PDF'}), 500
@@ -204,21 +182,36 @@ def ask():
         user_message = data.get('message', '')
         session_id = data.get('session_id', 'default')
         
-        # Get response from agent
-        response = run_agent(user_message, session_id)
+        admission, retry_after = admit_ask(data, request.remote_addr)
+        if admission == 'rate_limited':
+            return jsonify(rate_limited_body()), 429, retry_after_header(retry_after)
+        
+        # Get response from agent; site_id selects the client site's knowledge base and offers.
+        # While shedding load the answer comes from the FAQ alone
+        if admission == 'shed':
+            response, timings = answer_from_faq(user_message, data.get('site_id'), None, session_id)
+        else:
+            response, timings = run_agent_with_timings(user_message, session_id, data.get('site_id'))
         
         # Check if we should offer the lead magnet
         should_offer_lead_magnet = check_lead_magnet_trigger(user_message, response)
         
         # Generate suggested questions based on the conversation
+        started = time.perf_counter()
         suggested_questions = generate_suggested_questions(user_message, response)
+        timings['suggested_questions'] = round((time.perf_counter() - started) * 1000, 2)
+        metrics.observe_timings(timings)
         
         return jsonify({
             'response': response,
             'show_email_capture': should_offer_lead_magnet,
-            'suggested_questions': suggested_questions
+            'suggested_questions': suggested_questions,
+            'timings': timings,
+            'degraded': admission == 'shed'
         })
         
+    except UnknownTenant:
+        raise
     except Exception as e:
         return jsonify({
             'response': 'Sorry, I encountered an error. Please try again.',
@@ -226,35 +219,93 @@ def ask():
             'suggested_questions': []
         }), 500
 
+def sse_event(data, event=None):
+    """Format a Server-Sent Events message"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    """Stream the agent response as Server-Sent Events.
+
+    Each model token is sent as a `data: {"token": ...}` message. Once the
+    reply is complete a final `done` event carries the same fields as /ask.
+    """
+    data = request.get_json() or {}
+    user_message = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+    # Resolved up front so an unknown site is a 404 rather than an error event
+    site_id = tenants.get(data.get('site_id')).site_id
+    admission, retry_after = admit_ask(data, request.remote_addr)
+    if admission == 'rate_limited':
+        return Response(sse_event(rate_limited_body(), event='error'), status=429, mimetype='text/event-stream',
+                        headers=retry_after_header(retry_after))
+    
+    def generate():
+        parts = []
+        timings = {}
+        try:
+            if admission == 'shed':
+                tokens = [answer_from_faq(user_message, site_id, timings, session_id)[0]]
+            else:
+                tokens = stream_agent(user_message, session_id, timings, site_id)
+            for token in tokens:
+                parts.append(token)
+                yield sse_event({'token': token})
+            
+            response = "".join(parts)
+            started = time.perf_counter()
+            suggested_questions = generate_suggested_questions(user_message, response)
+            timings['suggested_questions'] = round((time.perf_counter() - started) * 1000, 2)
+            metrics.observe_timings(timings, prefix='stream_')
+            yield sse_event({
+                'show_email_capture': check_lead_magnet_trigger(user_message, response),
+                'suggested_questions': suggested_questions,
+                'timings': timings,
+                'degraded': admission == 'shed'
+            }, event='done')
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            yield sse_event({
+                'response': 'Sorry, I encountered an error. Please try again.',
+                'show_email_capture': False,
+                'suggested_questions': []
+            }, event='error')
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/capture-email', methods=['POST'])
 def capture_email():
     try:
         data = request.get_json()
         email = data.get('email', '').strip()
         session_id = data.get('session_id', 'default')
+        tenant = tenants.get(data.get('site_id'))
         
         if not email or '@' not in email:
             return jsonify({'success': False, 'message': 'Invalid email address'})
         
-        # Store the email (in production, save to database)
+        # Store the email
         email_record = {
             'email': email,
             'session_id': session_id,
             'timestamp': datetime.now().isoformat(),
-            'source': 'chatbot_lead_magnet'
+            'source': tenant_source('chatbot_lead_magnet', tenant),
+            'site_id': tenant.site_id
         }
-        captured_emails.append(email_record)
-        
-        # In production, you would:
-        # 1. Save to database
-        # 2. Send to email service (Mailchimp, ConvertKit, etc.)
-        # 3. Send the actual PDF guide
-        # 4. Track analytics
+        capture_pipeline.capture(email_record)
+        job_queue.enqueue('send_guide_email', {'email': email, 'site_id': tenant.site_id})
         
         print(f"Email captured: {email} from session {session_id}")
         
         return jsonify({'success': True, 'message': 'Email captured successfully'})
         
+    except UnknownTenant:
+        raise
     except Exception as e:
         return jsonify({'success': False, 'message': 'Error capturing email'}), 500
 
@@ -265,30 +316,29 @@ def submit_email():
         data = request.get_json()
         email = data.get('email', '').strip()
         session_id = data.get('session_id', 'default')
+        tenant = tenants.get(data.get('site_id'))
         
         if not email or '@' not in email:
             return jsonify({'success': False, 'message': 'Invalid email address'})
         
-        # Store the email (in production, save to database)
+        # Store the email
         email_record = {
             'email': email,
             'session_id': session_id,
             'timestamp': datetime.now().isoformat(),
-            'source': 'chatbot_lead_magnet',
+            'source': tenant_source('chatbot_lead_magnet', tenant),
+            'site_id': tenant.site_id,
             'lead_magnet': '10_lead_generation_strategies_pdf'
         }
-        captured_emails.append(email_record)
-        
-        # In production, you would:
-        # 1. Save to database
-        # 2. Send to email service (Mailchimp, ConvertKit, etc.)
-        # 3. Send the actual PDF guide
-        # 4. Track analytics
+        capture_pipeline.capture(email_record)
+        job_queue.enqueue('send_guide_email', {'email': email, 'site_id': tenant.site_id})
         
         print(f"Lead magnet email captured: {email} from session {session_id}")
         
         return jsonify({'success': True, 'message': 'Email captured successfully'})
         
+    except UnknownTenant:
+        raise
     except Exception as e:
         return jsonify({'success': False, 'message': 'Error capturing email'}), 500
 
@@ -297,48 +347,45 @@ def submit_lead():
     """Handle lead submission from chatbot qualification flow"""
     try:
         data = request.get_json()
+        tenant = tenants.get(data.get('site_id'))
         
-        # Extract lead data
+        # Extract lead data; it is stored in the site's own lead store
         lead_data = {
             'name': data.get('name', ''),
             'email': data.get('email', ''),
             'product': data.get('product', ''),
             'pain_point': data.get('pain_point', ''),
             'session_id': data.get('session_id', 'default'),
-            'timestamp': data.get('timestamp', datetime.now().isoformat()),
-            'source': 'chatbot_lead_qualification',
-            'lead_magnet': '10_lead_generation_strategies_pdf'
+            'timestamp': utc_timestamp(data.get('timestamp')),
+            'source': tenant_source('chatbot_lead_qualification', tenant),
+            'lead_magnet': '10_lead_generation_strategies_pdf',
+            'site_id': tenant.site_id
         }
         
         # Validate required fields
         if not lead_data['name'] or not lead_data['email']:
             return jsonify({'success': False, 'message': 'Missing required fields'})
         
-        # Store the lead (in production, save to database)
-        captured_emails.append(lead_data)
+        # Record the capture; the id is stable for this email and source
+        capture_id = capture_pipeline.capture(lead_data)
         
-        # Save lead to CSV file for Excel compatibility
-        csv_saved = save_lead_to_csv(lead_data)
-        
-        # In production, you would:
-        # 1. Save to database
-        # 2. Send to CRM (HubSpot, Salesforce, etc.)
-        # 3. Send welcome email with PDF guide
-        # 4. Track analytics
-        # 5. Trigger follow-up sequences
+        # Storing the lead, emailing the guide and the CRM push happen in the background
+        # The key makes the insert idempotent when a partly stored batch is retried
+        job_queue.enqueue('persist_lead', dict(lead_data, lead_key=uuid.uuid4().hex))
+        job_queue.enqueue('send_guide_email', {'email': lead_data['email'], 'name': lead_data['name'], 'site_id': tenant.site_id})
+        job_queue.enqueue('crm_push', dict(lead_data, lead_id=f"lead_{capture_id}"))
         
         print(f"Lead captured: {lead_data['name']} ({lead_data['email']}) from session {lead_data['session_id']}")
-        print(f"Product: {lead_data['product']}")
-        print(f"Pain point: {lead_data['pain_point']}")
-        print(f"CSV saved: {csv_saved}")
         
         return jsonify({
             'success': True, 
             'message': 'Lead captured successfully',
-            'lead_id': f"lead_{len(captured_emails)}",
-            'download_link': '/download-guide' # Provide a download link
+            'lead_id': f"lead_{capture_id}",
+            'download_link': '/download-guide' if tenant is tenants.default else f'/download-guide?site_id={tenant.site_id}'
         })
         
+    except UnknownTenant:
+        raise
     except Exception as e:
         print(f"Error capturing lead: {e}")
         return jsonify({'success': False, 'message': 'Error capturing lead'}), 500
@@ -349,18 +396,21 @@ def book_call():
     try:
         data = request.get_json()
         user_response = data.get('response', '').lower()
+        tenant = tenants.get(data.get('site_id'))
         
         if 'yes' in user_response or 'book' in user_response or 'call' in user_response:
             return jsonify({
                 'success': True,
                 'message': 'Great! I\'ve sent the booking link. Please check your email for the calendar invite. Looking forward to our call! 📞',
-                'booking_link': 'https://calendly.com/your-calendar/15min-strategy-call'
+                'booking_link': tenant.booking_link
             })
         else:
             return jsonify({
                 'success': True,
                 'message': 'No worries! If you change your mind, just let me know. I\'m here to help with any questions about lead generation strategies.'
             })
+    except UnknownTenant:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -371,139 +421,148 @@ def check_lead_magnet_trigger(user_message, agent_response):
     """
     Determine if we should offer the lead magnet based on user message and response
     """
-    user_lower = user_message.lower()
-    
-    # Trigger words that indicate interest in lead generation
-    trigger_words = [
-        'lead', 'leads', 'generation', 'prospecting', 'sales', 'outreach',
-        'automation', 'strategy', 'guide', 'pdf', 'download', 'free',
-        'how to', 'tips', 'best practices', 'strategies'
-    ]
-    
-    # Check if user message contains trigger words
-    has_trigger_words = any(word in user_lower for word in trigger_words)
-    
-    # Check if this is a qualified lead (shows buying intent)
-    is_qualified = any(word in user_lower for word in ['pricing', 'cost', 'plan', 'demo', 'trial', 'start'])
-    
-    return has_trigger_words or is_qualified
+    # Offer it on interest in lead generation or on buying intent
+    return intent_engine.matches(user_message, 'lead_magnet_interest', 'buying_intent')
 
 def generate_suggested_questions(user_message, agent_response):
     """
     Generate contextual suggested questions based on the conversation
     """
-    user_lower = user_message.lower()
-    response_lower = agent_response.lower()
-    
-    # Default suggestions
-    default_suggestions = [
-        "What does LeadCraft AI do?",
-        "Is there a free plan?",
-        "Show me pricing"
-    ]
-    
-    # Contextual suggestions based on conversation
-    if any(word in user_lower for word in ['pricing', 'cost', 'plan', 'price']):
-        return [
-            "What's included in the premium plan?",
-            "Is there a free trial?",
-            "Can I cancel anytime?"
-        ]
-    
-    elif any(word in user_lower for word in ['integration', 'connect', 'crm', 'hubspot']):
-        return [
-            "What other integrations do you support?",
-            "How does the setup process work?",
-            "Can I import my existing contacts?"
-        ]
-    
-    elif any(word in user_lower for word in ['demo', 'trial', 'test', 'start']):
-        return [
-            "How do I get started?",
-            "What's the setup time?",
-            "Do you offer onboarding support?"
-        ]
-    
-    elif any(word in user_lower for word in ['lead', 'leads', 'generation']):
-        return [
-            "How quickly will I see results?",
-            "What kind of leads do you generate?",
-            "Can I customize the AI responses?"
-        ]
-    
-    elif any(word in user_lower for word in ['ai', 'artificial intelligence', 'machine learning']):
-        return [
-            "How does the AI work?",
-            "Can I train it on my product?",
-            "What makes your AI different?"
-        ]
-    
-    # If response mentions lead magnet, suggest related questions
-    elif 'pdf' in response_lower or 'guide' in response_lower:
-        return [
-            "What other resources do you have?",
-            "Can I see a demo first?",
-            "How do I get started?"
-        ]
-    
-    # Return default suggestions if no specific context
-    return default_suggestions[:3]  # Limit to 3 suggestions
+    return intent_engine.suggested_questions(user_message, agent_response)
 
 @app.route('/captured-emails')
 def get_captured_emails():
-    """Admin endpoint to view captured emails (for testing)"""
-    return jsonify(captured_emails)
+    """Admin endpoint to view a site's captured emails, newest first"""
+    page = request.args.get('page', 1, type=int)
+    per_page = max(min(request.args.get('per_page', 50, type=int), 500), 1)
+    site_id = tenants.get(request.args.get('site_id')).site_id
+    captures, total = capture_pipeline.page(page, per_page, site_id)
+    return jsonify({'captures': captures, 'total': total, 'page': page, 'per_page': per_page, 'site_id': site_id,
+                    'dropped': capture_pipeline.dropped})
+
+@app.route('/cache-stats')
+def cache_stats():
+    """Admin endpoint with response cache hit/miss counters"""
+    return jsonify(response_cache.stats())
+
+@app.route('/qualifier-stats')
+def qualifier_stats():
+    """Admin endpoint with the number of qualifications each tier absorbed"""
+    return jsonify(qualifier.stats())
+
+@app.route('/llm-stats')
+def llm_stats():
+    """Admin endpoint with OpenAI request, retry and coalescing counters"""
+    return jsonify(llm.stats())
+
+@app.route('/agent-path-stats')
+def agent_path_stats_endpoint():
+    """Admin endpoint with turns, latency and FAQ fast path hit rate per reply path"""
+    return jsonify(agent_path_stats())
+
+@app.route('/admission-stats')
+def admission_stats():
+    """Admin endpoint with /ask rate limiting and load shedding counters"""
+    return jsonify({'rate_limiter': rate_limiter.stats(), 'load_shedder': load_shedder.stats()})
+
+@app.route('/tenant-stats')
+def tenant_stats():
+    """Admin endpoint with tenant cache hits, loads, evictions and resident sites"""
+    return jsonify(tenants.stats())
+
+@app.route('/job-stats')
+def job_stats():
+    """Admin endpoint with background job counts by type and status"""
+    return jsonify(job_queue.stats())
+
+@app.route('/dead-letter-jobs', methods=['GET', 'POST'])
+def dead_letter_jobs():
+    """List jobs that exhausted their retries; POST {"ids": [...]} (or no ids for all) to requeue them"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        return jsonify({'requeued': job_queue.retry_dead(data.get('ids'))})
+    return jsonify({'jobs': job_queue.dead_letters(min(request.args.get('limit', 100, type=int), 500))})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/dashboard')
 def dashboard():
     """Admin dashboard for client management"""
+    page = request.args.get('page', 1, type=int)
+    per_page = max(min(request.args.get('per_page', 50, type=int), 500), 1)
+    sort = request.args.get('sort', 'timestamp')
+    order = request.args.get('order', 'desc')
+    store = site_lead_store()
     try:
-        # Read leads from CSV file
-        leads = []
-        csv_file = 'leads.csv'
-        
-        if os.path.exists(csv_file):
-            with open(csv_file, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    leads.append(row)
-        
-        # Sort leads by timestamp (newest first)
-        leads.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        leads = store.page(page, per_page, sort, order)
         
-        # Calculate some basic stats
-        total_leads = len(leads)
-        recent_leads = len([lead for lead in leads if lead.get('timestamp', '').startswith('2025-07-20')])
+        # Stats come from the incrementally maintained aggregates, not a scan of the leads
+        stats = store.stats()
+        total_pages = max((stats['total'] + per_page - 1) // per_page, 1)
         
-        return render_template('dashboard.html', leads=leads, total_leads=total_leads, recent_leads=recent_leads)
+        return render_template('dashboard.html', leads=leads, total_leads=stats['total'], recent_leads=stats['today'],
+                               stats=stats, lead_scores=lead_score_distribution(request.args.get('site_id')),
+                               page=page, per_page=per_page, total_pages=total_pages, sort=sort, order=order,
+                               site_id=request.args.get('site_id', ''))
         
     except Exception as e:
         print(f"Error loading dashboard: {e}")
-        return render_template('dashboard.html', leads=[], total_leads=0, recent_leads=0)
+        return render_template('dashboard.html', leads=[], total_leads=0, recent_leads=0, stats=None, lead_scores={},
+                               page=1, per_page=per_page, total_pages=1, sort=sort, order=order,
+                               site_id=request.args.get('site_id', ''))
+
+@app.route('/dashboard-stats')
+def dashboard_stats():
+    """Dashboard aggregates as JSON for charts: counts per day/hour, product and pain point, and lead scores"""
+    days = max(min(request.args.get('days', 14, type=int), 366), 1)
+    hours = max(min(request.args.get('hours', 48, type=int), 24 * 31), 1)
+    stats = site_lead_store().stats(days=days, hours=hours, top=request.args.get('top', 10, type=int))
+    return jsonify(dict(stats, lead_scores=lead_score_distribution(request.args.get('site_id'))))
+
+def filtered_leads():
+    """Lead iterator for the export date range (start/end) and field filters in the query string"""
+    filters = {field: request.args[field] for field in FILTER_FIELDS if request.args.get(field)}
+    return site_lead_store().iter_filtered(request.args.get('start'), request.args.get('end'), filters)
 
 @app.route('/download-leads-csv')
 def download_leads_csv():
     """Download leads CSV file for Excel"""
+    return Response(
+        stream_with_context(export_csv(filtered_leads())),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=leads_export.csv'}
+    )
+
+@app.route('/download-leads-ndjson')
+def download_leads_ndjson():
+    """Download leads as newline-delimited JSON"""
+    return Response(
+        stream_with_context(export_ndjson(filtered_leads())),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=leads_export.ndjson'}
+    )
+
+@app.route('/import-leads', methods=['POST'])
+def import_leads():
+    """Bulk import leads from an uploaded CSV or NDJSON file, deduplicated by email"""
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+    
+    store = site_lead_store()
+    fmt = request.args.get('format') or ('ndjson' if upload.filename.endswith(('.ndjson', '.jsonl')) else 'csv')
     try:
-        csv_file = 'leads.csv'
-        
-        if not os.path.exists(csv_file):
-            # Create empty CSV with headers if file doesn't exist
-            fieldnames = ['timestamp', 'name', 'email', 'product', 'pain_point', 'session_id']
-            with open(csv_file, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-        
-        return send_file(
-            csv_file,
-            as_attachment=True,
-            download_name='leads_export.csv',
-            mimetype='text/csv'
-        )
-        
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+        stats = store.import_leads(read_leads(stream, fmt))
+        print(f"Imported leads from {upload.filename}: {stats}")
+        return jsonify(dict(stats, success=True))
     except Exception as e:
-        print(f"Error downloading CSV: {e}")
-        return jsonify({'error': 'Error downloading CSV file'}), 500
+        print(f"Error importing leads: {e}")
+        return jsonify({'success': False, 'message': f'Error importing leads: {str(e)}'}), 400
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Development server only; production runs gunicorn asgi:app -c gunicorn.conf.py
+    app.run(debug=os.getenv('FLASK_DEBUG', '0') == '1')
\ No newline at end of file
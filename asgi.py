@@ -0,0 +1,189 @@
+"""ASGI entry point.
+
+The conversation endpoints (/ask, /ask/stream) run as native async handlers on
+the async OpenAI client, so a single process can hold many in-flight
+conversations. Every other route is served by the Flask app through a WSGI
+adapter, so the two modes expose the same URLs.
+
+Run with: gunicorn asgi:app -c gunicorn.conf.py
+"""
+import asyncio
+import contextlib
+import threading
+import time
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.datastructures import MutableHeaders
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import metrics
+from agent import answer_from_faq, arun_agent_with_timings, astream_agent, llm, tenants
+from app import (PROFILE_DIR, PROFILE_REQUESTS, app as flask_app, admit_ask, client_ip, check_lead_magnet_trigger,
+                 generate_suggested_questions, rate_limited_body, retry_after_header, sse_event)
+from tenants import UnknownTenant
+
+
+class RequestMetrics:
+    """Request latency and ?profile=1 profiles for the native routes.
+
+    Does for paths what app.py's before/after_request hooks do for the Flask
+    routes; the mounted Flask app records its own requests.
+    """
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        profiler = None
+        if PROFILE_REQUESTS and parse_qs(scope.get('query_string', b'').decode()).get('profile') == ['1']:
+            # Samples the event loop thread, so other requests served meanwhile show up too
+            profiler = metrics.SamplingProfiler(threading.get_ident()).start()
+        
+        async def send_with_metrics(message):
+            nonlocal profiler
+            if message['type'] == 'http.response.start':
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route=scope['path'], method=scope['method'],
+                                                status=str(message['status']))
+                if profiler:
+                    path = profiler.stop().save(PROFILE_DIR, scope['path'].strip('/').replace('/', '_'))
+                    MutableHeaders(scope=message).append('X-Profile-File', path)
+                    profiler = None
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if profiler:
+                profiler.stop()
+
+
+def unknown_site(e):
+    return JSONResponse({'success': False, 'error': f'Unknown site_id: {e.args[0]}'}, status_code=404)
+
+
+async def admit(request, data):
+    # The limiter may take a SQLite write lock, so it runs off the event loop
+    ip = client_ip(request.headers.get('x-forwarded-for'), request.client.host if request.client else '')
+    return await asyncio.to_thread(admit_ask, data, ip)
+
+
+async def ask(request):
+    try:
+        data = await request.json()
+        user_message = data.get('message', '')
+        session_id = data.get('session_id', 'default')
+        
+        admission, retry_after = await admit(request, data)
+        if admission == 'rate_limited':
+            return JSONResponse(rate_limited_body(), status_code=429, headers=retry_after_header(retry_after))
+        
+        if admission == 'shed':
+            response, timings = await asyncio.to_thread(answer_from_faq, user_message, data.get('site_id'), None, session_id)
+        else:
+            response, timings = await arun_agent_with_timings(user_message, session_id, data.get('site_id'))
+        
+        started = time.perf_counter()
+        suggested_questions = generate_suggested_questions(user_message, response)
+        timings['suggested_questions'] = round((time.perf_counter() - started) * 1000, 2)
+        metrics.observe_timings(timings)
+        
+        return JSONResponse({
+            'response': response,
+            'show_email_capture': check_lead_magnet_trigger(user_message, response),
+            'suggested_questions': suggested_questions,
+            'timings': timings,
+            'degraded': admission == 'shed'
+        })
+        
+    except UnknownTenant as e:
+        return unknown_site(e)
+    except Exception:
+        return JSONResponse({
+            'response': 'Sorry, I encountered an error. Please try again.',
+            'show_email_capture': False,
+            'suggested_questions': []
+        }, status_code=500)
+
+
+async def ask_stream(request):
+    """Stream the agent response as Server-Sent Events (same events as the Flask route)"""
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    user_message = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+    # Resolved up front so an unknown site is a 404 rather than an error event
+    try:
+        site_id = tenants.get(data.get('site_id')).site_id
+    except UnknownTenant as e:
+        return unknown_site(e)
+    admission, retry_after = await admit(request, data)
+    if admission == 'rate_limited':
+        return StreamingResponse(iter([sse_event(rate_limited_body(), event='error')]), status_code=429,
+                                 media_type='text/event-stream', headers=retry_after_header(retry_after))
+    
+    async def generate():
+        parts = []
+        timings = {}
+        try:
+            if admission == 'shed':
+                response, _ = await asyncio.to_thread(answer_from_faq, user_message, site_id, timings, session_id)
+                parts.append(response)
+                yield sse_event({'token': response})
+            else:
+                async for token in astream_agent(user_message, session_id, timings, site_id):
+                    parts.append(token)
+                    yield sse_event({'token': token})
+            
+            response = "".join(parts)
+            started = time.perf_counter()
+            suggested_questions = generate_suggested_questions(user_message, response)
+            timings['suggested_questions'] = round((time.perf_counter() - started) * 1000, 2)
+            metrics.observe_timings(timings, prefix='stream_')
+            yield sse_event({
+                'show_email_capture': check_lead_magnet_trigger(user_message, response),
+                'suggested_questions': suggested_questions,
+                'timings': timings,
+                'degraded': admission == 'shed'
+            }, event='done')
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            yield sse_event({
+                'response': 'Sorry, I encountered an error. Please try again.',
+                'show_email_capture': False,
+                'suggested_questions': []
+            }, event='error')
+    
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    # The async OpenAI calls keep a pooled aiohttp session open on this loop
+    await llm.aclose()
+
+
+native_routes = [
+    Route('/ask', ask, methods=['POST']),
+    Route('/ask/stream', ask_stream, methods=['POST']),
+]
+
+app = Starlette(lifespan=lifespan, middleware=[Middleware(RequestMetrics, paths=[route.path for route in native_routes])], routes=[
+    *native_routes,
+    # Remaining routes (/submit_lead, /dashboard, downloads, ...) run in the WSGI thread pool
+    Mount('/', app=WSGIMiddleware(flask_app)),
+])
@@ -0,0 +1,120 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Serves POST /v1/chat/completions (plain and streamed) with configurable
+time-to-first-token, token rate and error rate, so the app can be load-tested
+offline. Point the app at it with OPENAI_API_BASE=http://127.0.0.1:<port>/v1.
+
+    python benchmarks/fake_openai.py --port 8001 --latency-ms 300 --tokens-per-sec 50
+"""
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("LeadCraft AI captures and qualifies leads around the clock, answers product "
+         "questions from your FAQ, and hands warm prospects to your sales team with "
+         "full conversation context so follow-ups feel personal and timely").split()
+
+
+def _reply_text(request, reply_tokens):
+    """Deterministic reply shaped like what the calling prompt expects"""
+    messages = request.get("messages", [])
+    system = messages[0]["content"] if messages else ""
+    last = messages[-1]["content"] if messages else ""
+    digest = int(hashlib.sha1(last.encode("utf-8")).hexdigest(), 16)
+    if "lead qualification expert" in system:
+        return "qualified" if digest % 2 else "not_qualified"
+    count = min(reply_tokens, request.get("max_tokens") or reply_tokens)
+    return " ".join(WORDS[(digest + i) % len(WORDS)] for i in range(count))
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        settings = self.settings
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+        if random.random() < settings.error_rate:
+            return self._send_json(429, {"error": {"message": "Rate limit reached (simulated)", "type": "requests"}})
+
+        tokens = _reply_text(request, settings.reply_tokens).split(" ")
+        completion_id = f"chatcmpl-fake{random.getrandbits(48):012x}"
+        created = int(time.time())
+        per_token = 1.0 / settings.tokens_per_sec if settings.tokens_per_sec > 0 else 0.0
+        time.sleep(max(0.0, random.gauss(settings.latency_ms, settings.jitter_ms)) / 1000)
+
+        if not request.get("stream"):
+            time.sleep(per_token * len(tokens))
+            return self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": request.get("model", "gpt-3.5-turbo"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": request.get("model", "gpt-3.5-turbo"),
+                "choices": [{"index": 0, "delta": {"content": token if i == 0 else " " + token}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(per_token)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def serve(port=8001, latency_ms=300.0, jitter_ms=50.0, tokens_per_sec=50.0, reply_tokens=60, error_rate=0.0, seed=None):
+    random.seed(seed)
+    handler = type("Handler", (FakeOpenAIHandler,), {"settings": argparse.Namespace(
+        latency_ms=latency_ms, jitter_ms=jitter_ms, tokens_per_sec=tokens_per_sec,
+        reply_tokens=reply_tokens, error_rate=error_rate
+    )})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    print(f"Fake OpenAI API on http://127.0.0.1:{port}/v1", flush=True)
+    server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server for benchmarks")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Standard deviation of the latency")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--reply-tokens", type=int, default=60, help="Reply length, capped by max_tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    serve(args.port, args.latency_ms, args.jitter_ms, args.tokens_per_sec, args.reply_tokens, args.error_rate, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Offline load test for LeadCraft AI.
+
+Starts the fake OpenAI server and the app (Flask dev server or gunicorn/ASGI)
+with throwaway databases, then runs concurrent simulated visitors against
+/ask, /submit_lead and /dashboard. Reports p50/p95/p99 latency per endpoint,
+throughput and server memory growth.
+
+    python benchmarks/load_test.py --sessions 50 --turns 5 --server asgi
+    python benchmarks/load_test.py --url http://127.0.0.1:5000   # existing server
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What does LeadCraft AI do?",
+    "How much does the premium plan cost?",
+    "Does it integrate with HubSpot?",
+    "Can I book a demo for my team?",
+    "What are the best lead generation strategies?",
+    "How quickly will I see results?",
+    "Is there a free trial?",
+    "I'm not sure this is for me",
+    "How does the AI qualify leads?",
+    "Can I customize the responses?",
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def rss_kb(pid):
+    """Resident memory of a process and its children in KiB (Linux /proc)"""
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return total
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds * 1000)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self):
+        report = {}
+        for name, values in sorted(self.samples.items()):
+            values = sorted(values)
+            report[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "mean_ms": round(sum(values) / len(values), 2),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+            }
+        return report
+
+
+def request(base_url, recorder, name, path, body=None, timeout=60):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, headers={"Content-Type": "application/json"} if data else {})
+    started = time.perf_counter()
+    ok = False
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            ok = response.status < 400
+    except (urllib.error.URLError, OSError):
+        pass
+    recorder.record(name, time.perf_counter() - started, ok)
+    return ok
+
+
+def visitor(base_url, recorder, index, turns, seed, think_ms):
+    """One simulated visitor: a short conversation, then a lead submission"""
+    rng = random.Random(seed * 100003 + index)
+    session_id = f"bench_{seed}_{index}"
+    for _ in range(turns):
+        request(base_url, recorder, "/ask", "/ask", {"message": rng.choice(QUESTIONS), "session_id": session_id})
+        if think_ms:
+            time.sleep(rng.uniform(0, think_ms) / 1000)
+    request(base_url, recorder, "/submit_lead", "/submit_lead", {
+        "name": f"Visitor {index}",
+        "email": f"visitor{index}.{seed}@example.com",
+        "product": "LeadCraft AI",
+        "pain_point": "Not enough qualified leads",
+        "session_id": session_id
+    })
+
+
+def admin(base_url, recorder, stop, interval):
+    while not stop.wait(interval):
+        request(base_url, recorder, "/dashboard", "/dashboard?per_page=50")
+
+
+def wait_until_up(url, timeout=120):
+    """Poll until the server answers 200 (on /ready that means warm-up has finished)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_servers(args, workdir):
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"),
+        "--port", str(args.llm_port), "--latency-ms", str(args.latency_ms),
+        "--tokens-per-sec", str(args.tokens_per_sec), "--error-rate", str(args.error_rate),
+        "--seed", str(args.seed)
+    ], stdout=subprocess.DEVNULL)
+
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.llm_port}/v1",
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "sk-benchmark",
+        "LEADS_DB_PATH": os.path.join(workdir, "leads.db"),
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions.db"),
+        "EVENT_LOG_DIR": os.path.join(workdir, "events"),
+        "BIND": f"127.0.0.1:{args.port}",
+        "FLASK_RUN_PORT": str(args.port),
+        # Every simulated visitor comes from 127.0.0.1; pass --env to benchmark the limiter itself
+        "RATE_LIMIT_IP_PER_MIN": "0",
+        "RATE_LIMIT_SESSION_PER_MIN": "0",
+    })
+    env.update(item.split("=", 1) for item in args.env)
+    if args.server == "asgi":
+        command = ["gunicorn", "asgi:app", "-c", "gunicorn.conf.py", "--workers", str(args.workers)]
+    else:
+        command = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(args.port), "--with-threads"]
+    app = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return fake, app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test /ask, /submit_lead and /dashboard against a fake LLM")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for --server asgi")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--llm-port", type=int, default=8001)
+    parser.add_argument("--sessions", type=int, default=20, help="Total simulated visitors")
+    parser.add_argument("--concurrency", type=int, default=10, help="Visitors active at once")
+    parser.add_argument("--turns", type=int, default=4, help="/ask calls per visitor")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Max pause between a visitor's messages")
+    parser.add_argument("--dashboard-interval", type=float, default=1.0, help="Seconds between admin /dashboard loads")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Fake LLM time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="Fake LLM token rate")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake LLM calls answered with 429")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra environment for the app")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="leadcraft-bench-")
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+            server_pid = None
+        else:
+            processes = start_servers(args, workdir)
+            base_url = f"http://127.0.0.1:{args.port}"
+            server_pid = processes[1].pid
+        wait_until_up(base_url + "/ready")
+
+        # One request per endpoint first so imports and index loading aren't measured
+        warmup = Recorder()
+        visitor(base_url, warmup, -1, 1, args.seed, 0)
+        request(base_url, warmup, "/dashboard", "/dashboard")
+        rss_start = rss_kb(server_pid) if server_pid else None
+        rss_peak = rss_start or 0
+
+        recorder = Recorder()
+        stop = threading.Event()
+        admin_thread = threading.Thread(target=admin, args=(base_url, recorder, stop, args.dashboard_interval), daemon=True)
+        started = time.perf_counter()
+        admin_thread.start()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(visitor, base_url, recorder, i, args.turns, args.seed, args.think_ms) for i in range(args.sessions)]
+            while not all(future.done() for future in futures):
+                time.sleep(0.5)
+                if server_pid:
+                    rss_peak = max(rss_peak, rss_kb(server_pid))
+        stop.set()
+        admin_thread.join()
+        elapsed = time.perf_counter() - started
+
+        endpoints = recorder.summary()
+        total = sum(stats["count"] for stats in endpoints.values())
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key != "json_path"},
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+        if server_pid:
+            rss_end = rss_kb(server_pid)
+            report["memory_kb"] = {"start": rss_start, "end": rss_end, "peak": rss_peak, "growth": rss_end - rss_start}
+
+        print(f"{'endpoint':<14}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, stats in endpoints.items():
+            print(f"{name:<14}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+        print(f"throughput: {report['throughput_rps']} req/s over {report['elapsed_s']}s")
+        if "memory_kb" in report:
+            memory = report["memory_kb"]
+            print(f"server RSS: {memory['start']} -> {memory['end']} KiB (peak {memory['peak']}, growth {memory['growth']})")
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(report, f, indent=2)
+        return report
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Replay logged conversations against the agent with a stubbed LLM.
+
+Reads the turn event log (--events, else EVENT_LOG_DIR), re-drives each
+logged session's messages in order through agent.run_agent_with_timings with
+the OpenAI calls answered by benchmarks/fake_openai.py, and compares the
+replayed turns with the logged ones: reply path, FAQ match, qualification and
+offers, latency per path, and the funnel stats of both runs. Needs no OpenAI
+key; sessions and leads go to a throwaway directory.
+
+    python benchmarks/replay_events.py --events events
+    python benchmarks/replay_events.py --events events --stats-only
+    python benchmarks/replay_events.py --sessions 200 --concurrency 8 --json replay.json
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from event_log import funnel_stats, iter_events  # noqa: E402
+
+COMPARED = ("path", "faq_id", "qualified", "offers")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def latency_by_path(events):
+    """Turn latency (the logged total) per reply path"""
+    samples = {}
+    for event in events:
+        samples.setdefault(event["path"], []).append(event.get("timings", {}).get("total", 0.0))
+    report = {}
+    for path, values in sorted(samples.items()):
+        values = sorted(values)
+        report[path] = {
+            "turns": len(values),
+            "mean_ms": round(sum(values) / len(values), 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+        }
+    return report
+
+
+def load_sessions(directory, site=None, limit=None):
+    """Logged turns grouped into sessions, each in turn order; sessions ordered by first turn"""
+    sessions = {}
+    for event in iter_events(directory):
+        if site and event.get("site_id") != site:
+            continue
+        sessions.setdefault((event.get("site_id"), event.get("session_id")), []).append(event)
+    ordered = sorted(sessions.values(), key=lambda turns: min(turn["ts"] for turn in turns))
+    for turns in ordered:
+        turns.sort(key=lambda turn: turn["ts"])
+    return ordered[:limit] if limit else ordered
+
+
+def start_fake_llm(args):
+    process = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"),
+        "--port", str(args.llm_port), "--latency-ms", str(args.latency_ms), "--jitter-ms", "0",
+        "--tokens-per-sec", str(args.tokens_per_sec), "--seed", str(args.seed)
+    ], stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", args.llm_port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"Fake OpenAI server did not start on port {args.llm_port}")
+
+
+def replay_session(agent, index, turns):
+    """Re-drive one logged session under a fresh session id; returns the number of failed turns"""
+    site_id = turns[0].get("site_id")
+    failures = 0
+    for turn in turns:
+        try:
+            agent.run_agent_with_timings(turn["message"], f"replay-{index}", site_id)
+        except Exception as e:
+            print(f"Replay of session {index} failed: {e}")
+            failures += 1
+    return failures
+
+
+def compare(sessions, replayed):
+    """Agreement between logged and replayed turns on path, FAQ match, qualification and offers"""
+    by_session = {}
+    for event in replayed:
+        by_session.setdefault(event["session_id"].rsplit("replay-", 1)[-1], []).append(event)
+    agree = {field: 0 for field in COMPARED}
+    pairs = 0
+    differences = []
+    for index, turns in enumerate(sessions):
+        replay_turns = sorted(by_session.get(str(index), []), key=lambda turn: turn["ts"])
+        for turn, replay in zip(turns, replay_turns):
+            pairs += 1
+            changed = {}
+            for field in COMPARED:
+                if turn.get(field) == replay.get(field):
+                    agree[field] += 1
+                else:
+                    changed[field] = [turn.get(field), replay.get(field)]
+            if changed:
+                differences.append({"session": index, "message": turn["message"], "changed": changed})
+    return {
+        "turns": pairs,
+        "agreement": {field: round(count / pairs, 4) if pairs else 0.0 for field, count in agree.items()},
+        "differences": differences
+    }
+
+
+def print_latency(title, latency):
+    print(f"\n{title}")
+    print(f"{'path':<12}{'turns':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for path, stats in latency.items():
+        print(f"{path:<12}{stats['turns']:>7}{stats['mean_ms']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}")
+
+
+def print_funnel(title, stats):
+    print(f"\n{title}: {stats['turns']} turns, {stats['turns_per_session']} per session")
+    for stage, reached in stats["funnel"].items():
+        print(f"  {stage:<14}{reached['sessions']:>7}{reached['rate']:>9.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay logged /ask sessions against the agent with a fake LLM")
+    parser.add_argument("--events", default=os.getenv("EVENT_LOG_DIR") or "events", help="Event log directory to read")
+    parser.add_argument("--out", help="Directory for the replay's own event log (default: a temporary directory)")
+    parser.add_argument("--site", help="Only replay sessions of this site id")
+    parser.add_argument("--sessions", type=int, help="Replay at most this many sessions (oldest first)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Sessions replayed at once")
+    parser.add_argument("--stats-only", action="store_true", help="Only report funnel and latency stats of the log")
+    parser.add_argument("--llm-port", type=int, default=8002)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake LLM time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="Fake LLM token rate (0 = instant)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra environment for the agent")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    sessions = load_sessions(args.events, args.site, args.sessions)
+    logged = [turn for turns in sessions for turn in turns]
+    if not logged:
+        print(f"No events in {args.events}")
+        return None
+    report = {"logged": {"stats": funnel_stats(logged), "latency": latency_by_path(logged)}}
+    print_funnel("Logged", report["logged"]["stats"])
+    print_latency("Logged latency by path", report["logged"]["latency"])
+
+    if not args.stats_only:
+        workdir = tempfile.mkdtemp(prefix="leadcraft-replay-")
+        out = args.out or os.path.join(workdir, "events")
+        os.environ.update({
+            "OPENAI_API_BASE": f"http://127.0.0.1:{args.llm_port}/v1",
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "sk-replay",
+            "EVENT_LOG_DIR": out,
+            "SESSION_STORE": "memory",
+            "LEADS_DB_PATH": os.path.join(workdir, "leads.db"),
+        })
+        os.environ.update(item.split("=", 1) for item in args.env)
+        fake = start_fake_llm(args)
+        try:
+            os.chdir(ROOT)
+            import agent
+
+            # Load the indexes outside the replayed turns
+            agent.get_collection()
+            agent.get_lexical_index()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                failures = sum(pool.map(lambda item: replay_session(agent, *item), enumerate(sessions)))
+            elapsed = time.perf_counter() - started
+            if agent.event_log:
+                agent.event_log.close()
+        finally:
+            fake.terminate()
+            fake.wait(timeout=10)
+
+        replayed = list(iter_events(out))
+        report["replayed"] = {
+            "stats": funnel_stats(replayed),
+            "latency": latency_by_path(replayed),
+            "elapsed_s": round(elapsed, 2),
+            "failures": failures,
+            "events": out
+        }
+        report["comparison"] = compare(sessions, replayed)
+        print_funnel("Replayed", report["replayed"]["stats"])
+        print_latency("Replayed latency by path", report["replayed"]["latency"])
+        comparison = report["comparison"]
+        print(f"\nAgreement over {comparison['turns']} turns: " + ", ".join(
+            f"{field} {rate:.1%}" for field, rate in comparison["agreement"].items()))
+        for difference in comparison["differences"][:10]:
+            print(f"  session {difference['session']} {difference['message']!r}: {difference['changed']}")
+        print(f"Replayed in {report['replayed']['elapsed_s']}s with {failures} failed turns; events in {out}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
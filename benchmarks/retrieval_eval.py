@@ -0,0 +1,118 @@
+"""Offline relevance and latency evaluation for FAQ retrieval.
+
+Runs every query in retrieval_eval.json through the BM25 index, the vector
+index and the hybrid path the agent uses, and reports hit@1, hit@k, MRR and
+mean/p95 latency per mode. Needs no OpenAI key; the vector and hybrid modes
+need chromadb and build or open the local index.
+
+    python benchmarks/retrieval_eval.py
+    python benchmarks/retrieval_eval.py --modes lexical --json report.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import agent  # noqa: E402
+from faq_index import query_index  # noqa: E402
+from lexical_index import is_confident  # noqa: E402
+
+MODES = ["lexical", "vector", "hybrid"]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def lexical_ids(query, k):
+    return [hit["id"] for hit in agent.get_lexical_index().search(query, k)]
+
+
+def vector_ids(query, k):
+    return [hit["id"] for hit in query_index(agent.get_collection(), [query], k)[0]]
+
+
+def hybrid_ids(query, k):
+    return agent.search_docs(query, k)["source_ids"]
+
+
+SEARCHES = {"lexical": lexical_ids, "vector": vector_ids, "hybrid": hybrid_ids}
+
+
+def evaluate(mode, cases, k):
+    search = SEARCHES[mode]
+    search(cases[0]["query"], k)  # load the index outside the timed loop
+    latencies, hits_at_1, hits_at_k, reciprocal_ranks, misses = [], 0, 0, [], []
+    for case in cases:
+        started = time.perf_counter()
+        ids = search(case["query"], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        rank = ids.index(case["expected"]) + 1 if case["expected"] in ids else None
+        hits_at_1 += rank == 1
+        hits_at_k += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        if rank != 1:
+            misses.append({"query": case["query"], "expected": case["expected"], "got": ids})
+    n = len(cases)
+    return {
+        "queries": n,
+        "hit@1": round(hits_at_1 / n, 3),
+        f"hit@{k}": round(hits_at_k / n, 3),
+        "mrr": round(sum(reciprocal_ranks) / n, 3),
+        "mean_ms": round(sum(latencies) / n, 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "misses": misses
+    }
+
+
+def lexical_coverage(cases, k):
+    """Share of queries the hybrid path answers from BM25 alone, without a vector query"""
+    confident = sum(
+        is_confident(agent.get_lexical_index().search(case["query"], k), agent.LEXICAL_MIN_SCORE, agent.LEXICAL_DOMINANCE)
+        for case in cases
+    )
+    return round(confident / len(cases), 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate lexical, vector and hybrid FAQ retrieval")
+    parser.add_argument("--cases", default=os.path.join("benchmarks", "retrieval_eval.json"))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    with open(args.cases, encoding="utf-8") as f:
+        cases = json.load(f)
+
+    report = {"lexical_only_share": lexical_coverage(cases, args.k)}
+    for mode in args.modes:
+        try:
+            report[mode] = evaluate(mode, cases, args.k)
+        except ImportError as e:
+            print(f"Skipping {mode}: {e}")
+
+    print(f"{'mode':<10}{'hit@1':>8}{f'hit@{args.k}':>8}{'mrr':>8}{'mean ms':>10}{'p95 ms':>10}")
+    for mode in args.modes:
+        if mode in report:
+            r = report[mode]
+            print(f"{mode:<10}{r['hit@1']:>8}{r[f'hit@{args.k}']:>8}{r['mrr']:>8}{r['mean_ms']:>10}{r['p95_ms']:>10}")
+    print(f"\nAnswered by BM25 alone in hybrid mode: {report['lexical_only_share']:.0%}")
+    for mode in args.modes:
+        for miss in report.get(mode, {}).get("misses", []):
+            print(f"  {mode} miss: {miss['query']!r} expected {miss['expected']}, got {miss['got']}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
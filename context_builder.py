@@ -0,0 +1,173 @@
+import os
+import threading
+from functools import lru_cache
+
+# Tokenizer for the chat model, loaded on first use; False when tiktoken is unavailable
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+                except Exception:
+                    _encoding = False
+    return _encoding
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """Token count for the chat model, or a ~4 characters per token estimate without tiktoken"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+def make_message(role, content):
+    """Build a history message with its token count computed once"""
+    # The +4 covers the per-message role/separator overhead of the chat format
+    return {"role": role, "content": content, "tokens": count_tokens(content) + 4}
+
+
+def _message_tokens(message):
+    # Sessions saved before token counts existed are counted on read
+    return message.get("tokens") or count_tokens(message["content"]) + 4
+
+
+def cap_backlog(unsummarized, max_unsummarized):
+    """Keep the newest max_unsummarized queued messages (all of them when the cap is 0)"""
+    if max_unsummarized and len(unsummarized) > max_unsummarized:
+        return unsummarized[-max_unsummarized:]
+    return unsummarized
+
+
+def _truncate(text, budget):
+    """Cut text to roughly budget tokens on a word boundary"""
+    words, used = [], 0
+    for word in text.split(" "):
+        used += count_tokens(word + " ")
+        if used > budget:
+            break
+        words.append(word)
+    return " ".join(words)
+
+
+class ContextBuilder:
+    """Packs a rolling summary, recent turns and FAQ snippets into a token budget.
+
+    Recent messages are kept verbatim while they fit in history_budget tokens;
+    older ones move to the session's `unsummarized` list and are folded into
+    the rolling `summary` in batches of summary_batch messages. The backlog is
+    capped at max_unsummarized messages (the oldest are dropped), so failing
+    summary calls can't grow the session or the summary prompt without bound.
+    """
+
+    def __init__(self, budget=700, history_budget=400, faq_budget=300, summary_batch=4, summary_max_tokens=120,
+                 max_unsummarized=16, summary_message_tokens=150):
+        self.budget = budget
+        self.history_budget = history_budget
+        self.faq_budget = faq_budget
+        self.summary_batch = summary_batch
+        self.summary_max_tokens = summary_max_tokens
+        self.max_unsummarized = max_unsummarized
+        self.summary_message_tokens = summary_message_tokens
+
+    def trim(self, session):
+        """Move the oldest messages beyond the history budget to session['unsummarized']"""
+        messages = session["messages"]
+        used, keep = 0, len(messages)
+        for message in reversed(messages):
+            used += _message_tokens(message)
+            if used > self.history_budget and keep < len(messages):
+                break
+            keep -= 1
+        if keep:
+            session["unsummarized"] = cap_backlog(session.get("unsummarized", []) + messages[:keep], self.max_unsummarized)
+            session["messages"] = messages[keep:]
+        return session
+
+    def summary_batch_of(self, session):
+        """The oldest summary_batch queued messages: what one summary call folds in"""
+        return list(session.get("unsummarized", [])[:self.summary_batch])
+
+    def needs_summary(self, session):
+        return len(session.get("unsummarized", [])) >= self.summary_batch
+
+    def pack_faq(self, faq_answer, budget):
+        """Whole FAQ snippets in retrieval order, the last one truncated to fit"""
+        packed, used = [], 0
+        for snippet in faq_answer.split("\n\n"):
+            tokens = count_tokens(snippet)
+            if used + tokens > budget:
+                remaining = budget - used
+                if remaining > 20:
+                    packed.append(_truncate(snippet, remaining))
+                break
+            packed.append(snippet)
+            used += tokens
+        return "\n\n".join(packed)
+
+    def build(self, session, faq_answer, exclude_last=True):
+        """Return (conversation_context, faq_context, token_count) within the budget.
+
+        The newest message is the current user input, which the prompt already
+        carries separately, so it is left out of the history by default.
+        """
+        history = session["messages"][:-1] if exclude_last else session["messages"]
+        summary = session.get("summary", "")
+        summary_tokens = session.get("summary_tokens") or count_tokens(summary)
+
+        faq_context = self.pack_faq(faq_answer, min(self.faq_budget, self.budget))
+        remaining = self.budget - count_tokens(faq_context)
+        if summary_tokens > remaining:
+            summary, summary_tokens = "", 0
+        remaining -= summary_tokens
+
+        recent = []
+        for message in reversed(history):
+            tokens = _message_tokens(message)
+            if tokens > remaining:
+                break
+            recent.append(message)
+            remaining -= tokens
+        recent.reverse()
+
+        lines = [f"Summary of earlier conversation: {summary}"] if summary else []
+        lines += [f"{message['role']}: {message['content']}" for message in recent]
+        return "\n".join(lines), faq_context, self.budget - remaining
+
+    def summary_request(self, summary, messages):
+        """Chat completion arguments that fold messages into the running summary"""
+        # Each message is cut to summary_message_tokens so one long message can't blow up the prompt
+        transcript = "\n".join(
+            f"{message['role']}: {_truncate(message['content'], self.summary_message_tokens)}" for message in messages
+        )
+        return {
+            "model": "gpt-3.5-turbo",
+            "messages": [
+                {"role": "system", "content": "You maintain a running summary of a sales chat. Merge the new messages into the summary. Keep the visitor's needs, company, objections and anything they asked for. Reply with the updated summary only, under 80 words."},
+                {"role": "user", "content": f"Summary so far: {summary or '(none)'}\n\nNew messages:\n{transcript}"}
+            ],
+            "max_tokens": self.summary_max_tokens,
+            "temperature": 0.2
+        }
+
+
+def create_context_builder():
+    """Build the context builder from CONTEXT_* environment variables"""
+    return ContextBuilder(
+        budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "700")),
+        history_budget=int(os.getenv("CONTEXT_HISTORY_TOKENS", "400")),
+        faq_budget=int(os.getenv("CONTEXT_FAQ_TOKENS", "300")),
+        summary_batch=int(os.getenv("CONTEXT_SUMMARY_BATCH", "4")),
+        summary_max_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "120")),
+        max_unsummarized=int(os.getenv("CONTEXT_MAX_UNSUMMARIZED", "16"))
+    )
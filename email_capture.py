@@ -0,0 +1,161 @@
+import atexit
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+# Namespace for capture ids, so the same (email, source) always maps to the same id
+CAPTURE_NAMESPACE = uuid.UUID('6f1c2a52-8a0e-4c2b-9d55-3f4c5b7e2a10')
+
+
+def capture_id(email, source):
+    """Stable unique id for an (email, source) pair, identical across workers"""
+    return uuid.uuid5(CAPTURE_NAMESPACE, f"{source}:{email.strip().lower()}").hex
+
+
+class CapturePipeline:
+    """Buffers captured emails in memory and flushes them to SQLite in batches.
+
+    Captures are deduplicated on (email, source) both in the buffer and by a
+    unique index in the database. The buffer is flushed every flush_interval
+    seconds by a background thread, as soon as it holds max_buffer records,
+    and at interpreter exit. While the database is failing, captures pile up
+    to max_pending records; beyond that the oldest are dropped and counted.
+    """
+
+    def __init__(self, path='leads.db', max_buffer=500, flush_interval=2.0, max_pending=10000):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._buffer = {}
+        self._buffer_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS captured_emails (
+                id TEXT PRIMARY KEY,
+                email TEXT NOT NULL,
+                source TEXT NOT NULL,
+                session_id TEXT NOT NULL DEFAULT '',
+                name TEXT NOT NULL DEFAULT '',
+                lead_magnet TEXT NOT NULL DEFAULT '',
+                timestamp TEXT NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_captured_emails_email_source
+                ON captured_emails (email COLLATE NOCASE, source);
+            CREATE INDEX IF NOT EXISTS idx_captured_emails_timestamp ON captured_emails (timestamp);
+        """)
+        # Captures are listed per client site; older rows get their site back from the source suffix
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(captured_emails)")}
+        if 'site_id' not in columns:
+            self._conn.execute("ALTER TABLE captured_emails ADD COLUMN site_id TEXT NOT NULL DEFAULT 'default'")
+            self._conn.execute(
+                "UPDATE captured_emails SET site_id = substr(source, instr(source, ':') + 1) WHERE instr(source, ':') > 0"
+            )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_captured_emails_site ON captured_emails (site_id, timestamp)")
+        self._conn.commit()
+
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="capture-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def capture(self, record):
+        """Queue a capture and return its id"""
+        email = record['email'].strip()
+        source = record.get('source', '')
+        record_id = capture_id(email, source)
+        row = (
+            record_id,
+            email,
+            source,
+            record.get('session_id', ''),
+            record.get('name', ''),
+            record.get('lead_magnet', ''),
+            record.get('timestamp') or datetime.now().isoformat(),
+            record.get('site_id') or 'default'
+        )
+        with self._buffer_lock:
+            # Repeat captures of the same pair within a flush window are dropped
+            self._buffer.setdefault(record_id, row)
+            self._trim()
+            full = len(self._buffer) >= self.max_buffer
+        if full:
+            try:
+                self.flush()
+            except Exception as e:
+                # The capture stays buffered for the next flush; the visitor's request still succeeds
+                print(f"Error flushing captured emails: {e}")
+        return record_id
+
+    def _trim(self):
+        """Drop the oldest buffered captures beyond max_pending; caller holds the buffer lock"""
+        excess = len(self._buffer) - self.max_pending
+        if excess <= 0:
+            return
+        for record_id in list(self._buffer)[:excess]:
+            del self._buffer[record_id]
+        self.dropped += excess
+        print(f"Capture buffer full, dropped {excess} oldest captures ({self.dropped} in total)")
+
+    def flush(self):
+        """Write buffered captures to the database in one transaction"""
+        with self._buffer_lock:
+            rows = list(self._buffer.values())
+            self._buffer = {}
+        if not rows:
+            return 0
+        try:
+            with self._db_lock:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO captured_emails (id, email, source, session_id, name, lead_magnet, timestamp, site_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+        except Exception:
+            # Put the batch back ahead of newer captures so it is retried on the next flush
+            with self._buffer_lock:
+                retry = {row[0]: row for row in rows}
+                retry.update(self._buffer)
+                self._buffer = retry
+                self._trim()
+            raise
+        return len(rows)
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing captured emails: {e}")
+
+    def page(self, page=1, per_page=50, site_id='default'):
+        """Return one page of a site's captures, newest first, plus the total count.
+
+        Buffered captures are flushed first; if that fails they stay buffered
+        and the page shows what is already stored.
+        """
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing captured emails: {e}")
+        offset = (max(page, 1) - 1) * per_page
+        with self._db_lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM captured_emails WHERE site_id = ?", (site_id,)).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT * FROM captured_emails WHERE site_id = ? ORDER BY timestamp DESC, id LIMIT ? OFFSET ?",
+                (site_id, per_page, offset)
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def close(self):
+        self._stopped.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing captured emails: {e}")
@@ -0,0 +1,168 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+SEGMENT_PATTERN = "events-*.ndjson"
+
+
+class EventLog:
+    """Append-only NDJSON log of conversation turns, split into size-capped segments.
+
+    Every worker process writes its own segment files, so lines from concurrent
+    workers never interleave. A segment is closed and a new one started once it
+    would exceed max_bytes; the oldest segments beyond max_segments are deleted
+    (0 keeps them all), but only those no live process can still be writing:
+    this process's closed segments and those of processes that have exited.
+    Writing is one buffered write and flush per event, and a failed write is
+    counted rather than raised so logging never fails a turn.
+    """
+
+    def __init__(self, directory, max_bytes=16 * 1024 * 1024, max_segments=50):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._size = 0
+        self._pid = None
+        self.counters = {"events": 0, "segments": 0, "errors": 0}
+
+    def _open_segment(self):
+        if self._file:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        # Millisecond start time first so segment names sort by age
+        name = f"events-{int(time.time() * 1000):013d}-{os.getpid()}-{self.counters['segments']:05d}.ndjson"
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path, "ab")
+        self._size = self._file.tell()
+        self._pid = os.getpid()
+        self.counters["segments"] += 1
+        self._prune()
+
+    def _prune(self):
+        if self.max_segments <= 0:
+            return
+        segments = segment_paths(self.directory)
+        for path in segments[:max(0, len(segments) - self.max_segments)]:
+            if path == self._path or not self._closed(path):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _closed(self, path):
+        """True when no process can still append to the segment at path"""
+        pid = _segment_pid(path)
+        if pid is None:
+            return False
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass
+        return False
+
+    def append(self, event):
+        line = (json.dumps(event, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        with self._lock:
+            try:
+                # A forked worker must not share the parent's segment
+                if self._file is None or self._pid != os.getpid() or (self._size and self._size + len(line) > self.max_bytes):
+                    self._open_segment()
+                self._file.write(line)
+                self._file.flush()
+                self._size += len(line)
+                self.counters["events"] += 1
+            except OSError as e:
+                self.counters["errors"] += 1
+                print(f"Error writing event log: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, segment=self._path, segment_bytes=self._size)
+
+
+def _segment_pid(path):
+    # events-<start ms>-<pid>-<n>.ndjson
+    parts = os.path.basename(path).split("-")
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def segment_paths(directory):
+    """Segment files in a log directory, oldest first"""
+    return sorted(glob.glob(os.path.join(directory, SEGMENT_PATTERN)))
+
+
+def iter_events(directory):
+    """Yield the logged events of every segment, oldest segment first.
+
+    A line cut short by a crash mid-write is skipped.
+    """
+    for path in segment_paths(directory):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def funnel_stats(events):
+    """Turns by reply path and how far sessions got through the lead funnel"""
+    paths = Counter()
+    sessions = {}
+    for event in events:
+        paths[event.get("path")] += 1
+        key = (event.get("site_id"), event.get("session_id"))
+        session = sessions.setdefault(key, {"qualified": False, "warm": False, "guide_offered": False, "call_offered": False})
+        session["qualified"] |= bool(event.get("qualified"))
+        session["warm"] |= (event.get("lead_score") or 0) >= 2
+        session["guide_offered"] |= "guide" in event.get("offers", ())
+        session["call_offered"] |= "call" in event.get("offers", ())
+
+    turns = sum(paths.values())
+    count = len(sessions)
+    funnel = {"sessions": {"sessions": count, "rate": 1.0 if count else 0.0}}
+    for stage in ("qualified", "warm", "guide_offered", "call_offered"):
+        reached = sum(1 for session in sessions.values() if session[stage])
+        funnel[stage] = {"sessions": reached, "rate": round(reached / count, 4) if count else 0.0}
+    return {
+        "turns": turns,
+        "turns_per_session": round(turns / count, 2) if count else 0.0,
+        "paths": dict(paths),
+        "funnel": funnel
+    }
+
+
+def create_event_log():
+    """Build the turn event log from EVENT_LOG_* environment variables.
+
+    The log is opt-in: it stores visitors' raw messages and replies, so it is
+    only written when EVENT_LOG_DIR is set. Returns None otherwise.
+    """
+    directory = os.getenv("EVENT_LOG_DIR")
+    if not directory:
+        return None
+    return EventLog(
+        directory,
+        max_bytes=int(os.getenv("EVENT_LOG_MAX_BYTES", str(16 * 1024 * 1024))),
+        max_segments=int(os.getenv("EVENT_LOG_MAX_SEGMENTS", "50"))
+    )
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+
+# Files the FAQ index is built from
+KNOWLEDGE_FILES = ["faq.txt", "lead_generation_guide.txt"]
+
+# Paragraphs of free-form knowledge files are merged into chunks up to this size
+MAX_CHUNK_CHARS = 400
+
+# Where the persistent Chroma index lives on disk
+INDEX_DIR = os.getenv("FAQ_INDEX_DIR", ".chroma")
+
+COLLECTION_PREFIX = "faq_"
+
+# Every tenant's collection lives in the one Chroma system of INDEX_DIR; its loaded vector
+# segments are evicted least recently used first once they exceed this many MiB (0 = unbounded)
+INDEX_MEMORY_MB = int(os.getenv("FAQ_INDEX_MEMORY_MB", "512"))
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Chroma's default embedding function, created (and chromadb imported) on first use"""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                from chromadb.utils import embedding_functions
+                _embedder = embedding_functions.DefaultEmbeddingFunction()
+    return _embedder
+
+
+def embedding_function(texts):
+    """Embed texts in the same space as the index; shared by the other components"""
+    return get_embedder()(texts)
+
+
+def knowledge_hash(paths=KNOWLEDGE_FILES):
+    """Hash the knowledge files so the index is rebuilt only when they change"""
+    digest = hashlib.sha256(str(MAX_CHUNK_CHARS).encode("utf-8"))
+    for path in paths:
+        digest.update(path.encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def load_faq_docs(path="faq.txt"):
+    with open(path, "r") as f:
+        return [doc.strip() for doc in f.read().split("\n\n") if doc.strip()]
+
+
+def _parse_qa(doc):
+    """Split a 'Q: ... A: ...' paragraph into (question, answer)"""
+    question, _, answer = doc.partition("\nA:")
+    return question.replace("Q:", "", 1).strip(), answer.strip()
+
+
+def chunk_file(path):
+    """Split a knowledge file into (id, document, metadata) chunks.
+
+    Q/A files give one chunk per entry; other files are split on paragraphs
+    that are merged up to MAX_CHUNK_CHARS.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    docs = load_faq_docs(path)
+    chunks = []
+    if docs and all(doc.startswith("Q:") for doc in docs):
+        for i, doc in enumerate(docs):
+            question, answer = _parse_qa(doc)
+            metadata = {"source": path, "kind": "faq", "question": question, "answer": answer}
+            chunks.append((f"{stem}_{i}", doc, metadata))
+        return chunks
+
+    current = ""
+    for doc in docs + [None]:
+        if current and (doc is None or len(current) + len(doc) > MAX_CHUNK_CHARS):
+            metadata = {"source": path, "kind": "guide", "answer": current}
+            chunks.append((f"{stem}_{len(chunks)}", current, metadata))
+            current = ""
+        if doc is not None:
+            current = f"{current}\n\n{doc}" if current else doc
+    return chunks
+
+
+def _client(index_dir):
+    """The persistent Chroma client; settings must be the same for every client on a path"""
+    import chromadb
+    from chromadb.config import Settings
+
+    if INDEX_MEMORY_MB <= 0:
+        return chromadb.PersistentClient(path=index_dir)
+    settings = Settings(chroma_segment_cache_policy="LRU", chroma_memory_limit_bytes=INDEX_MEMORY_MB * 1024 * 1024)
+    return chromadb.PersistentClient(path=index_dir, settings=settings)
+
+
+def _collection_names(client):
+    # Older chromadb versions return Collection objects, newer ones return names
+    return [getattr(c, "name", c) for c in client.list_collections()]
+
+
+def build_collection(collection, chunks):
+    """Embed all knowledge chunks in a single batched call"""
+    collection.upsert(
+        ids=[chunk_id for chunk_id, _, _ in chunks],
+        documents=[doc for _, doc, _ in chunks],
+        metadatas=[metadata for _, _, metadata in chunks]
+    )
+
+
+def load_index(index_dir=INDEX_DIR, paths=KNOWLEDGE_FILES, prefix=COLLECTION_PREFIX):
+    """Open the persisted FAQ collection, building it only if the knowledge files changed.
+
+    Each knowledge base (e.g. one per tenant) uses its own collection prefix;
+    prefixes must end in '_' and contain no other '_' after COLLECTION_PREFIX.
+    """
+    client = _client(index_dir)
+    name = prefix + knowledge_hash(paths)
+    collection = client.get_or_create_collection(name=name, embedding_function=get_embedder())
+
+    chunks = [chunk for path in paths for chunk in chunk_file(path)]
+    if collection.count() != len(chunks):
+        print(f"Building FAQ index {name} ({len(chunks)} chunks)")
+        build_collection(collection, chunks)
+
+        # Drop indexes built from older versions of the knowledge files
+        for stale in _collection_names(client):
+            if stale.startswith(prefix) and "_" not in stale[len(prefix):] and stale != name:
+                client.delete_collection(stale)
+    return collection
+
+
+def query_index(collection, queries, k=3, where=None, query_embeddings=None):
+    """Return the top-k hits for each query as lists of {id, answer, score, metadata}.
+
+    All queries are embedded and searched in a single batched call. The score
+    is the cosine similarity derived from Chroma's squared L2 distance over
+    normalized embeddings.
+    """
+    kwargs = {"n_results": k, "include": ["metadatas", "distances"]}
+    if where:
+        kwargs["where"] = where
+    if query_embeddings is not None:
+        kwargs["query_embeddings"] = query_embeddings
+    else:
+        kwargs["query_texts"] = queries
+    results = collection.query(**kwargs)
+
+    hits = []
+    for ids, metadatas, distances in zip(results["ids"], results["metadatas"], results["distances"]):
+        hits.append([
+            {"id": chunk_id, "answer": metadata["answer"], "score": round(1 - distance / 2, 4), "metadata": metadata}
+            for chunk_id, metadata, distance in zip(ids, metadatas, distances)
+        ])
+    return hits
@@ -0,0 +1,184 @@
+import hashlib
+import io
+import json
+import threading
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+# Content definition of the "10 Lead Generation Strategies" guide. Changing
+# anything here changes the cache key (and ETag) of the rendered PDF; bump
+# CONTENT_UPDATED with it, since it is served as Last-Modified by every worker.
+CONTENT_UPDATED = datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+TITLE = "10 LEAD GENERATION STRATEGIES THAT ACTUALLY WORK"
+
+INTRO = """
+This comprehensive guide will help you implement proven lead generation strategies 
+that will attract qualified prospects and grow your business. Each strategy includes 
+practical tips and actionable steps you can implement immediately.
+"""
+
+STRATEGIES = [
+    {
+        "title": "1. CONTENT MARKETING",
+        "content": "• Create valuable blog posts, videos, and infographics<br/>• Focus on solving your audience's problems<br/>• Use SEO to attract organic traffic"
+    },
+    {
+        "title": "2. SOCIAL MEDIA ENGAGEMENT",
+        "content": "• Build relationships on LinkedIn, Twitter, and Facebook<br/>• Share industry insights and thought leadership<br/>• Engage with potential prospects' content"
+    },
+    {
+        "title": "3. EMAIL MARKETING",
+        "content": "• Build targeted email lists<br/>• Create compelling lead magnets<br/>• Use automation for follow-up sequences"
+    },
+    {
+        "title": "4. REFERRAL PROGRAMS",
+        "content": "• Incentivize existing customers to refer others<br/>• Create a structured referral process<br/>• Track and reward successful referrals"
+    },
+    {
+        "title": "5. PARTNERSHIPS",
+        "content": "• Collaborate with complementary businesses<br/>• Cross-promote each other's services<br/>• Share leads and revenue"
+    },
+    {
+        "title": "6. WEBINARS AND EVENTS",
+        "content": "• Host educational webinars<br/>• Attend industry conferences<br/>• Network with potential prospects"
+    },
+    {
+        "title": "7. COLD OUTREACH",
+        "content": "• Research and personalize your approach<br/>• Use multiple channels (email, LinkedIn, phone)<br/>• Follow up consistently"
+    },
+    {
+        "title": "8. ACCOUNT-BASED MARKETING",
+        "content": "• Target specific high-value accounts<br/>• Create personalized campaigns<br/>• Use multiple touchpoints"
+    },
+    {
+        "title": "9. INFLUENCER MARKETING",
+        "content": "• Partner with industry influencers<br/>• Leverage their audience and credibility<br/>• Create mutually beneficial relationships"
+    },
+    {
+        "title": "10. OPTIMIZATION AND TESTING",
+        "content": "• A/B test your landing pages<br/>• Optimize your conversion funnel<br/>• Continuously improve based on data"
+    }
+]
+
+BONUS_TITLE = "BONUS: AI-POWERED LEAD GENERATION"
+
+BONUS_CONTENT = """
+• Use chatbots for 24/7 lead qualification<br/>
+• Automate follow-up sequences<br/>
+• Personalize content based on behavior<br/>
+• Score leads automatically
+"""
+
+CONCLUSION = """
+<b>Remember:</b> Quality over quantity. Focus on attracting and converting the right prospects for your business.
+
+For more strategies and implementation tips, visit LeadCraft AI at leadcraftai.com
+"""
+
+DOWNLOAD_NAME = '10_lead_generation_strategies.pdf'
+
+# Longest name printed on a personalized copy
+MAX_NAME_CHARS = 80
+
+
+def content_hash(variant):
+    """Hash the guide content together with the variant parameters"""
+    definition = [TITLE, INTRO, STRATEGIES, BONUS_TITLE, BONUS_CONTENT, CONCLUSION, sorted(variant.items())]
+    return hashlib.sha256(json.dumps(definition).encode('utf-8')).hexdigest()[:32]
+
+
+def render_guide(name=None):
+    """Render the guide PDF, optionally personalized with the lead's name"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.colors import HexColor
+    
+    # Create PDF in memory
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    story = []
+    
+    # Get styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        textColor=HexColor('#2c3e50'),
+        alignment=1  # Center alignment
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        spaceAfter=12,
+        spaceBefore=20,
+        textColor=HexColor('#34495e')
+    )
+    
+    body_style = ParagraphStyle(
+        'CustomBody',
+        parent=styles['Normal'],
+        fontSize=11,
+        spaceAfter=8,
+        textColor=HexColor('#2c3e50')
+    )
+    
+    # Add title
+    story.append(Paragraph(TITLE, title_style))
+    if name:
+        story.append(Paragraph(f"Prepared for {escape(name)}", body_style))
+    story.append(Spacer(1, 20))
+    
+    # Add introduction
+    story.append(Paragraph(INTRO, body_style))
+    story.append(Spacer(1, 20))
+    
+    # Add strategies
+    for strategy in STRATEGIES:
+        story.append(Paragraph(strategy["title"], heading_style))
+        story.append(Paragraph(strategy["content"], body_style))
+        story.append(Spacer(1, 15))
+    
+    # Add bonus section
+    story.append(Spacer(1, 20))
+    story.append(Paragraph(BONUS_TITLE, heading_style))
+    story.append(Paragraph(BONUS_CONTENT, body_style))
+    
+    # Add conclusion
+    story.append(Spacer(1, 20))
+    story.append(Paragraph(CONCLUSION, body_style))
+    
+    # Build PDF
+    doc.build(story)
+    return buffer.getvalue()
+
+
+class GuideCache:
+    """The rendered guide PDF, built once and shared by every download.
+
+    Personalized copies (for the guide email) are rendered on demand and not
+    cached, so names can't push the shared PDF out or fill memory.
+    """
+
+    def __init__(self):
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get(self, name=None):
+        """Return (pdf_bytes, etag, last_modified); the ETag hashes content and name"""
+        if name:
+            name = name.strip()[:MAX_NAME_CHARS]
+            return render_guide(name=name), content_hash({'name': name}), CONTENT_UPDATED
+        if self._entry is None:
+            with self._lock:
+                if self._entry is None:
+                    self._entry = (render_guide(), content_hash({}), CONTENT_UPDATED)
+        return self._entry
+
+
+guide_cache = GuideCache()
@@ -0,0 +1,14 @@
+# Production launcher: gunicorn asgi:app -c gunicorn.conf.py
+# Each Uvicorn worker runs an event loop, so concurrency per process is bounded
+# by open connections rather than threads.
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+errorlog = "-"
@@ -0,0 +1,218 @@
+import atexit
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class JobQueue:
+    """Background job queue for work that shouldn't hold up an HTTP response.
+
+    Jobs live in a SQLite table: a file path makes them survive restarts and
+    lets several workers share one queue (create_job_queue uses jobs.db next
+    to the lead database), while ':memory:' keeps them in process. Worker threads claim ready jobs of one type in batches
+    and pass their payloads to the handler registered for that type. A failed
+    batch is retried with jittered exponential backoff; after max_attempts the
+    jobs move to the dead-letter list, where they can be inspected and requeued.
+    """
+
+    def __init__(self, path=":memory:", workers=2, max_attempts=5, backoff_base=2.0, backoff_max=300.0,
+                 lease_seconds=300, poll_interval=1.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_at REAL NOT NULL,
+                claimed_at REAL,
+                last_error TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, run_at);
+        """)
+
+        self._stopped = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._work_loop, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def register(self, job_type, handler, batch_size=1):
+        """Handle jobs of job_type with handler(payloads), up to batch_size at a time"""
+        self.handlers[job_type] = (handler, batch_size)
+
+    def enqueue(self, job_type, payload, delay=0):
+        """Queue a job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, type, payload, run_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, job_type, json.dumps(payload), now + delay, now)
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def _claim(self):
+        """Atomically claim up to one handler batch of ready jobs of the same type"""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front so workers in other processes can't claim the same rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs claimed by a worker that died are handed out again once their lease runs out
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'pending' WHERE status = 'running' AND claimed_at < ?",
+                    (now - self.lease_seconds,)
+                )
+                # Only types with a handler are claimed, so jobs queued before their handler is registered just wait
+                types = list(self.handlers)
+                placeholders = ", ".join("?" for _ in types)
+                first = self._conn.execute(
+                    f"SELECT type FROM jobs WHERE status = 'pending' AND run_at <= ? AND type IN ({placeholders}) "
+                    "ORDER BY run_at LIMIT 1", [now] + types
+                ).fetchone() if types else None
+                if first is None:
+                    self._conn.execute("COMMIT")
+                    return None, []
+                job_type = first["type"]
+                rows = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'pending' AND run_at <= ? AND type = ? ORDER BY run_at LIMIT ?",
+                    (now, job_type, self.handlers[job_type][1])
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'running', claimed_at = ? WHERE id = ?",
+                    [(now, row["id"]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_type, [dict(row) for row in rows]
+
+    def _finish(self, jobs, error=None):
+        with self._lock:
+            if error is None:
+                self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job["id"],) for job in jobs])
+                return
+            updates = []
+            for job in jobs:
+                attempts = job["attempts"] + 1
+                if attempts >= self.max_attempts:
+                    updates.append(("dead", attempts, job["run_at"], error, job["id"]))
+                else:
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempts))
+                    updates.append(("pending", attempts, time.time() + delay, error, job["id"]))
+            self._conn.executemany(
+                "UPDATE jobs SET status = ?, attempts = ?, run_at = ?, last_error = ?, claimed_at = NULL WHERE id = ?",
+                updates
+            )
+
+    def run_once(self):
+        """Process one batch; returns the number of jobs handled"""
+        job_type, jobs = self._claim()
+        if not jobs:
+            return 0
+        handler = self.handlers[job_type][0]
+        try:
+            handler([json.loads(job["payload"]) for job in jobs])
+        except Exception as e:
+            print(f"Error running {job_type} jobs: {e}")
+            self._finish(jobs, f"{type(e).__name__}: {e}")
+        else:
+            self._finish(jobs)
+        return len(jobs)
+
+    def _work_loop(self):
+        while not self._stopped.is_set():
+            try:
+                handled = self.run_once()
+            except Exception as e:
+                print(f"Error in job worker: {e}")
+                handled = 0
+            if not handled:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+
+    def dead_letters(self, limit=100):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, type, payload, attempts, last_error, created_at FROM jobs WHERE status = 'dead' "
+                "ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row, payload=json.loads(row["payload"])) for row in rows]
+
+    def retry_dead(self, job_ids=None):
+        """Move dead jobs (all, or the given ids) back to the queue; returns how many"""
+        with self._lock:
+            if job_ids:
+                placeholders = ", ".join("?" for _ in job_ids)
+                cursor = self._conn.execute(
+                    f"UPDATE jobs SET status = 'pending', attempts = 0, run_at = ? WHERE status = 'dead' AND id IN ({placeholders})",
+                    [time.time()] + list(job_ids)
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = 'pending', attempts = 0, run_at = ? WHERE status = 'dead'", (time.time(),)
+                )
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT type, status, COUNT(*) AS n FROM jobs GROUP BY type, status").fetchall()
+        stats = {"pending": 0, "running": 0, "dead": 0, "by_type": {}}
+        for row in rows:
+            stats[row["status"]] += row["n"]
+            stats["by_type"].setdefault(row["type"], {})[row["status"]] = row["n"]
+        return stats
+
+    def close(self, timeout=5.0):
+        """Stop the workers, giving queued jobs up to timeout seconds to drain"""
+        deadline = time.time() + timeout
+        while time.time() < deadline and not self._stopped.is_set():
+            try:
+                if not self.run_once():
+                    break
+            except Exception:
+                break
+        self._stopped.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+
+def create_job_queue():
+    """Build the job queue from JOB_* environment variables.
+
+    Jobs go to JOB_QUEUE_PATH, by default jobs.db next to the lead database,
+    so queued leads survive a restart; ":memory:" keeps them in process only.
+    """
+    default_path = os.path.join(os.path.dirname(os.getenv("LEADS_DB_PATH", "leads.db")), "jobs.db")
+    return JobQueue(
+        path=os.getenv("JOB_QUEUE_PATH") or default_path,
+        workers=int(os.getenv("JOB_WORKERS", "2")),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    )
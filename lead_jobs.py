@@ -0,0 +1,63 @@
+import base64
+import os
+
+import requests
+
+
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+GUIDE_FROM_EMAIL = os.getenv("GUIDE_FROM_EMAIL", "hello@leadcraft.ai")
+CRM_WEBHOOK_URL = os.getenv("CRM_WEBHOOK_URL")
+
+
+def send_guide_emails(recipients, tenants):
+    """Email each recipient the lead magnet PDF of the site they signed up on via SendGrid"""
+    if not SENDGRID_API_KEY:
+        print(f"SENDGRID_API_KEY not set; skipping guide email to {len(recipients)} recipient(s)")
+        return
+    from sendgrid import SendGridAPIClient
+    from sendgrid.helpers.mail import Attachment, Disposition, FileContent, FileName, FileType, Mail
+
+    client = SendGridAPIClient(SENDGRID_API_KEY)
+    for recipient in recipients:
+        tenant = tenants.get(recipient.get("site_id"))
+        pdf, _, _ = tenant.guide(name=recipient.get("name") or None)
+        message = Mail(
+            from_email=GUIDE_FROM_EMAIL,
+            to_emails=recipient["email"],
+            subject="Your guide: 10 Proven Lead Generation Strategies",
+            html_content="<p>Thanks for your interest! Your guide is attached.</p>"
+        )
+        message.attachment = Attachment(
+            FileContent(base64.b64encode(pdf).decode("ascii")),
+            FileName(tenant.guide_download_name),
+            FileType("application/pdf"),
+            Disposition("attachment")
+        )
+        client.send(message)
+
+
+def push_to_crm(leads):
+    """POST a batch of leads to the configured CRM webhook"""
+    if not CRM_WEBHOOK_URL:
+        return
+    response = requests.post(CRM_WEBHOOK_URL, json={"leads": leads}, timeout=10)
+    response.raise_for_status()
+
+
+def register_lead_jobs(queue, tenants):
+    """Register the post-capture handlers on a job queue; leads are stored per site"""
+    def persist_leads(leads):
+        by_site = {}
+        for lead in leads:
+            by_site.setdefault(lead.get("site_id"), []).append(lead)
+        # Each site's share of the batch is written in one transaction. When a later site
+        # fails the whole batch is retried; lead keys make the sites already written skip their rows
+        stored = 0
+        for site_id, site_leads in by_site.items():
+            stored += tenants.get(site_id).lead_store().add_many(site_leads)
+        print(f"Stored {stored} lead(s)")
+
+    queue.register("persist_lead", persist_leads, batch_size=100)
+    # One email per job, so a failed send doesn't re-send the others in its batch
+    queue.register("send_guide_email", lambda recipients: send_guide_emails(recipients, tenants), batch_size=1)
+    queue.register("crm_push", push_to_crm, batch_size=20)
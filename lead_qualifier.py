@@ -0,0 +1,128 @@
+import math
+import os
+import re
+import threading
+
+from intent_engine import intent_engine
+
+# Buying intent, browsing and "no budget" signals are the qualify_weight of intents in intents.json;
+# a message that is only a greeting or acknowledgement can't be expressed as a phrase, so it stays here
+SMALL_TALK = re.compile(r"^\W*(hi|hello|hey|thanks|thank you|ok|okay)\W*$")
+SMALL_TALK_WEIGHT = -0.8
+
+# Labelled prototypes for the nearest-centroid classifier over the FAQ embedding space
+QUALIFIED_EXAMPLES = [
+    "How much does the paid plan cost?",
+    "Can I book a demo for my team?",
+    "We want to automate lead generation for our business",
+    "How do I sign up and get started?",
+    "Does it integrate with our CRM?",
+    "I'm ready to upgrade",
+]
+NOT_QUALIFIED_EXAMPLES = [
+    "Just browsing",
+    "What is a lead magnet?",
+    "Hello there",
+    "Tell me a joke",
+    "I'm a student researching chatbots",
+    "Not interested right now",
+]
+
+
+def rule_score(text):
+    """Sum the qualify weights of the matched intents, clamped to [-1, 1]"""
+    score = intent_engine.qualify_score(text)
+    if SMALL_TALK.search(text.lower()):
+        score += SMALL_TALK_WEIGHT
+    return max(-1.0, min(1.0, score))
+
+
+def _unit(vector):
+    vector = [float(x) for x in vector]
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _centroid(vectors):
+    return _unit([sum(values) / len(vectors) for values in zip(*vectors)])
+
+
+class TieredQualifier:
+    """Qualifies leads with local rules, then an embedding classifier, then the LLM.
+
+    A tier decides when its score clears its threshold; otherwise the message
+    escalates to the next tier. Counters record how many calls each tier absorbed.
+    """
+
+    def __init__(self, llm_qualify, embed=None, rule_threshold=0.7, classifier_margin=0.08, llm_qualify_async=None):
+        self.llm_qualify = llm_qualify
+        self.llm_qualify_async = llm_qualify_async
+        self.embed = embed
+        self.rule_threshold = rule_threshold
+        self.classifier_margin = classifier_margin
+        self._centroids = None
+        self._lock = threading.Lock()
+        self.counts = {"rules": 0, "classifier": 0, "llm": 0}
+
+    def _count(self, tier):
+        with self._lock:
+            self.counts[tier] += 1
+
+    def centroids(self):
+        """Embed the prototype examples once and return (qualified, not_qualified) centroids"""
+        if self._centroids is None:
+            vectors = self.embed(QUALIFIED_EXAMPLES + NOT_QUALIFIED_EXAMPLES)
+            split = len(QUALIFIED_EXAMPLES)
+            self._centroids = (_centroid(vectors[:split]), _centroid(vectors[split:]))
+        return self._centroids
+
+    def classifier_score(self, text, embedding=None):
+        """Similarity to the qualified centroid minus similarity to the not-qualified one"""
+        qualified, not_qualified = self.centroids()
+        vector = _unit(embedding if embedding is not None else self.embed([text])[0])
+        return sum(a * b for a, b in zip(vector, qualified)) - sum(a * b for a, b in zip(vector, not_qualified))
+
+    def local_decision(self, text, embedding=None):
+        """Return the rules/classifier verdict, or None if the message needs the LLM"""
+        score = rule_score(text)
+        if abs(score) >= self.rule_threshold:
+            self._count("rules")
+            return "qualified" if score > 0 else "not_qualified"
+
+        if self.embed:
+            try:
+                margin = self.classifier_score(text, embedding)
+                if abs(margin) >= self.classifier_margin:
+                    self._count("classifier")
+                    return "qualified" if margin > 0 else "not_qualified"
+            except Exception as e:
+                print(f"Error in lead classifier: {e}")
+        return None
+
+    def escalate(self, text, session_id=None):
+        """Ask the LLM tier about a message the local tiers could not decide"""
+        self._count("llm")
+        return self.llm_qualify(text, session_id)
+
+    async def aescalate(self, text, session_id=None):
+        self._count("llm")
+        return await self.llm_qualify_async(text, session_id)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        counts["total"] = total
+        counts["llm_rate"] = round(counts["llm"] / total, 4) if total else 0.0
+        return counts
+
+
+def create_qualifier(llm_qualify, embed=None, llm_qualify_async=None):
+    """Build the qualifier from QUALIFIER_* environment variables"""
+    return TieredQualifier(
+        llm_qualify,
+        embed=embed,
+        rule_threshold=float(os.getenv("QUALIFIER_RULE_THRESHOLD", "0.7")),
+        classifier_margin=float(os.getenv("QUALIFIER_CLASSIFIER_MARGIN", "0.08")),
+        llm_qualify_async=llm_qualify_async
+    )
@@ -0,0 +1,393 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+LEAD_FIELDS = ['timestamp', 'name', 'email', 'product', 'pain_point', 'session_id']
+
+# Columns the dashboard is allowed to sort by
+SORTABLE_FIELDS = {'timestamp', 'name', 'email', 'product'}
+
+# Columns exports can be filtered on by exact match
+FILTER_FIELDS = {'name', 'email', 'product', 'pain_point', 'session_id'}
+
+# Rows per statement when importing; stays under SQLite's bound-parameter limit
+IMPORT_BATCH_SIZE = 500
+
+def utc_timestamp(value=None):
+    """A lead timestamp as a UTC ISO string ending in 'Z'; now when value is empty.
+
+    Timestamps with an offset (clients send '...Z') are converted to UTC and
+    ones without are taken as UTC already, so the day and hour aggregates
+    don't depend on the server's timezone. Unparseable values are kept as is.
+    """
+    if not value:
+        moment = datetime.now(timezone.utc)
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+        except ValueError:
+            return str(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.isoformat() + 'Z'
+
+
+def _stat_keys(row):
+    """(dimension, key) pairs of the lead_stats aggregates a row from _row() counts towards"""
+    timestamp, _, _, product, pain_point, _ = row
+    return [
+        ('total', ''),
+        ('day', timestamp[:10]),
+        ('hour', timestamp[:13]),
+        ('product', (product or '').strip()),
+        ('pain_point', (pain_point or '').strip()),
+    ]
+
+
+class LeadStore:
+    """Append-only lead repository backed by SQLite in WAL mode"""
+
+    def __init__(self, path='leads.db', legacy_csv='leads.csv'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS leads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                name TEXT NOT NULL DEFAULT '',
+                email TEXT NOT NULL DEFAULT '',
+                product TEXT NOT NULL DEFAULT '',
+                pain_point TEXT NOT NULL DEFAULT '',
+                session_id TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS idx_leads_timestamp ON leads (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_leads_email ON leads (email);
+            CREATE INDEX IF NOT EXISTS idx_leads_email_nocase ON leads (email COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS idx_leads_session_id ON leads (session_id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS lead_stats (
+                dimension TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, key)
+            );
+        """)
+        # Idempotency key of leads written by background jobs, so a retried batch can't insert a lead twice
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(leads)")}
+        if 'lead_key' not in columns:
+            self._conn.execute("ALTER TABLE leads ADD COLUMN lead_key TEXT")
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_leads_lead_key ON leads (lead_key)")
+        self._conn.commit()
+        self._build_stats_once()
+        if legacy_csv:
+            self.import_csv_once(legacy_csv)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _bump_stats(self, rows):
+        """Add rows to the aggregates; call inside the transaction that inserts them"""
+        counts = Counter(key for row in rows for key in _stat_keys(row))
+        self._conn.executemany(
+            "INSERT INTO lead_stats (dimension, key, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (dimension, key) DO UPDATE SET count = count + excluded.count",
+            [(dimension, key, count) for (dimension, key), count in counts.items()]
+        )
+
+    def _insert(self, rows):
+        self._conn.executemany(
+            "INSERT INTO leads (timestamp, name, email, product, pain_point, session_id) VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        self._bump_stats(rows)
+
+    def _build_stats_once(self):
+        """Backfill the aggregates from existing leads the first time a store is opened"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM meta WHERE key = 'stats_built'").fetchone():
+                    self._conn.rollback()
+                    return
+                self._conn.execute("DELETE FROM lead_stats")
+                rows = self._conn.execute("SELECT timestamp, name, email, product, pain_point, session_id FROM leads")
+                while True:
+                    batch = rows.fetchmany(5000)
+                    if not batch:
+                        break
+                    self._bump_stats([tuple(row) for row in batch])
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('stats_built', ?)", (datetime.now().isoformat(),))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def _row(self, lead_data):
+        # Short CSV rows and JSON nulls come through as None; the columns are NOT NULL
+        return (
+            utc_timestamp(lead_data.get('timestamp')),
+            str(lead_data.get('name') or ''),
+            str(lead_data.get('email') or ''),
+            str(lead_data.get('product') or ''),
+            str(lead_data.get('pain_point') or ''),
+            str(lead_data.get('session_id') or '')
+        )
+
+    def add_many(self, leads):
+        """Store leads in one transaction; returns how many were new.
+
+        Leads carrying a lead_key that is already stored are skipped, so
+        replaying a batch after a partial failure doesn't duplicate rows.
+        """
+        with self._lock:
+            inserted = []
+            try:
+                for lead in leads:
+                    row = self._row(lead)
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO leads (timestamp, name, email, product, pain_point, session_id, lead_key) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        row + (lead.get('lead_key'),)
+                    )
+                    if cursor.rowcount:
+                        inserted.append(row)
+                self._bump_stats(inserted)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            return len(inserted)
+
+    def import_csv_once(self, csv_file):
+        """Import an existing leads.csv the first time the store is opened"""
+        if not os.path.exists(csv_file):
+            return 0
+        with self._lock:
+            # Take the write lock first so concurrent workers can't both import
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM meta WHERE key = 'csv_imported'").fetchone():
+                    self._conn.rollback()
+                    return 0
+                with open(csv_file, 'r', newline='', encoding='utf-8') as csvfile:
+                    leads = [self._row(lead) for lead in csv.DictReader(csvfile)]
+                self._insert(leads)
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('csv_imported', ?)", (datetime.now().isoformat(),))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        print(f"Imported {len(leads)} leads from {csv_file}")
+        return len(leads)
+
+    def stats(self, days=14, hours=48, top=10):
+        """Precomputed lead counts: total, today, per day/hour, and top products and pain points.
+
+        Reads only the small lead_stats table, so the cost doesn't grow with the number of leads.
+        Days and hours are UTC, like the stored timestamps.
+        """
+        now = datetime.now(timezone.utc)
+        first_day = (now - timedelta(days=days - 1)).date().isoformat()
+        first_hour = (now - timedelta(hours=hours - 1)).isoformat()[:13]
+        with self._lock:
+            total = self._conn.execute("SELECT count FROM lead_stats WHERE dimension = 'total'").fetchone()
+            today = self._conn.execute(
+                "SELECT count FROM lead_stats WHERE dimension = 'day' AND key = ?", (now.date().isoformat(),)
+            ).fetchone()
+            by_day = self._conn.execute(
+                "SELECT key, count FROM lead_stats WHERE dimension = 'day' AND key >= ? ORDER BY key", (first_day,)
+            ).fetchall()
+            by_hour = self._conn.execute(
+                "SELECT key, count FROM lead_stats WHERE dimension = 'hour' AND key >= ? ORDER BY key", (first_hour,)
+            ).fetchall()
+            top_rows = {
+                dimension: self._conn.execute(
+                    "SELECT key, count FROM lead_stats WHERE dimension = ? ORDER BY count DESC, key LIMIT ?", (dimension, top)
+                ).fetchall()
+                for dimension in ('product', 'pain_point')
+            }
+        return {
+            'total': total[0] if total else 0,
+            'today': today[0] if today else 0,
+            'by_day': {row[0]: row[1] for row in by_day},
+            'by_hour': {row[0]: row[1] for row in by_hour},
+            'by_product': [{'key': row[0] or '(none)', 'count': row[1]} for row in top_rows['product']],
+            'by_pain_point': [{'key': row[0] or '(none)', 'count': row[1]} for row in top_rows['pain_point']],
+        }
+
+    def page(self, page=1, per_page=50, sort='timestamp', order='desc'):
+        """Return one page of leads sorted server-side"""
+        if sort not in SORTABLE_FIELDS:
+            sort = 'timestamp'
+        direction = 'ASC' if order == 'asc' else 'DESC'
+        offset = (max(page, 1) - 1) * per_page
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM leads ORDER BY {sort} {direction}, id {direction} LIMIT ? OFFSET ?",
+                (per_page, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_filtered(self, start=None, end=None, filters=None, batch_size=1000):
+        """Yield leads matching a timestamp range and exact field filters, in batches"""
+        clauses, params = [], []
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        for field, value in (filters or {}).items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Cannot filter on {field}")
+            clauses.append(f"{field} = ?")
+            params.append(value)
+        where = "".join(f" AND {clause}" for clause in clauses)
+
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT * FROM leads WHERE id > ?{where} ORDER BY id LIMIT ?",
+                    [last_id] + params + [batch_size]
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            last_id = rows[-1]['id']
+
+    def import_leads(self, leads, batch_size=IMPORT_BATCH_SIZE):
+        """Validate and insert leads in batches, skipping emails that are already stored.
+
+        Emails are compared case-insensitively against the store and within
+        the import itself. Rows that aren't objects (including lines read_leads
+        couldn't parse) or lack a valid email are counted as invalid. Returns
+        counts of imported, duplicate and invalid rows.
+        """
+        stats = {'imported': 0, 'duplicates': 0, 'invalid': 0}
+        batch = []
+        for lead in leads:
+            if not isinstance(lead, dict):
+                stats['invalid'] += 1
+                continue
+            email = str(lead.get('email') or '').strip()
+            if '@' not in email:
+                stats['invalid'] += 1
+                continue
+            batch.append(dict(lead, email=email))
+            if len(batch) >= batch_size:
+                self._import_batch(batch, stats)
+                batch = []
+        if batch:
+            self._import_batch(batch, stats)
+        return stats
+
+    def _import_batch(self, batch, stats):
+        placeholders = ", ".join("?" for _ in batch)
+        with self._lock:
+            existing = {
+                row[0].lower() for row in self._conn.execute(
+                    f"SELECT email FROM leads WHERE email COLLATE NOCASE IN ({placeholders})",
+                    [lead['email'] for lead in batch]
+                )
+            }
+            rows = []
+            for lead in batch:
+                key = lead['email'].lower()
+                if key in existing:
+                    stats['duplicates'] += 1
+                    continue
+                existing.add(key)
+                rows.append(self._row(lead))
+            self._insert(rows)
+            self._conn.commit()
+        stats['imported'] += len(rows)
+
+
+def read_leads(stream, fmt='csv'):
+    """Yield lead dicts from a CSV or NDJSON text stream, one row at a time.
+
+    An NDJSON line that isn't valid JSON is yielded as None, for import_leads
+    to count as invalid.
+    """
+    if fmt == 'ndjson':
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    else:
+        yield from csv.DictReader(stream)
+
+
+def export_csv(leads, chunk_rows=500):
+    """Yield CSV text for the given leads, a few hundred rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=LEAD_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for i, lead in enumerate(leads, 1):
+        writer.writerow(lead)
+        if i % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(leads, chunk_rows=500):
+    """Yield newline-delimited JSON for the given leads, a few hundred rows at a time"""
+    lines = []
+    for lead in leads:
+        lines.append(json.dumps({field: lead.get(field, '') for field in ['id'] + LEAD_FIELDS}) + "\n")
+        if len(lines) >= chunk_rows:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import or export LeadCraft leads")
+    parser.add_argument('--db', default=os.getenv('LEADS_DB_PATH', 'leads.db'))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_cmd = commands.add_parser('import', help="Import leads from a CSV or NDJSON file")
+    import_cmd.add_argument('path')
+    import_cmd.add_argument('--format', choices=['csv', 'ndjson'])
+
+    export_cmd = commands.add_parser('export', help="Export leads to stdout")
+    export_cmd.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    export_cmd.add_argument('--start', help="Earliest timestamp (inclusive), e.g. 2025-07-01")
+    export_cmd.add_argument('--end', help="Latest timestamp (exclusive)")
+    export_cmd.add_argument('--filter', action='append', default=[], metavar='FIELD=VALUE')
+
+    args = parser.parse_args(argv)
+    store = LeadStore(args.db, legacy_csv=None)
+
+    if args.command == 'import':
+        fmt = args.format or ('ndjson' if args.path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        with open(args.path, 'r', newline='', encoding='utf-8') as f:
+            print(json.dumps(store.import_leads(read_leads(f, fmt))))
+    else:
+        filters = dict(item.split('=', 1) for item in args.filter)
+        leads = store.iter_filtered(args.start, args.end, filters)
+        for chunk in (export_ndjson if args.format == 'ndjson' else export_csv)(leads):
+            sys.stdout.write(chunk)
+
+
+if __name__ == '__main__':
+    main()
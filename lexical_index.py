@@ -0,0 +1,143 @@
+import math
+import re
+from collections import Counter
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from get have how i if in is it its me my of on or our
+so that the their them there this to us was we what whats when where which who why will with you your
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Query terms visitors use that the knowledge files phrase differently (stemmed forms)
+QUERY_SYNONYMS = {
+    "pric": ("plan", "paid"),
+    "price": ("plan", "paid"),
+    "cost": ("plan", "paid"),
+    "expensive": ("plan", "paid"),
+    "setup": ("install",),
+    "privacy": ("secure", "gdpr"),
+    "gdpr": ("secure",),
+}
+
+
+def _stem(token):
+    """Tiny suffix stripper so 'plans'/'plan' and 'leads'/'lead' share a term"""
+    if len(token) > 4:
+        if token.endswith("ies"):
+            return token[:-3] + "y"
+        if token.endswith("ing"):
+            return token[:-3]
+        if token.endswith("s") and not token.endswith("ss"):
+            return token[:-1]
+    return token
+
+
+def tokenize(text):
+    text = text.lower().replace("’", "'").replace("'", "")
+    return [_stem(token) for token in _TOKEN.findall(text) if token not in STOPWORDS]
+
+
+def query_terms(query, synonym_weight=0.6):
+    """{term: weight} for a query: its own terms at 1.0, their synonyms at synonym_weight"""
+    terms = {}
+    for term in tokenize(query):
+        terms[term] = 1.0
+        for synonym in QUERY_SYNONYMS.get(term, ()):
+            terms.setdefault(synonym, synonym_weight)
+    return terms
+
+
+def question_similarity(query, question):
+    """Term-overlap F1 between a query and an FAQ question; 1.0 when the query is the question.
+
+    Both directions count, so a long query that merely contains the question's
+    terms (and asks something more) scores low.
+    """
+    question_set = set(tokenize(question))
+    terms = query_terms(query)
+    own_terms = [term for term, weight in terms.items() if weight == 1.0]
+    if not question_set or not own_terms:
+        return 0.0
+    recall = sum(terms.get(term, 0.0) for term in question_set) / len(question_set)
+    precision = sum(1 for term in own_terms if term in question_set) / len(own_terms)
+    return round(2 * recall * precision / (recall + precision), 4) if recall + precision else 0.0
+
+
+class BM25Index:
+    """In-memory inverted index over knowledge chunks, scored with Okapi BM25.
+
+    Takes the (id, document, metadata) chunks produced by faq_index.chunk_file.
+    FAQ questions are counted question_weight times so a query that matches a
+    question outranks one that only matches some answer text.
+    """
+
+    def __init__(self, chunks, k1=1.2, b=0.75, question_weight=2):
+        self.k1 = k1
+        self.b = b
+        self.chunks = chunks
+        self.postings = {}
+        self.lengths = []
+        for index, (_, doc, metadata) in enumerate(chunks):
+            question = metadata.get("question", "")
+            terms = Counter(tokenize(metadata.get("answer", doc)))
+            for term in tokenize(question):
+                terms[term] += question_weight
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((index, tf))
+        count = len(chunks)
+        self.avg_length = sum(self.lengths) / count if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query, k=3, where=None, synonym_weight=0.6):
+        """Return the top-k hits as {id, answer, score, metadata}; score is the raw BM25 score"""
+        terms = query_terms(query, synonym_weight)
+        scores = {}
+        for term, weight in terms.items():
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, tf in self.postings[term]:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[index] / self.avg_length)
+                scores[index] = scores.get(index, 0.0) + weight * idf * tf * (self.k1 + 1) / norm
+
+        hits = []
+        for index, score in sorted(scores.items(), key=lambda item: -item[1]):
+            chunk_id, doc, metadata = self.chunks[index]
+            if where and any(metadata.get(key) != value for key, value in where.items()):
+                continue
+            hits.append({"id": chunk_id, "answer": metadata.get("answer", doc), "score": round(score, 4), "metadata": metadata})
+            if len(hits) == k:
+                break
+        return hits
+
+
+def is_confident(hits, min_score=2.5, dominance=1.3):
+    """True when the best lexical hit is strong and clearly ahead of the runner-up"""
+    if not hits or hits[0]["score"] < min_score:
+        return False
+    return len(hits) == 1 or hits[0]["score"] >= dominance * hits[1]["score"]
+
+
+def relative_scores(hits):
+    """Rescale BM25 scores to (0, 1] relative to the best hit"""
+    if not hits:
+        return hits
+    best = hits[0]["score"]
+    return [dict(hit, score=round(hit["score"] / best, 4)) for hit in hits]
+
+
+def fuse(lexical, vector, vector_weight=0.7, k=3):
+    """Blend cosine scores with relative BM25 scores; a hit missing from one list scores 0 there"""
+    fused = {}
+    for hit in vector:
+        fused[hit["id"]] = dict(hit, score=vector_weight * hit["score"])
+    for hit in relative_scores(lexical):
+        entry = fused.setdefault(hit["id"], dict(hit, score=0.0))
+        entry["score"] += (1 - vector_weight) * hit["score"]
+    ranked = sorted(fused.values(), key=lambda hit: -hit["score"])[:k]
+    return [dict(hit, score=round(hit["score"], 4)) for hit in ranked]
@@ -0,0 +1,362 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LLM_CALLS, record_usage
+
+def _retryable(error):
+    """Throttling, timeouts, dropped connections and 5xx responses are worth retrying"""
+    import openai
+
+    retryable = (
+        openai.error.RateLimitError,
+        openai.error.APIConnectionError,
+        openai.error.Timeout,
+        openai.error.ServiceUnavailableError,
+        openai.error.TryAgain,
+    )
+    if isinstance(error, retryable):
+        return True
+    return isinstance(error, openai.error.APIError) and (error.http_status or 0) >= 500
+
+
+class Throttled(RuntimeError):
+    """The rate limit queue is longer than a caller may wait; not retried"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at rate tokens per second up to capacity.
+
+    Callers queue behind each other for at most max_wait seconds; past that
+    reserve raises Throttled instead of handing out an ever longer wait.
+    """
+
+    def __init__(self, rate, capacity, max_wait=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how long the caller must wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # The balance may go negative; each waiter queues behind the ones before it
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if self.max_wait is not None and wait > self.max_wait:
+                raise Throttled(f"rate limit queue is {wait:.1f}s long")
+            self._tokens -= 1
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class _HeldStream:
+    """A streamed response that keeps its call counted as active.
+
+    release runs once, when the stream is exhausted, fails, is closed or is
+    garbage collected, so load shedding sees a stream for as long as it is
+    still being read.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except BaseException:
+            self.close()
+            raise
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._stream.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    def _done(self):
+        release, self._release = self._release, None
+        if release:
+            release()
+
+    def close(self):
+        self._done()
+        close = getattr(self._stream, "close", None)
+        if close:
+            close()
+
+    async def aclose(self):
+        self._done()
+        aclose = getattr(self._stream, "aclose", None)
+        if aclose:
+            await aclose()
+
+    def __del__(self):
+        self._done()
+
+
+class LLMClient:
+    """Drop-in wrapper around openai.ChatCompletion.create/acreate.
+
+    Requests share a pooled keep-alive HTTP session, pass through a token
+    bucket, and are retried with full-jitter exponential backoff on transient
+    errors. Identical non-streaming requests that are already in flight are
+    coalesced: later callers wait for the first call's response instead of
+    issuing their own.
+    """
+
+    def __init__(self, api_base=None, rate=10.0, burst=20, max_retries=3, backoff_base=0.5,
+                 backoff_max=8.0, pool_size=20, timeout=30, max_wait=10.0):
+        self.api_base = api_base
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst, max_wait)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._ainflight = {}
+        self._aiosessions = weakref.WeakKeyDictionary()
+        self._openai = None
+        # Calls in progress, including time spent throttled or backing off; drives load shedding
+        self._active = 0
+        self.counters = {"requests": 0, "coalesced": 0, "retries": 0, "failures": 0, "shed": 0, "throttled_ms": 0.0}
+
+        self.session = requests.Session()
+        # Retries are handled here, so the adapter only pools connections
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def api(self):
+        """The openai module, imported and pointed at the pooled session on first use"""
+        if self._openai is None:
+            import openai
+            openai.api_key = openai.api_key or os.getenv("OPENAI_API_KEY")
+            openai.requestssession = self.session
+            self._openai = openai
+        return self._openai
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _count_active(self, delta):
+        with self._lock:
+            self._active += delta
+
+    def _params(self, kwargs):
+        params = dict(kwargs)
+        if self.api_base:
+            params.setdefault("api_base", self.api_base)
+        params.setdefault("request_timeout", self.timeout)
+        return params
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _shed(self):
+        self._count("shed")
+        LLM_CALLS.inc(outcome="shed", error="Throttled")
+
+    def _key(self, kwargs):
+        return json.dumps(kwargs, sort_keys=True, default=str)
+
+    def create(self, **kwargs):
+        """Same signature and return value as openai.ChatCompletion.create"""
+        if kwargs.get("stream"):
+            return self._call(kwargs)
+
+        key = self._key(kwargs)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(self._call(kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
+
+    def active(self):
+        """Number of OpenAI calls in progress (coalesced callers count once)"""
+        return self._active
+
+    def _call(self, kwargs):
+        self._count_active(1)
+        held = False
+        try:
+            response = self._attempts(kwargs)
+            if kwargs.get("stream"):
+                # The call stays active until the caller has read the stream
+                response, held = _HeldStream(response, lambda: self._count_active(-1)), True
+            return response
+        finally:
+            if not held:
+                self._count_active(-1)
+
+    def _attempts(self, kwargs):
+        params = self._params(kwargs)
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._count("throttled_ms", self.bucket.acquire() * 1000)
+            except Throttled:
+                self._shed()
+                raise
+            self._count("requests")
+            try:
+                response = self.api().ChatCompletion.create(**params)
+            except Exception as e:
+                if attempt == self.max_retries or not _retryable(e):
+                    self._count("failures")
+                    LLM_CALLS.inc(outcome="failed", error=type(e).__name__)
+                    raise
+                self._count("retries")
+                LLM_CALLS.inc(outcome="retried", error=type(e).__name__)
+                time.sleep(self._backoff(attempt))
+                continue
+            LLM_CALLS.inc(outcome="ok", error="")
+            if not kwargs.get("stream"):
+                record_usage(response)
+            return response
+
+    def _aiosession(self):
+        """One pooled aiohttp session per event loop"""
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self._aiosessions.get(loop)
+        if session is None or session.closed:
+            # Sessions of loops that have since closed can't be used again
+            for old in [old for old in list(self._aiosessions) if old.is_closed()]:
+                self._aiosessions.pop(old, None)
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            session = self._aiosessions[loop] = aiohttp.ClientSession(connector=connector)
+        return session
+
+    async def aclose(self):
+        """Close the running loop's aiohttp session; call on shutdown"""
+        session = self._aiosessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def acreate(self, **kwargs):
+        """Same signature and return value as openai.ChatCompletion.acreate"""
+        if kwargs.get("stream"):
+            return await self._acall(kwargs)
+
+        key = (asyncio.get_running_loop(), self._key(kwargs))
+        task = self._ainflight.get(key)
+        if task is None:
+            task = self._ainflight[key] = asyncio.ensure_future(self._acall(kwargs))
+            task.add_done_callback(lambda _: self._ainflight.pop(key, None))
+        else:
+            self._count("coalesced")
+        # Shielded so one cancelled caller doesn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _acall(self, kwargs):
+        self._count_active(1)
+        held = False
+        try:
+            response = await self._aattempts(kwargs)
+            if kwargs.get("stream"):
+                response, held = _HeldStream(response, lambda: self._count_active(-1)), True
+            return response
+        finally:
+            if not held:
+                self._count_active(-1)
+
+    async def _aattempts(self, kwargs):
+        params = self._params(kwargs)
+        # openai reads the session from a context variable, set per task
+        self.api().aiosession.set(self._aiosession())
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._count("throttled_ms", await self.bucket.aacquire() * 1000)
+            except Throttled:
+                self._shed()
+                raise
+            self._count("requests")
+            try:
+                response = await self.api().ChatCompletion.acreate(**params)
+            except Exception as e:
+                if attempt == self.max_retries or not _retryable(e):
+                    self._count("failures")
+                    LLM_CALLS.inc(outcome="failed", error=type(e).__name__)
+                    raise
+                self._count("retries")
+                LLM_CALLS.inc(outcome="retried", error=type(e).__name__)
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            LLM_CALLS.inc(outcome="ok", error="")
+            if not kwargs.get("stream"):
+                record_usage(response)
+            return response
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["inflight"] = len(self._inflight) + len(self._ainflight)
+            stats["active"] = self._active
+        stats["throttled_ms"] = round(stats["throttled_ms"], 2)
+        return stats
+
+
+def create_llm_client():
+    """Build the LLM client from OPENAI_API_BASE and LLM_* environment variables.
+
+    Point OPENAI_API_BASE at a local stub server to run without the real API.
+    """
+    return LLMClient(
+        api_base=os.getenv("OPENAI_API_BASE") or None,
+        rate=float(os.getenv("LLM_RATE_LIMIT", "10")),
+        burst=int(os.getenv("LLM_BURST", "20")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+        pool_size=int(os.getenv("LLM_POOL_SIZE", "20")),
+        timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+        max_wait=float(os.getenv("LLM_MAX_QUEUE_WAIT", "10"))
+    )
@@ -0,0 +1,242 @@
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+
+# Latency buckets in seconds, from in-process lookups up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (10, 25, 50, 100, 200, 400, 800, 1600, 3200)
+# Whole turns range from a millisecond-scale FAQ fast path to multi-second LLM replies
+TURN_BUCKETS = (0.001, 0.0025) + DEFAULT_BUCKETS
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(key)} {_number(value)}" for key, value in sorted(values)]
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by label values.
+
+    Observing is a bisect and three additions under the metric's lock, so it
+    is cheap enough to call on every request.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(key, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(key)} {count}")
+        return lines
+
+    def summary(self, label, quantiles=(0.5, 0.95)):
+        """Per value of one label: count, sum and quantiles interpolated within the buckets"""
+        with self._lock:
+            series = [(dict(key).get(label), list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        merged = {}
+        for value, counts, total, count in series:
+            entry = merged.setdefault(value, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+        summary = {}
+        for value, (counts, total, count) in merged.items():
+            summary[value] = {"count": count, "sum": total}
+            for q in quantiles:
+                summary[value][f"p{round(q * 100)}"] = self._quantile(counts, count, q)
+        return summary
+
+    def _quantile(self, counts, count, q):
+        # Same estimate as Prometheus' histogram_quantile: linear within the bucket holding the rank
+        rank = q * count
+        cumulative, lower = 0, 0.0
+        for bound, bucket_count in zip(self.buckets, counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = bound
+        return self.buckets[-1]
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format.
+
+    Collectors are callables evaluated at scrape time that return
+    (name, kind, help, [(labels_dict, value), ...]) tuples; they expose
+    counters other components already keep without touching the hot path.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help):
+        metric = Counter(name, help)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        self._collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_labels(sorted(labels.items()))} {_number(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram("leadcraft_http_request_seconds", "HTTP request latency until the response starts")
+STAGE_SECONDS = registry.histogram("leadcraft_stage_seconds", "Time spent in each stage of an /ask turn")
+CONTEXT_TOKENS = registry.histogram("leadcraft_context_tokens", "Tokens packed into the reply prompt context", TOKEN_BUCKETS)
+AGENT_PATH = registry.counter("leadcraft_agent_path_total", "Turns by how the reply was produced (llm, cached, faq_fast, objection, fallback, shed)")
+TURN_SECONDS = registry.histogram("leadcraft_turn_seconds", "Agent turn latency by how the reply was produced", TURN_BUCKETS)
+ASK_ADMISSION = registry.counter("leadcraft_ask_admission_total", "/ask requests by admission result (admitted, rate_limited, shed)")
+LLM_CALLS = registry.counter("leadcraft_llm_calls_total", "OpenAI API attempts by outcome")
+LLM_TOKENS = registry.counter("leadcraft_llm_tokens_total", "Tokens reported by non-streaming OpenAI responses")
+LLM_CALL_TOKENS = registry.histogram("leadcraft_llm_call_tokens", "Total tokens per non-streaming OpenAI call", TOKEN_BUCKETS)
+
+
+def observe_timings(timings, prefix=""):
+    """Record an /ask timings dict (milliseconds) into the stage histograms"""
+    for stage, value in timings.items():
+        if stage == "context_tokens":
+            CONTEXT_TOKENS.observe(value)
+        else:
+            STAGE_SECONDS.observe(value / 1000, stage=prefix + stage)
+
+
+def record_usage(response):
+    """Count token usage from an OpenAI response, if it reports any"""
+    usage = response.get("usage") if hasattr(response, "get") else None
+    if not usage:
+        return
+    model = response.get("model", "")
+    LLM_TOKENS.inc(usage.get("prompt_tokens", 0), model=model, kind="prompt")
+    LLM_TOKENS.inc(usage.get("completion_tokens", 0), model=model, kind="completion")
+    LLM_CALL_TOKENS.observe(usage.get("total_tokens", 0), model=model)
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every interval seconds and counts folded stacks.
+
+    Output is in the collapsed-stack format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}.folded")
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
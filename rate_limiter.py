@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Per-key token buckets that reject (rather than queue) requests over the limit.
+
+    limits maps a key kind to (requests per minute, burst), e.g.
+    {"session": (10, 5), "ip": (60, 20)}; hit() takes one token from every
+    given key and only if all of them have one. Bucket state lives in an
+    in-process LRU of max_keys entries, or in a SQLite table when path is set
+    so several workers share the limits.
+    """
+
+    def __init__(self, limits, path=None, max_keys=100000, purge_every=1000):
+        self.limits = {kind: (per_minute / 60.0, burst) for kind, (per_minute, burst) in limits.items()}
+        self.path = path
+        self.max_keys = max_keys
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.counters = {"allowed": 0, "limited": 0}
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_buckets_updated ON rate_buckets (updated)")
+
+    def _refill(self, kind, state, now):
+        rate, burst = self.limits[kind]
+        if state is None:
+            return float(burst)
+        tokens, updated = state
+        return min(burst, tokens + (now - updated) * rate)
+
+    def _retry_after(self, kind, tokens):
+        rate, _ = self.limits[kind]
+        return (1 - tokens) / rate if rate > 0 else 60.0
+
+    def _decide(self, keys, states, now):
+        """Return (allowed, retry_after, new_states) for the refilled buckets of keys"""
+        balances = {key: self._refill(kind, states.get(key), now) for kind, key in keys}
+        short = [(kind, key) for kind, key in keys if balances[key] < 1]
+        if short:
+            retry_after = max(self._retry_after(kind, balances[key]) for kind, key in short)
+            return False, retry_after, {key: (balance, now) for key, balance in balances.items()}
+        return True, 0.0, {key: (balance - 1, now) for key, balance in balances.items()}
+
+    def hit(self, **keys):
+        """Take a token for each kind=value given; returns (allowed, retry_after_seconds)"""
+        keys = [(kind, f"{kind}:{value}") for kind, value in keys.items() if value and kind in self.limits]
+        if not keys:
+            return True, 0.0
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                allowed, retry_after, states = self._decide(keys, {key: self._buckets.get(key) for _, key in keys}, now)
+                for key, state in states.items():
+                    self._buckets[key] = state
+                    self._buckets.move_to_end(key)
+                # A dropped bucket comes back full, so only idle keys should fall off the end
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                allowed, retry_after = self._hit_shared(keys, now)
+            self.counters["allowed" if allowed else "limited"] += 1
+        return allowed, round(retry_after, 2)
+
+    def _hit_shared(self, keys, now):
+        # IMMEDIATE takes the write lock up front so workers can't both spend the last token
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            placeholders = ", ".join("?" for _ in keys)
+            rows = self._conn.execute(
+                f"SELECT key, tokens, updated FROM rate_buckets WHERE key IN ({placeholders})",
+                [key for _, key in keys]
+            ).fetchall()
+            allowed, retry_after, states = self._decide(keys, {key: (tokens, updated) for key, tokens, updated in rows}, now)
+            self._conn.executemany(
+                "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                [(key, tokens, updated) for key, (tokens, updated) in states.items()]
+            )
+            self._writes += 1
+            # Buckets idle long enough to be full again are dropped now and then instead of on every hit
+            if self._writes % self.purge_every == 0:
+                self._conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - self._full_after(),))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def _full_after(self):
+        """Seconds after which any idle bucket has refilled completely"""
+        return max((burst / rate if rate > 0 else 3600.0) for rate, burst in self.limits.values())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["tracked_keys"] = len(self._buckets) if self._conn is None else None
+        return stats
+
+
+class LoadShedder:
+    """Decides when to stop starting new LLM work, based on how many LLM calls are in flight"""
+
+    def __init__(self, inflight, max_inflight=40):
+        self.inflight = inflight
+        self.max_inflight = max_inflight
+        self._lock = threading.Lock()
+        self.shed_count = 0
+
+    def should_shed(self):
+        if self.max_inflight <= 0 or self.inflight() < self.max_inflight:
+            return False
+        with self._lock:
+            self.shed_count += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"shed": self.shed_count, "inflight": self.inflight(), "max_inflight": self.max_inflight}
+
+
+def create_rate_limiter():
+    """Build the /ask rate limiter from RATE_LIMIT_* environment variables.
+
+    RATE_LIMIT_PATH shares the buckets between workers through SQLite; a rate
+    of 0 per minute disables that kind of limit.
+    """
+    limits = {
+        "session": (float(os.getenv("RATE_LIMIT_SESSION_PER_MIN", "20")), int(os.getenv("RATE_LIMIT_SESSION_BURST", "5"))),
+        "ip": (float(os.getenv("RATE_LIMIT_IP_PER_MIN", "60")), int(os.getenv("RATE_LIMIT_IP_BURST", "20"))),
+    }
+    return RateLimiter(
+        {kind: limit for kind, limit in limits.items() if limit[0] > 0},
+        path=os.getenv("RATE_LIMIT_PATH") or None,
+        max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    )
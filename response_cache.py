@@ -0,0 +1,122 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def lead_score_bucket(lead_score):
+    """Bucket the lead score so cached answers respect the offer thresholds"""
+    if lead_score >= 2:
+        return "hot"
+    return "warm" if lead_score == 1 else "cold"
+
+
+def _unit(vector):
+    vector = [float(x) for x in vector]
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class ResponseCache:
+    """LRU/TTL cache of agent answers with an exact and an embedding-similarity tier.
+
+    Keys combine the normalized question with the lead-score bucket. When an
+    embed function is given, questions that miss the exact tier are compared
+    to cached questions in the same bucket by cosine similarity.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, similarity_threshold=0.92, embed=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats_counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def _embed(self, text):
+        return _unit(self.embed([text])[0])
+
+    def _expired(self, entry):
+        return time.time() - entry["created"] > self.ttl
+
+    def lookup(self, text, bucket):
+        """Return (value, embedding); value is None on a miss.
+
+        The embedding is computed on an exact miss so it can be passed back
+        to put() without embedding the question twice.
+        """
+        key = (bucket, normalize(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._expired(entry):
+                del self._entries[key]
+                self.stats_counters["expired"] += 1
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                self.stats_counters["exact_hits"] += 1
+                return entry["value"], entry["embedding"]
+
+        if not self.embed or self.similarity_threshold > 1:
+            with self._lock:
+                self.stats_counters["misses"] += 1
+            return None, None
+
+        embedding = self._embed(key[1])
+        # Snapshot the bucket under the lock and scan outside it, so a long scan
+        # doesn't hold up every other lookup and put in the worker
+        with self._lock:
+            candidates = [
+                (other_key, entry) for other_key, entry in self._entries.items()
+                if other_key[0] == bucket and entry["embedding"] is not None and not self._expired(entry)
+            ]
+        best_key, best_entry, best_score = None, None, self.similarity_threshold
+        for other_key, entry in candidates:
+            score = sum(a * b for a, b in zip(embedding, entry["embedding"]))
+            if score >= best_score:
+                best_key, best_entry, best_score = other_key, entry, score
+
+        with self._lock:
+            # The entry may have been evicted or replaced while scanning
+            if best_key is None or self._entries.get(best_key) is not best_entry:
+                self.stats_counters["misses"] += 1
+                return None, embedding
+            self._entries.move_to_end(best_key)
+            self.stats_counters["semantic_hits"] += 1
+            return best_entry["value"], embedding
+
+    def put(self, text, bucket, value, embedding=None):
+        key = (bucket, normalize(text))
+        if embedding is None and self.embed and self.similarity_threshold <= 1:
+            embedding = self._embed(key[1])
+        with self._lock:
+            self._entries[key] = {"value": value, "embedding": embedding, "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats_counters["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.stats_counters, size=len(self._entries))
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def create_response_cache(embed=None):
+    """Build the response cache from RESPONSE_CACHE_* environment variables"""
+    return ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+        ttl=int(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92")),
+        embed=embed
+    )
@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from context_builder import cap_backlog
+
+
+def new_session():
+    """Return an empty session record"""
+    return {
+        "messages": [],
+        "lead_score": 0,
+        "last_contact": time.time(),
+        "guide_offered": False,
+        "call_offered": False,
+        "summary": "",
+        "summary_tokens": 0,
+        "unsummarized": []
+    }
+
+
+def _compact(session, max_messages, max_unsummarized=16):
+    """Keep only the fields and the message window the agent actually reads.
+
+    Messages beyond the window are queued in `unsummarized` so they can still
+    be folded into the rolling summary; that queue keeps its newest
+    max_unsummarized messages.
+    """
+    messages = session["messages"]
+    overflow = messages[:-max_messages] if len(messages) > max_messages else []
+    return {
+        "messages": messages[-max_messages:],
+        "lead_score": session["lead_score"],
+        "last_contact": time.time(),
+        "guide_offered": session["guide_offered"],
+        "call_offered": session["call_offered"],
+        "summary": session.get("summary", ""),
+        "summary_tokens": session.get("summary_tokens", 0),
+        "unsummarized": cap_backlog(session.get("unsummarized", []) + overflow, max_unsummarized)
+    }
+
+
+class MemorySessionStore:
+    """In-process session store with LRU eviction and an idle TTL"""
+
+    def __init__(self, max_sessions=10000, ttl=3600, max_messages=3, max_unsummarized=16):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.max_unsummarized = max_unsummarized
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session["last_contact"] > self.ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            # Hand out a copy so the caller can't grow the stored record
+            return dict(session, messages=list(session["messages"]), unsummarized=list(session["unsummarized"]))
+
+    def save(self, session_id, session):
+        record = _compact(session, self.max_messages, self.max_unsummarized)
+        with self._lock:
+            self._sessions[session_id] = record
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def lead_scores(self, prefix=""):
+        """Number of live sessions at each lead score, among session ids starting with prefix"""
+        cutoff = time.time() - self.ttl
+        scores = {}
+        with self._lock:
+            for session_id, session in self._sessions.items():
+                if session_id.startswith(prefix) and session["last_contact"] > cutoff:
+                    scores[session["lead_score"]] = scores.get(session["lead_score"], 0) + 1
+        return scores
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Session store shared by all workers through a SQLite file"""
+
+    def __init__(self, path="sessions.db", ttl=3600, max_messages=3, purge_every=500, max_unsummarized=16):
+        self.path = path
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.max_unsummarized = max_unsummarized
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at)")
+        self._conn.commit()
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND updated_at > ?",
+                (session_id, time.time() - self.ttl)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id, session):
+        record = _compact(session, self.max_messages, self.max_unsummarized)
+        data = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, data, record["last_contact"])
+            )
+            self._writes += 1
+            # Expired sessions are purged periodically rather than on every write
+            if self._writes % self.purge_every == 0:
+                self._conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (time.time() - self.ttl,))
+            self._conn.commit()
+
+    def lead_scores(self, prefix=""):
+        """Number of live sessions at each lead score among session ids starting with prefix, across all workers"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT json_extract(data, '$.lead_score'), COUNT(*) FROM sessions "
+                "WHERE updated_at > ? AND substr(session_id, 1, ?) = ? GROUP BY 1",
+                (time.time() - self.ttl, len(prefix), prefix)
+            ).fetchall()
+        return {score or 0: count for score, count in rows}
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store(max_messages=3, max_unsummarized=16):
+    """Build the session store selected by the SESSION_STORE environment variable"""
+    backend = os.getenv("SESSION_STORE", "memory")
+    ttl = int(os.getenv("SESSION_TTL", "3600"))
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB_PATH", "sessions.db"), ttl=ttl, max_messages=max_messages, max_unsummarized=max_unsummarized)
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_STORE backend: {backend}")
+    return MemorySessionStore(int(os.getenv("SESSION_MAX", "10000")), ttl=ttl, max_messages=max_messages, max_unsummarized=max_unsummarized)
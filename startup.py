@@ -0,0 +1,122 @@
+"""Background warm-up of heavy components and a startup profile.
+
+The app imports quickly because the knowledge index, embedding model, OpenAI
+client, tokenizer and PDF engine all load on first use. At startup a warm-up
+thread initializes them in the background; /ready reports 503 until it has
+finished, so a load balancer only sends traffic to warm workers. Requests that
+arrive earlier still work and initialize what they need on demand.
+
+    python startup.py            # per-module import and per-component init times
+    STARTUP_PROFILE=1 python app.py
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Third-party modules the app depends on, profiled individually before the app itself
+HEAVY_MODULES = ["flask", "openai", "chromadb", "reportlab", "tiktoken", "starlette"]
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+class Warmup:
+    """Initializes registered components once, in order, on a background thread"""
+
+    def __init__(self):
+        self.components = OrderedDict()
+        self.status = OrderedDict()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+
+    def register(self, name, init):
+        self.components[name] = init
+        self.status[name] = {"state": "pending"}
+
+    def run(self):
+        """Initialize every component in the calling thread"""
+        for name, init in self.components.items():
+            with self._lock:
+                self.status[name] = {"state": "loading"}
+            started = time.perf_counter()
+            try:
+                init()
+                result = {"state": "ready", "ms": _elapsed_ms(started)}
+            except Exception as e:
+                print(f"Error warming up {name}: {e}")
+                result = {"state": "failed", "ms": _elapsed_ms(started), "error": str(e)}
+            with self._lock:
+                self.status[name] = result
+        self._done.set()
+        if os.getenv("STARTUP_PROFILE") == "1":
+            print_profile({}, self.report())
+
+    def start(self):
+        """Run the warm-up in a background thread (once)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def ready(self):
+        # A failed component doesn't hold readiness back; it initializes on demand or
+        # degrades the way it already does (e.g. the FAQ fallback answer)
+        return self._done.is_set()
+
+    def report(self):
+        with self._lock:
+            components = {name: dict(status) for name, status in self.status.items()}
+        return {"ready": self.ready(), "components": components}
+
+
+warmup = Warmup()
+
+
+def profile_imports(modules=HEAVY_MODULES):
+    """Import each module in turn and return {module: ms}; already-loaded modules cost ~0"""
+    timings = OrderedDict()
+    for module in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(module)
+            timings[module] = _elapsed_ms(started)
+        except ImportError:
+            timings[module] = None
+    return timings
+
+
+def print_profile(import_timings, warmup_report):
+    if import_timings:
+        print(f"{'import':<28}{'ms':>10}")
+        for name, ms in import_timings.items():
+            print(f"{name:<28}{'missing' if ms is None else ms:>10}")
+        print()
+    print(f"{'component init':<28}{'ms':>10}  state")
+    for name, status in warmup_report["components"].items():
+        print(f"{name:<28}{status.get('ms', ''):>10}  {status['state']}")
+
+
+def main():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    timings = profile_imports()
+    started = time.perf_counter()
+    # Importing app registers the components without starting the background thread
+    os.environ["WARMUP"] = "0"
+    os.environ.pop("STARTUP_PROFILE", None)
+    app = importlib.import_module("app")
+    timings["app (lazy)"] = _elapsed_ms(started)
+    # Run as a script this file is __main__, so use the instance the app registered on
+    app.warmup.run()
+    print_profile(timings, app.warmup.report())
+
+
+if __name__ == "__main__":
+    main()
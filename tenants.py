@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from faq_index import COLLECTION_PREFIX, KNOWLEDGE_FILES, chunk_file, load_index
+from guide_pdf import guide_cache, DOWNLOAD_NAME
+from lead_store import LeadStore
+from lexical_index import BM25Index
+
+# Requests without a site id are served by the built-in LeadCraft bot
+DEFAULT_SITE = "default"
+
+# Site ids name a directory and a Chroma collection, so they are kept short and plain
+SITE_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,39}$")
+
+BOOKING_LINK = "https://calendly.com/your-calendar/15min-strategy-call"
+
+# Offers appended to the reply as the lead warms up; {booking_link} is filled in per tenant
+GUIDE_OFFER = "\n\n📚 **Free Guide**: I'd love to send you our comprehensive guide on lead generation strategies. It's packed with actionable tips that have helped our clients double their leads in 30 days. Would you like me to send it to your email?"
+CALL_OFFER = "\n\n📞 **Free Strategy Call**: I'd love to hop on a quick 15-minute call to discuss your specific lead generation challenges and share some personalized strategies. No sales pitch - just pure value! Here's my booking link: {booking_link}"
+
+
+class UnknownTenant(KeyError):
+    """Raised for a site id that has no tenant directory"""
+
+
+class Tenant:
+    """Knowledge base, offers, guide and lead store of one client site.
+
+    Everything heavy (the vector collection, the BM25 index, the lead
+    database, the guide file) is opened on first use.
+    """
+
+    def __init__(self, site_id, config=None, root="", leads_db=None, legacy_csv=None):
+        config = config or {}
+        self.site_id = site_id
+        self.root = root
+        self.name = config.get("name", "LeadCraft AI")
+        self.knowledge_files = [os.path.join(root, path) for path in config.get("knowledge_files", KNOWLEDGE_FILES)]
+        self.booking_link = config.get("booking_link", BOOKING_LINK)
+        self.guide_offer = config.get("guide_offer", GUIDE_OFFER)
+        self.call_offer = config.get("call_offer", CALL_OFFER).format(booking_link=self.booking_link)
+        self.guide_file = config.get("guide_file")
+        self.guide_download_name = config.get("guide_download_name", DOWNLOAD_NAME)
+        self.leads_db = leads_db or os.path.join(root, "leads.db")
+        self.legacy_csv = legacy_csv
+        # The default tenant keeps the original collection names so existing indexes are reused
+        self.collection_prefix = COLLECTION_PREFIX if site_id == DEFAULT_SITE else f"{COLLECTION_PREFIX}{site_id}_"
+        self._lock = threading.Lock()
+        self._collection = None
+        self._lexical_index = None
+        self._lead_store = None
+        self._guide = None
+
+    def session_key(self, session_id):
+        """Session ids are chosen by the widget, so every tenant's sessions are namespaced.
+
+        The default tenant is prefixed too: otherwise a visitor sending
+        "acme:abc" to the default site would open tenant acme's session "abc".
+        Site ids never contain ':', so the first segment always names the site.
+        """
+        return f"{self.site_id}:{session_id}"
+
+    def collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    self._collection = load_index(paths=self.knowledge_files, prefix=self.collection_prefix)
+        return self._collection
+
+    def lexical_index(self):
+        if self._lexical_index is None:
+            with self._lock:
+                if self._lexical_index is None:
+                    self._lexical_index = BM25Index([chunk for path in self.knowledge_files for chunk in chunk_file(path)])
+        return self._lexical_index
+
+    def lead_store(self):
+        if self._lead_store is None:
+            with self._lock:
+                if self._lead_store is None:
+                    self._lead_store = LeadStore(self.leads_db, legacy_csv=self.legacy_csv)
+        return self._lead_store
+
+    def close(self):
+        """Release what the tenant opened once it leaves the registry.
+
+        The lead store's connection is closed; the vector collection has no
+        handle of its own in Chroma, so its segment is unloaded by Chroma's
+        LRU segment cache (FAQ_INDEX_MEMORY_MB) once it is no longer queried.
+        A request still holding the tenant reopens what it uses next.
+        """
+        with self._lock:
+            store, self._lead_store = self._lead_store, None
+            self._collection = None
+            self._lexical_index = None
+            self._guide = None
+        if store is not None:
+            store.close()
+
+    def guide(self, name=None):
+        """Return (pdf_bytes, etag, last_modified): the tenant's own PDF, or the rendered LeadCraft guide"""
+        if not self.guide_file:
+            return guide_cache.get(name=name)
+        if self._guide is None:
+            path = os.path.join(self.root, self.guide_file)
+            with open(path, "rb") as f:
+                pdf = f.read()
+            modified = datetime.fromtimestamp(int(os.path.getmtime(path)), timezone.utc)
+            self._guide = (pdf, hashlib.sha256(pdf).hexdigest()[:32], modified)
+        return self._guide
+
+
+class TenantRegistry:
+    """Tenants by site id, loaded from TENANTS_DIR/<site_id>/tenant.json on first request.
+
+    At most max_tenants are kept; the least recently used one is dropped
+    (with its indexes and database connection) when another is loaded. The
+    default tenant is always resident.
+    """
+
+    def __init__(self, root="tenants", max_tenants=100, default=None):
+        self.root = root
+        self.max_tenants = max_tenants
+        self.default = default or Tenant(DEFAULT_SITE)
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats_counters = {"hits": 0, "loads": 0, "evictions": 0}
+
+    def _load(self, site_id):
+        root = os.path.join(self.root, site_id)
+        config_path = os.path.join(root, "tenant.json")
+        if not os.path.exists(config_path):
+            raise UnknownTenant(site_id)
+        with open(config_path, encoding="utf-8") as f:
+            return Tenant(site_id, json.load(f), root)
+
+    def get(self, site_id=None):
+        """Return the tenant for site_id (the default tenant when empty); raises UnknownTenant"""
+        if not site_id or site_id == DEFAULT_SITE:
+            return self.default
+        if not SITE_ID_PATTERN.match(site_id):
+            raise UnknownTenant(site_id)
+        with self._lock:
+            tenant = self._tenants.get(site_id)
+            if tenant:
+                self._tenants.move_to_end(site_id)
+                self.stats_counters["hits"] += 1
+                return tenant
+
+        tenant = self._load(site_id)
+        evicted = []
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep the first copy
+            tenant = self._tenants.setdefault(site_id, tenant)
+            self._tenants.move_to_end(site_id)
+            self.stats_counters["loads"] += 1
+            while len(self._tenants) > self.max_tenants:
+                evicted.append(self._tenants.popitem(last=False)[1])
+                self.stats_counters["evictions"] += 1
+        for old in evicted:
+            old.close()
+        return tenant
+
+    def stats(self):
+        with self._lock:
+            return dict(self.stats_counters, resident=len(self._tenants), max_tenants=self.max_tenants)
+
+
+def create_tenant_registry():
+    """Build the tenant registry from TENANTS_DIR and TENANT_CACHE_SIZE.
+
+    The default tenant uses the top-level knowledge files and LEADS_DB_PATH.
+    """
+    default = Tenant(DEFAULT_SITE, leads_db=os.getenv("LEADS_DB_PATH", "leads.db"), legacy_csv="leads.csv")
+    return TenantRegistry(
+        root=os.getenv("TENANTS_DIR", "tenants"),
+        max_tenants=int(os.getenv("TENANT_CACHE_SIZE", "100")),
+        default=default
+    )
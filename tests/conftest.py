@@ -0,0 +1,15 @@
+# The modules live at the repository root and some read their data files by relative
+# path (intents.json), so tests import and run from there wherever pytest is started
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# Importing the app opens its databases and starts the warm-up; keep both out of the tree
+_workdir = tempfile.mkdtemp(prefix="leadcraft-tests-")
+os.environ.setdefault("LEADS_DB_PATH", os.path.join(_workdir, "leads.db"))
+os.environ.setdefault("TENANTS_DIR", os.path.join(_workdir, "tenants"))
+os.environ.setdefault("WARMUP", "0")
@@ -0,0 +1,126 @@
+from types import SimpleNamespace
+
+import pytest
+
+import agent
+from context_builder import make_message
+from response_cache import ResponseCache
+from session_store import MemorySessionStore, new_session
+
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def faq_result(answer="Plans start at $49.", match=None):
+    return {"answer": answer, "source_ids": ["faq_0"], "match": match}
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    """Answer every OpenAI call from its system prompt, recording the calls"""
+    calls = []
+
+    def create(**kwargs):
+        system = kwargs["messages"][0]["content"]
+        calls.append(system)
+        if "follow-up" in system:
+            return completion("Which CRM do you use?")
+        if "qualif" in system.lower():
+            return completion("qualified")
+        return completion("Here is what our plans include.")
+
+    monkeypatch.setattr(agent.llm, "create", create)
+    monkeypatch.setattr(agent, "session_store", MemorySessionStore())
+    monkeypatch.setattr(agent, "response_cache", ResponseCache(embed=None))
+    monkeypatch.setattr(agent, "event_log", None)
+    monkeypatch.setattr(agent, "search_docs", lambda *args: faq_result())
+    monkeypatch.setattr(agent.qualifier, "local_decision", lambda text, embedding=None: "qualified")
+    return calls
+
+
+def warm_session(session_id, score, guide_offered=False, call_offered=False):
+    session = new_session()
+    session.update(lead_score=score, guide_offered=guide_offered, call_offered=call_offered)
+    agent.session_store.save(agent.tenants.default.session_key(session_id), session)
+
+
+@pytest.mark.parametrize("score, guide, call, expected", [
+    (1, False, False, (False, False, False)),
+    (2, False, False, (True, False, False)),
+    (2, True, False, (False, True, False)),
+    (2, True, True, (False, False, True)),
+    (1, True, True, (False, False, False)),
+])
+def test_plan_offers(score, guide, call, expected):
+    session = dict(new_session(), lead_score=score, guide_offered=guide, call_offered=call)
+    assert agent._plan_offers(session) == expected
+
+
+def test_offers_then_follow_up_over_a_conversation(llm_calls):
+    warm_session("s1", 1)
+    response, timings = agent.run_agent_with_timings("What do your plans include?", "s1")
+    assert agent.tenants.default.guide_offer in response
+    assert "follow_up" not in timings
+
+    response, timings = agent.run_agent_with_timings("And the premium tier?", "s1")
+    assert agent.tenants.default.call_offer in response
+
+    response, timings = agent.run_agent_with_timings("Does it include onboarding?", "s1")
+    assert response.endswith("Which CRM do you use?")
+    assert "follow_up" in timings
+
+
+def test_async_turn_runs_the_follow_up(llm_calls, monkeypatch):
+    async def acreate(**kwargs):
+        return agent.llm.create(**kwargs)
+
+    monkeypatch.setattr(agent.llm, "acreate", acreate)
+    warm_session("s2", 3, guide_offered=True, call_offered=True)
+    response, timings = agent.asyncio.run(agent.arun_agent_with_timings("Does it include onboarding?", "s2"))
+    assert response.endswith("Which CRM do you use?")
+    assert "follow_up" in timings
+
+
+def test_first_turn_replies_are_shared_through_the_cache(llm_calls):
+    response, timings = agent.run_agent_with_timings("What do your plans include?", "c1")
+    assert "reply" in timings and len(llm_calls) == 1
+
+    cached, timings = agent.run_agent_with_timings("what do your plans include", "c2")
+    assert cached == response and "reply" not in timings and len(llm_calls) == 1
+
+    # A later turn was prompted with the visitor's history, so it isn't shared
+    agent.run_agent_with_timings("And for agencies?", "c1")
+    agent.run_agent_with_timings("And for agencies?", "c3")
+    assert len(llm_calls) == 3
+
+
+def faq_match(similarity):
+    return {"id": "faq_3", "kind": "faq", "question": "Is there a free plan?", "answer": "Yes, up to 100 leads a month.",
+            "similarity": similarity}
+
+
+def test_fast_path_answers_close_faq_matches_without_the_llm(llm_calls, monkeypatch):
+    monkeypatch.setattr(agent, "FAQ_FAST_PATH", "direct")
+    monkeypatch.setattr(agent, "search_docs", lambda *args: faq_result(match=faq_match(0.95)))
+    response, timings = agent.run_agent_with_timings("Is there a free plan?", "f1")
+    assert response == "Yes, up to 100 leads a month." and llm_calls == []
+
+    monkeypatch.setattr(agent, "search_docs", lambda *args: faq_result(match=faq_match(0.5)))
+    response, timings = agent.run_agent_with_timings("Anything free?", "f2")
+    assert response == "Here is what our plans include." and len(llm_calls) == 1
+
+
+def test_fold_summary_drops_only_the_folded_batch(llm_calls):
+    session = new_session()
+    session["unsummarized"] = [make_message("user", f"question {i}") for i in range(6)]
+    agent.session_store.save("sum", session)
+    pending = agent.context_builder.summary_batch_of(session)
+    agent._fold_summary("sum", "", pending)
+    saved = agent.session_store.get("sum")
+    assert saved["unsummarized"] == session["unsummarized"][len(pending):]
+    assert saved["summary"] == "Here is what our plans include." and saved["summary_tokens"] > 0
+
+    # A batch that is no longer at the head of the queue is not applied twice
+    agent._fold_summary("sum", "", pending)
+    assert agent.session_store.get("sum")["unsummarized"] == saved["unsummarized"]
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("flask")
+
+from app import app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_download_guide_is_conditional(client):
+    response = client.get("/download-guide")
+    assert response.status_code == 200
+    assert response.data.startswith(b"%PDF")
+    etag = response.headers["ETag"]
+    again = client.get("/download-guide", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert client.get("/download-guide", headers={"If-Modified-Since": response.headers["Last-Modified"]}).status_code == 304
+
+
+def test_download_guide_ignores_name(client):
+    plain = client.get("/download-guide")
+    named = client.get("/download-guide?name=Somebody")
+    assert named.headers["ETag"] == plain.headers["ETag"]
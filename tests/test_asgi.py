@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("httpx")
+
+from starlette.testclient import TestClient  # noqa: E402
+
+import asgi  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def reply(user_message, session_id, site_id):
+        return "We have a free plan.", {"total": 1.0}
+
+    monkeypatch.setattr(asgi, "arun_agent_with_timings", reply)
+    with TestClient(asgi.app) as client:
+        yield client
+
+
+def test_ask_times_suggested_questions_and_is_measured(client):
+    response = client.post("/ask", json={"message": "Is there a free plan?", "session_id": "s1"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["suggested_questions"]
+    assert "suggested_questions" in body["timings"]
+    exposition = client.get("/metrics").text
+    assert 'leadcraft_http_request_seconds_count{method="POST",route="/ask",status="200"}' in exposition
@@ -0,0 +1,47 @@
+from context_builder import ContextBuilder, cap_backlog, count_tokens, make_message
+
+
+def conversation(count, words=20):
+    return [make_message("user" if i % 2 == 0 else "assistant", f"message {i} " + "word " * words) for i in range(count)]
+
+
+def test_trim_moves_the_oldest_messages_past_the_history_budget():
+    messages = conversation(6)
+    builder = ContextBuilder(history_budget=messages[0]["tokens"] * 2 + 1)
+    session = builder.trim({"messages": list(messages), "unsummarized": []})
+    assert session["messages"] == messages[-2:]
+    assert session["unsummarized"] == messages[:-2]
+
+
+def test_trim_keeps_the_newest_message_even_when_it_is_over_budget():
+    messages = conversation(2, words=200)
+    session = ContextBuilder(history_budget=10).trim({"messages": list(messages), "unsummarized": []})
+    assert session["messages"] == messages[-1:]
+
+
+def test_backlog_is_capped_to_the_newest_messages():
+    assert cap_backlog(list(range(20)), 16) == list(range(4, 20))
+    assert cap_backlog(list(range(20)), 0) == list(range(20))
+    messages = conversation(10)
+    builder = ContextBuilder(history_budget=1, max_unsummarized=4)
+    session = builder.trim({"messages": list(messages), "unsummarized": []})
+    assert session["unsummarized"] == messages[5:9]
+
+
+def test_build_fits_the_budget_and_leaves_out_the_current_message():
+    messages = conversation(6)
+    builder = ContextBuilder(budget=200, faq_budget=50)
+    session = {"messages": messages, "summary": "Runs a small agency.", "summary_tokens": 0}
+    context, faq, tokens = builder.build(session, "Plans start at $49.\n\n" + "Second snippet " * 100)
+    assert tokens <= 200
+    assert context.startswith("Summary of earlier conversation: Runs a small agency.")
+    assert messages[-1]["content"] not in context and messages[-2]["content"] in context
+    assert faq.startswith("Plans start at $49.") and count_tokens(faq) <= 50
+
+
+def test_summary_request_folds_cut_messages():
+    builder = ContextBuilder(summary_message_tokens=5)
+    request = builder.summary_request("", conversation(2, words=100))
+    prompt = request["messages"][1]["content"]
+    assert "Summary so far: (none)" in prompt
+    assert count_tokens(prompt) < 60
@@ -0,0 +1,71 @@
+import atexit
+import sqlite3
+
+import pytest
+
+from email_capture import CapturePipeline
+
+
+class FailingConnection:
+    """Stands in for a database that rejects writes but still serves reads"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def executemany(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = CapturePipeline(str(tmp_path / "leads.db"), max_buffer=3, flush_interval=3600, max_pending=5)
+    yield pipeline
+    pipeline._stopped.set()
+    atexit.unregister(pipeline.close)
+
+
+def test_captures_are_deduplicated_and_flushed(pipeline):
+    first = pipeline.capture({"email": "a@example.com", "source": "chat"})
+    assert pipeline.capture({"email": " a@example.com ", "source": "chat"}) == first
+    pipeline.capture({"email": "a@example.com", "source": "guide"})
+    assert pipeline.flush() == 2
+    pipeline.capture({"email": "a@example.com", "source": "chat"})
+    pipeline.flush()
+    assert pipeline.page(1, 50)[1] == 2
+
+
+def test_full_buffer_flushes_on_capture(pipeline):
+    for i in range(3):
+        pipeline.capture({"email": f"{i}@example.com", "source": "chat"})
+    assert len(pipeline._buffer) == 0
+    assert pipeline.page(1, 50)[1] == 3
+
+
+def test_captures_are_listed_per_site(pipeline):
+    pipeline.capture({"email": "a@example.com", "source": "chat"})
+    pipeline.capture({"email": "b@example.com", "source": "chat:acme", "site_id": "acme"})
+    rows, total = pipeline.page(1, 50, site_id="acme")
+    assert total == 1
+    assert rows[0]["email"] == "b@example.com"
+
+
+def test_failing_database_bounds_the_buffer(pipeline):
+    pipeline._conn = FailingConnection(pipeline._conn)
+    for i in range(8):
+        pipeline.capture({"email": f"{i}@example.com", "source": "chat"})
+    assert pipeline.dropped == 3
+    assert [row[1] for row in pipeline._buffer.values()] == [f"{i}@example.com" for i in range(3, 8)]
+
+
+def test_page_serves_stored_rows_while_flushes_fail(pipeline):
+    pipeline.capture({"email": "stored@example.com", "source": "chat"})
+    pipeline.flush()
+    pipeline._conn = FailingConnection(pipeline._conn)
+    pipeline.capture({"email": "pending@example.com", "source": "chat"})
+    rows, total = pipeline.page(1, 50)
+    assert total == 1
+    assert rows[0]["email"] == "stored@example.com"
+    assert len(pipeline._buffer) == 1
@@ -0,0 +1,35 @@
+import guide_pdf
+from guide_pdf import CONTENT_UPDATED, MAX_NAME_CHARS, GuideCache, content_hash
+
+
+def test_shared_guide_is_rendered_once(monkeypatch):
+    renders = []
+    monkeypatch.setattr(guide_pdf, "render_guide", lambda name=None: renders.append(name) or b"%PDF")
+    cache = GuideCache()
+    first = cache.get()
+    assert cache.get() is first
+    assert renders == [None]
+    assert first == (b"%PDF", content_hash({}), CONTENT_UPDATED)
+
+
+def test_personalized_copies_are_bounded_and_not_cached(monkeypatch):
+    renders = []
+    monkeypatch.setattr(guide_pdf, "render_guide", lambda name=None: renders.append(name) or b"%PDF")
+    cache = GuideCache()
+    shared = cache.get()
+    _, etag, last_modified = cache.get(name="  " + "x" * 500)
+    assert renders[-1] == "x" * MAX_NAME_CHARS
+    assert etag != shared[1]
+    assert last_modified == CONTENT_UPDATED
+    assert cache.get() is shared
+
+
+def test_etag_follows_content(monkeypatch):
+    before = content_hash({})
+    monkeypatch.setattr(guide_pdf, "TITLE", "A DIFFERENT TITLE")
+    assert content_hash({}) != before
+
+
+def test_rendered_pdf():
+    pdf, _, _ = GuideCache().get(name="Ada <Lovelace>")
+    assert pdf.startswith(b"%PDF")
@@ -0,0 +1,60 @@
+import re
+
+from intent_engine import IntentEngine, _trie_regex
+
+
+def engine(**intents):
+    return IntentEngine({
+        "intents": {name: {"phrases": phrases} for name, phrases in intents.items()},
+        "objection_order": [],
+        "suggestion_order": [],
+        "response_suggestion_order": [],
+        "default_suggestions": [],
+    })
+
+
+def test_trie_regex_factors_shared_prefixes():
+    pattern = _trie_regex(["plan", "pricing", "price*"])
+    assert pattern.count("p") == 1
+    regex = re.compile(pattern + r"(?!\w)")
+    assert regex.fullmatch("plan")
+    assert regex.fullmatch("pricing")
+    assert regex.fullmatch("prices")
+    assert not regex.fullmatch("pla")
+
+
+def test_phrases_match_on_word_boundaries():
+    classify = engine(topic_ai=["ai"]).classify
+    assert classify("Tell me about the AI") == {"topic_ai"}
+    assert classify("how do I maintain my contacts") == frozenset()
+    assert classify("ai-powered") == {"topic_ai"}
+
+
+def test_trailing_star_matches_word_endings():
+    classify = engine(pricing=["plan*"]).classify
+    assert classify("which plans are there") == {"pricing"}
+    assert classify("planning ahead") == {"pricing"}
+    assert classify("airplane") == frozenset()
+
+
+def test_multi_word_phrases_and_shared_tokens():
+    classify = engine(browsing=["just browsing"], lead=["lead", "leads"], magnet=["leads"]).classify
+    assert classify("I'm just browsing") == {"browsing"}
+    assert classify("browsing") == frozenset()
+    assert classify("more leads please") == {"lead", "magnet"}
+
+
+def test_qualify_score_sums_matched_intent_weights():
+    rules = {
+        "intents": {
+            "buying": {"phrases": ["pricing"], "qualify_weight": 0.6},
+            "company": {"phrases": ["our team"], "qualify_weight": 0.3},
+            "budget": {"phrases": ["no budget"], "qualify_weight": -0.8},
+            "topic": {"phrases": ["team"]},
+        },
+        "objection_order": [], "suggestion_order": [], "response_suggestion_order": [], "default_suggestions": [],
+    }
+    scored = IntentEngine(rules)
+    assert round(scored.qualify_score("pricing for our team"), 2) == 0.9
+    assert round(scored.qualify_score("pricing but no budget"), 2) == -0.2
+    assert scored.qualify_score("team") == 0
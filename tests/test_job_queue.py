@@ -0,0 +1,82 @@
+import pytest
+
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    # No worker threads: the tests drive the queue with run_once; no backoff so retries are due at once
+    queue = JobQueue(path=str(tmp_path / "jobs.db"), workers=0, max_attempts=3, backoff_base=0.0)
+    yield queue
+    queue.close(timeout=0)
+
+
+def test_jobs_are_handled_in_batches_and_removed(queue):
+    batches = []
+    queue.register("persist", batches.append, batch_size=2)
+    for i in range(3):
+        queue.enqueue("persist", {"n": i})
+    assert queue.run_once() == 2
+    assert queue.run_once() == 1
+    assert queue.run_once() == 0
+    assert sorted(item["n"] for batch in batches for item in batch) == [0, 1, 2]
+    assert queue.stats()["pending"] == 0
+
+
+def test_failed_job_is_retried_then_succeeds(queue):
+    calls = []
+
+    def flaky(payloads):
+        calls.append(payloads)
+        if len(calls) == 1:
+            raise RuntimeError("smtp down")
+
+    queue.register("email", flaky)
+    queue.enqueue("email", {"to": "a@example.com"})
+    queue.run_once()
+    assert queue.stats()["pending"] == 1
+    queue.run_once()
+    assert len(calls) == 2
+    assert queue.stats() == {"pending": 0, "running": 0, "dead": 0, "by_type": {}}
+
+
+def test_job_moves_to_dead_letters_after_max_attempts(queue):
+    def broken(payloads):
+        raise ValueError("bad payload")
+
+    queue.register("crm", broken)
+    job_id = queue.enqueue("crm", {"lead": 1})
+    for _ in range(5):
+        queue.run_once()
+    dead = queue.dead_letters()
+    assert [job["id"] for job in dead] == [job_id]
+    assert dead[0]["attempts"] == 3
+    assert dead[0]["last_error"] == "ValueError: bad payload"
+    assert dead[0]["payload"] == {"lead": 1}
+
+
+def test_retry_dead_requeues_with_fresh_attempts(queue):
+    fail = [True]
+
+    def handler(payloads):
+        if fail[0]:
+            raise RuntimeError("down")
+
+    queue.register("crm", handler)
+    queue.enqueue("crm", {"lead": 1})
+    for _ in range(3):
+        queue.run_once()
+    assert queue.stats()["dead"] == 1
+    fail[0] = False
+    assert queue.retry_dead() == 1
+    assert queue.run_once() == 1
+    assert queue.stats()["dead"] == 0
+
+
+def test_jobs_without_a_handler_wait(queue):
+    queue.enqueue("later", {"n": 1})
+    assert queue.run_once() == 0
+    handled = []
+    queue.register("later", handled.extend)
+    assert queue.run_once() == 1
+    assert handled == [{"n": 1}]
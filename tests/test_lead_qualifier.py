@@ -0,0 +1,26 @@
+import pytest
+
+from lead_qualifier import TieredQualifier, rule_score
+
+
+@pytest.fixture
+def qualifier():
+    return TieredQualifier(llm_qualify=lambda text: "qualified")
+
+
+@pytest.mark.parametrize("text, decision", [
+    ("We are planning to start next month", None),
+    ("What does the pricing look like for our company?", "qualified"),
+    ("How do I upgrade to the paid plan?", "qualified"),
+    ("I'm a student working on homework", "not_qualified"),
+    ("just browsing", "not_qualified"),
+    ("hello!", "not_qualified"),
+])
+def test_rules_need_more_than_one_buying_keyword(qualifier, text, decision):
+    assert qualifier.local_decision(text) == decision
+    assert qualifier.counts["rules"] == (decision is not None)
+
+
+def test_rule_score_is_clamped():
+    assert rule_score("pricing for our company, ready to buy") == 1.0
+    assert rule_score("hi") == -0.8
@@ -0,0 +1,74 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from lead_store import LeadStore, read_leads, utc_timestamp
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LeadStore(str(tmp_path / "leads.db"), legacy_csv=None)
+
+
+def test_import_skips_existing_and_repeated_emails(store):
+    store.import_leads([{"name": "Ann", "email": "ann@example.com"}])
+    stats = store.import_leads([
+        {"name": "Ann again", "email": "ANN@example.com"},
+        {"name": "Bob", "email": "bob@example.com"},
+        {"name": "Bob twice", "email": " Bob@Example.com "},
+        {"name": "No email"},
+        {"name": "Bad email", "email": "bob.example.com"},
+    ])
+    assert stats == {"imported": 1, "duplicates": 2, "invalid": 2}
+    assert store.stats()["total"] == 2
+
+
+def test_import_counts_malformed_rows_as_invalid(store):
+    ndjson = io.StringIO('{"email": "a@example.com", "name": null}\n{not json\n[1, 2]\n"text"\n{"email": null}\n')
+    stats = store.import_leads(read_leads(ndjson, fmt="ndjson"))
+    assert stats == {"imported": 1, "duplicates": 0, "invalid": 4}
+    lead = next(store.iter_filtered())
+    assert lead["name"] == ""
+
+
+def test_import_of_short_csv_rows(store):
+    csv_text = io.StringIO("name,email,product,pain_point\nAnn,ann@example.com\nBob,bob@example.com,Pro,\n")
+    stats = store.import_leads(read_leads(csv_text))
+    assert stats == {"imported": 2, "duplicates": 0, "invalid": 0}
+    assert store.stats()["total"] == 2
+
+
+def test_import_in_batches(store):
+    leads = [{"email": f"lead{i}@example.com"} for i in range(7)] + [{"email": "lead0@example.com"}]
+    stats = store.import_leads(leads, batch_size=3)
+    assert stats == {"imported": 7, "duplicates": 1, "invalid": 0}
+
+
+
+def test_utc_timestamp_normalizes_offsets():
+    assert utc_timestamp("2026-03-01T23:30:00+02:00") == "2026-03-01T21:30:00Z"
+    assert utc_timestamp("2026-03-01T23:30:00Z") == "2026-03-01T23:30:00Z"
+    assert utc_timestamp("2026-03-01T23:30:00") == "2026-03-01T23:30:00Z"
+    assert utc_timestamp("not a date") == "not a date"
+    assert utc_timestamp(None).endswith("Z")
+
+
+def test_stats_buckets_are_utc(store):
+    now = datetime.now(timezone.utc)
+    local = now.astimezone(timezone(timedelta(hours=5)))
+    store.add_many([
+        {"email": "a@example.com", "timestamp": local.isoformat()},
+        {"email": "b@example.com"},
+    ])
+    stats = store.stats()
+    assert stats["by_hour"] == {now.strftime("%Y-%m-%dT%H"): 2}
+    assert stats["by_day"] == {now.date().isoformat(): 2}
+    assert stats["today"] == 2
+
+
+def test_add_many_is_idempotent_on_lead_key(store):
+    leads = [{"email": "a@example.com", "lead_key": "k1"}, {"email": "b@example.com", "lead_key": "k2"}]
+    assert store.add_many(leads) == 2
+    assert store.add_many(leads + [{"email": "c@example.com", "lead_key": "k3"}]) == 1
+    assert store.stats()["total"] == 3
@@ -0,0 +1,61 @@
+from lexical_index import BM25Index, fuse, is_confident, question_similarity, relative_scores, tokenize
+
+CHUNKS = [
+    ("faq-0", "Q: How much does it cost?\nA: The paid plan is $49 a month.",
+     {"question": "How much does it cost?", "answer": "The paid plan is $49 a month.", "site_id": "default"}),
+    ("faq-1", "Q: Does it integrate with HubSpot?\nA: Yes, HubSpot and Salesforce are supported.",
+     {"question": "Does it integrate with HubSpot?", "answer": "Yes, HubSpot and Salesforce are supported.", "site_id": "default"}),
+    ("faq-2", "Q: Is my data secure?\nA: Data is encrypted and GDPR compliant.",
+     {"question": "Is my data secure?", "answer": "Data is encrypted and GDPR compliant.", "site_id": "other"}),
+]
+
+
+def test_tokenize_drops_stopwords_and_stems():
+    assert tokenize("What are the plans for leads?") == ["plan", "lead"]
+    assert tokenize("Pricing companies' class") == ["pric", "company", "class"]
+
+
+def test_search_ranks_question_match_first():
+    index = BM25Index(CHUNKS)
+    hits = index.search("integrate hubspot")
+    assert hits[0]["id"] == "faq-1"
+    assert hits[0]["answer"].startswith("Yes, HubSpot")
+
+
+def test_synonyms_reach_differently_phrased_answers():
+    hits = BM25Index(CHUNKS).search("pricing")
+    assert [hit["id"] for hit in hits] == ["faq-0"]
+
+
+def test_search_filters_by_metadata_and_limits_k():
+    index = BM25Index(CHUNKS)
+    assert index.search("data secure", where={"site_id": "default"}) == []
+    assert len(index.search("hubspot cost data", k=2)) == 2
+
+
+def test_unknown_terms_return_no_hits():
+    assert BM25Index(CHUNKS).search("quantum") == []
+    assert BM25Index([]).search("anything") == []
+
+
+def test_confidence_and_relative_scores():
+    hits = [{"id": "a", "score": 4.0}, {"id": "b", "score": 2.0}]
+    assert is_confident(hits)
+    assert not is_confident([{"id": "a", "score": 4.0}, {"id": "b", "score": 3.5}])
+    assert not is_confident([{"id": "a", "score": 1.0}])
+    assert [hit["score"] for hit in relative_scores(hits)] == [1.0, 0.5]
+
+
+def test_fuse_blends_both_lists():
+    lexical = [{"id": "a", "answer": "A", "score": 4.0, "metadata": {}}]
+    vector = [{"id": "b", "answer": "B", "score": 0.9, "metadata": {}}, {"id": "a", "answer": "A", "score": 0.5, "metadata": {}}]
+    fused = fuse(lexical, vector)
+    # a: 0.7 * 0.5 + 0.3 * 1.0; b: 0.7 * 0.9 and nothing lexical
+    assert [(hit["id"], hit["score"]) for hit in fused] == [("a", 0.65), ("b", 0.63)]
+    assert len(fuse(lexical, vector, k=1)) == 1
+
+
+def test_question_similarity():
+    assert question_similarity("How much does it cost?", "How much does it cost?") == 1.0
+    assert question_similarity("cost of hubspot integration and data security", "How much does it cost?") < 0.5
+    assert question_similarity("hello", "How much does it cost?") == 0.0
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+import types
+
+import openai
+import pytest
+
+from llm_client import LLMClient, Throttled, TokenBucket
+
+
+class FakeChatCompletion:
+    """Replays scripted outcomes: exceptions are raised, anything else returned"""
+
+    def __init__(self, outcomes, gate=None):
+        self.outcomes = list(outcomes)
+        self.gate = gate
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def create(self, **params):
+        if self.gate:
+            self.gate.wait(5)
+        return self._next()
+
+    async def acreate(self, **params):
+        await asyncio.sleep(0.01)
+        return self._next()
+
+
+@pytest.fixture
+def client():
+    client = LLMClient(rate=0, backoff_base=0)
+    yield client
+    client.session.close()
+
+
+def fake_api(client, chat):
+    client._openai = types.SimpleNamespace(ChatCompletion=chat, error=openai.error, aiosession=openai.aiosession)
+    return chat
+
+
+def test_retries_transient_errors_only(client):
+    chat = fake_api(client, FakeChatCompletion([openai.error.RateLimitError("slow down"), {"choices": []}]))
+    assert client.create(model="m", messages=[]) == {"choices": []}
+    assert chat.calls == 2 and client.stats()["retries"] == 1
+
+    chat = fake_api(client, FakeChatCompletion([openai.error.InvalidRequestError("bad", None)]))
+    with pytest.raises(openai.error.InvalidRequestError):
+        client.create(model="m", messages=[])
+    assert chat.calls == 1 and client.stats()["failures"] == 1
+
+
+def test_gives_up_after_max_retries(client):
+    chat = fake_api(client, FakeChatCompletion([openai.error.Timeout("t")] * 4))
+    with pytest.raises(openai.error.Timeout):
+        client.create(model="m", messages=[])
+    assert chat.calls == 4
+
+
+def test_identical_inflight_requests_are_coalesced(client):
+    gate = threading.Event()
+    chat = fake_api(client, FakeChatCompletion([{"choices": ["one"]}], gate=gate))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.create(model="m", messages=[]))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for _ in range(500):
+        if client.stats()["coalesced"] == 2:
+            break
+        time.sleep(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert chat.calls == 1 and results == [{"choices": ["one"]}] * 3
+
+
+def test_async_requests_are_coalesced(client):
+    chat = fake_api(client, FakeChatCompletion([{"choices": ["one"]}]))
+
+    async def main():
+        results = await asyncio.gather(*(client.acreate(model="m", messages=[]) for _ in range(3)))
+        await client.aclose()
+        return results
+
+    assert asyncio.run(main()) == [{"choices": ["one"]}] * 3
+    assert chat.calls == 1 and client.stats()["coalesced"] == 2
+    assert not client._aiosessions
+
+
+def test_bucket_sheds_past_max_wait():
+    bucket = TokenBucket(rate=1, capacity=1, max_wait=1.5)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(1.0, abs=0.05)
+    with pytest.raises(Throttled):
+        bucket.reserve()
+    # A refused caller doesn't lengthen the queue for the next one
+    with pytest.raises(Throttled):
+        bucket.reserve()
+
+
+def test_throttled_calls_fail_fast(client):
+    client.bucket = TokenBucket(rate=0.001, capacity=0, max_wait=1)
+    chat = fake_api(client, FakeChatCompletion([{"choices": []}]))
+    with pytest.raises(Throttled):
+        client.create(model="m", messages=[])
+    assert chat.calls == 0 and client.stats()["shed"] == 1 and client.active() == 0
+
+
+def test_stream_stays_active_until_read(client):
+    fake_api(client, FakeChatCompletion([iter(["a", "b"])]))
+    stream = client.create(model="m", messages=[], stream=True)
+    assert client.active() == 1
+    assert list(stream) == ["a", "b"]
+    assert client.active() == 0
@@ -0,0 +1,70 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import LoadShedder, RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path):
+    path = str(tmp_path / "rate.db") if request.param == "sqlite" else None
+    return RateLimiter({"session": (60, 2), "ip": (6, 3)}, path=path)
+
+
+def test_burst_then_limited_with_retry_after(limiter, clock):
+    assert limiter.hit(session="s1") == (True, 0.0)
+    assert limiter.hit(session="s1") == (True, 0.0)
+    allowed, retry_after = limiter.hit(session="s1")
+    assert not allowed
+    assert retry_after == 1.0
+
+
+def test_bucket_refills_over_time(limiter, clock):
+    limiter.hit(session="s1")
+    limiter.hit(session="s1")
+    assert not limiter.hit(session="s1")[0]
+    clock[0] += 1.0
+    assert limiter.hit(session="s1")[0]
+    assert not limiter.hit(session="s1")[0]
+
+
+def test_token_taken_from_every_key_only_when_all_have_one(limiter, clock):
+    for _ in range(2):
+        assert limiter.hit(session="s1", ip="1.2.3.4")[0]
+    # The session bucket is empty, so the IP bucket keeps its last token
+    assert not limiter.hit(session="s1", ip="1.2.3.4")[0]
+    assert limiter.hit(session="s2", ip="1.2.3.4")[0]
+    allowed, retry_after = limiter.hit(session="s3", ip="1.2.3.4")
+    assert not allowed
+    assert retry_after == 10.0
+
+
+def test_unknown_or_empty_keys_are_not_limited(limiter, clock):
+    for _ in range(5):
+        assert limiter.hit(session="", user="u1") == (True, 0.0)
+
+
+def test_memory_buckets_evict_least_recently_used(clock):
+    limiter = RateLimiter({"session": (60, 1)}, max_keys=2)
+    limiter.hit(session="a")
+    limiter.hit(session="b")
+    limiter.hit(session="c")
+    assert limiter.stats()["tracked_keys"] == 2
+    # "a" was dropped and comes back with a full bucket
+    assert limiter.hit(session="a")[0]
+
+
+def test_load_shedder_threshold():
+    inflight = [3]
+    shedder = LoadShedder(lambda: inflight[0], max_inflight=4)
+    assert not shedder.should_shed()
+    inflight[0] = 4
+    assert shedder.should_shed()
+    assert shedder.stats() == {"shed": 1, "inflight": 4, "max_inflight": 4}
+    assert not LoadShedder(lambda: 100, max_inflight=0).should_shed()
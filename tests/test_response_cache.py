@@ -0,0 +1,44 @@
+import time
+
+from response_cache import ResponseCache, lead_score_bucket
+
+VECTORS = {
+    "is there a free plan": [1.0, 0.0, 0.0],
+    "do you have a free plan": [0.99, 0.1, 0.0],
+    "how do integrations work": [0.0, 1.0, 0.0],
+}
+
+
+def embed(texts):
+    return [VECTORS[text] for text in texts]
+
+
+def test_exact_tier_normalizes_and_separates_buckets():
+    cache = ResponseCache(embed=None)
+    cache.put("Is there a FREE plan?", "cold", "Yes")
+    assert cache.lookup("is there a free plan", "cold") == ("Yes", None)
+    assert cache.lookup("Is there a free plan?", "hot") == (None, None)
+    assert lead_score_bucket(3) == "hot" and lead_score_bucket(1) == "warm" and lead_score_bucket(0) == "cold"
+
+
+def test_semantic_tier_matches_similar_questions_in_the_same_bucket():
+    cache = ResponseCache(embed=embed, similarity_threshold=0.95)
+    cache.put("Is there a free plan?", "cold", "Yes")
+    value, embedding = cache.lookup("Do you have a free plan?", "cold")
+    assert value == "Yes" and embedding is not None
+    assert cache.lookup("How do integrations work?", "cold")[0] is None
+    assert cache.lookup("Do you have a free plan?", "warm")[0] is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 2)
+
+
+def test_entries_expire_and_are_evicted_lru():
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache.put("a", "cold", 1)
+    cache.put("b", "cold", 2)
+    cache.lookup("a", "cold")
+    cache.put("c", "cold", 3)
+    assert cache.lookup("b", "cold")[0] is None and cache.stats()["evictions"] == 1
+
+    cache._entries[("cold", "a")]["created"] = time.time() - 61
+    assert cache.lookup("a", "cold")[0] is None and cache.stats()["expired"] == 1
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from session_store import MemorySessionStore, SQLiteSessionStore, new_session
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=60, max_messages=3)
+    return MemorySessionStore(max_sessions=100, ttl=60, max_messages=3)
+
+
+def save_with_score(store, session_id, score):
+    session = new_session()
+    session["lead_score"] = score
+    store.save(session_id, session)
+
+
+def test_lead_scores_are_counted_per_site_prefix(store):
+    save_with_score(store, "default:a", 0)
+    save_with_score(store, "default:b", 2)
+    save_with_score(store, "default:acme:c", 2)
+    save_with_score(store, "acme:a", 1)
+    assert store.lead_scores("default:") == {0: 1, 2: 2}
+    assert store.lead_scores("acme:") == {1: 1}
+    assert store.lead_scores() == {0: 1, 1: 1, 2: 2}
+
+
+def test_save_keeps_the_message_window_and_queues_the_overflow(store):
+    session = new_session()
+    session["messages"] = [{"role": "user", "content": str(i)} for i in range(5)]
+    session["scratch"] = "not persisted"
+    store.save("s", session)
+    saved = store.get("s")
+    assert [m["content"] for m in saved["messages"]] == ["2", "3", "4"]
+    assert [m["content"] for m in saved["unsummarized"]] == ["0", "1"]
+    assert "scratch" not in saved
+
+
+def test_sessions_expire_after_ttl(store, monkeypatch):
+    save_with_score(store, "s", 1)
+    assert store.get("s") is not None
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert store.get("s") is None
+    assert store.lead_scores() == {}
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(max_sessions=2)
+    for session_id in ("a", "b"):
+        store.save(session_id, new_session())
+    store.get("a")
+    store.save("c", new_session())
+    assert store.get("b") is None and store.get("a") is not None and len(store) == 2
+    # Callers get a copy, so appending doesn't grow the stored record
+    store.get("a")["messages"].append({"role": "user", "content": "x"})
+    assert store.get("a")["messages"] == []
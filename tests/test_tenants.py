@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from tenants import DEFAULT_SITE, Tenant, TenantRegistry, UnknownTenant
+
+
+@pytest.fixture
+def registry(tmp_path):
+    for site_id in ("acme", "globex", "initech"):
+        site = tmp_path / site_id
+        site.mkdir()
+        (site / "tenant.json").write_text(json.dumps({"name": site_id.title(), "booking_link": f"https://book/{site_id}"}))
+    return TenantRegistry(root=str(tmp_path), max_tenants=2, default=Tenant(DEFAULT_SITE, leads_db=str(tmp_path / "leads.db")))
+
+
+def test_session_keys_never_cross_tenants():
+    default, acme = Tenant(DEFAULT_SITE), Tenant("acme")
+    assert acme.session_key("abc") == "acme:abc"
+    assert default.session_key("acme:abc") != acme.session_key("abc")
+    assert default.session_key("abc") != acme.session_key("abc")
+
+
+def test_tenant_config_and_defaults(registry):
+    acme = registry.get("acme")
+    assert acme.name == "Acme"
+    assert acme.booking_link in acme.call_offer
+    assert acme.leads_db.endswith("acme/leads.db")
+    assert registry.get(None) is registry.default
+    assert registry.get(DEFAULT_SITE) is registry.default
+
+
+def test_unknown_and_malformed_site_ids(registry):
+    with pytest.raises(UnknownTenant):
+        registry.get("missing")
+    with pytest.raises(UnknownTenant):
+        registry.get("../acme")
+
+
+def test_least_recently_used_tenant_is_evicted(registry):
+    acme = registry.get("acme")
+    registry.get("globex")
+    assert registry.get("acme") is acme
+    registry.get("initech")
+    stats = registry.stats()
+    assert stats["resident"] == 2
+    assert stats["evictions"] == 1
+    # globex was the least recently used, so acme stays resident
+    assert registry.get("acme") is acme
+    assert registry.stats()["loads"] == 3
+
+
+def test_evicted_tenant_closes_its_lead_store(registry):
+    acme = registry.get("acme")
+    store = acme.lead_store()
+    registry.get("globex")
+    registry.get("initech")
+    with pytest.raises(Exception):
+        store.stats()
+    # A request still holding the evicted tenant gets a fresh connection
+    assert acme.lead_store() is not store
+    assert acme.lead_store().stats()["total"] == 0